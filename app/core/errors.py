@@ -0,0 +1,19 @@
+class BalanceError(ValueError):
+    """Операция отклонена правилами баланса. Подкласс ValueError: REST по-прежнему отвечает 400,
+    gRPC отдаёт код по классу (app.grpc.interceptors.ErrorInterceptor), а не UNKNOWN."""
+
+
+class InvalidOperationError(BalanceError):
+    """Неверные параметры операции — повтор с теми же параметрами не поможет."""
+
+
+class NotFoundError(BalanceError):
+    pass
+
+
+class InsufficientFundsError(BalanceError):
+    pass
+
+
+class TransactionClosedError(BalanceError):
+    """Транзакция уже завершена или истекла."""
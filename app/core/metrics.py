@@ -0,0 +1,89 @@
+import logging
+import os
+import signal
+import time
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from app.core import settings
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+REQUEST_SECONDS = Histogram(
+    "balance_request_seconds", "Время обработки запроса (REST — шаблон пути, gRPC — unary-метод)",
+    ["transport", "method"], buckets=_LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "balance_requests", "Запросы по исходу: ok, validation (неверный запрос), conflict (отказ по правилам баланса), not_found, shed (отказ при перегрузке), error",
+    ["transport", "method", "outcome"],
+)
+STAGE_SECONDS = Histogram(
+    "balance_stage_seconds", "Этапы запросов к БД: lock (SELECT ... FOR UPDATE), query, commit, pool_wait; только при включённых таймерах",
+    ["stage"], buckets=_STAGE_BUCKETS,
+)
+SWEEP_CANCELED = Histogram(
+    "balance_sweeper_batch_canceled", "Отменено транзакций за пачку свипера",
+    buckets=(0, 1, 10, 50, 100, 250, 500, 1000, 5000),
+)
+SWEEP_SECONDS = Histogram("balance_sweeper_batch_seconds", "Длительность пачки свипера", buckets=_LATENCY_BUCKETS)
+SWEEP_BACKLOG = Gauge(
+    "balance_sweeper_backlog", "Просроченных открытых транзакций шарда после последней пачки (0 — пачка была неполной)",
+    ["shard"], multiprocess_mode="livemax",
+)
+COALESCED_BATCH = Histogram(
+    "balance_coalesced_batch_size", "Операций пользователя в одной пачке объединения запросов (COALESCE_ENABLED)",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+EXPIRY_LAG = Histogram("balance_expiry_lag_seconds", "Отмена в срок: задержка от конца корзины сроков до конца её отмены", buckets=_LATENCY_BUCKETS)
+
+_STAGES = {stage: STAGE_SECONDS.labels(stage) for stage in ("lock", "query", "commit", "pool_wait")}
+
+
+class StageTimers:
+    """Таймеры этапов горячего пути. Выключенные стоят одной проверки флага.
+
+    started = timers.start(); ...; timers.observe("lock", started)
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+
+    def start(self) -> Optional[float]:
+        return time.perf_counter() if self.enabled else None
+
+    def observe(self, stage: str, started: Optional[float]) -> None:
+        if started is not None:
+            _STAGES[stage].observe(time.perf_counter() - started)
+
+    def record(self, stage: str, seconds: float) -> None:
+        if self.enabled:
+            _STAGES[stage].observe(seconds)
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        logger.info("Stage timers %s", "enabled" if self.enabled else "disabled")
+
+
+timers = StageTimers(settings.METRICS_STAGE_TIMERS)
+
+
+def install_toggle_signal(loop) -> None:
+    # SIGUSR1 переключает таймеры этапов: так их включают в каждом воркере uvicorn, а не в одном
+    loop.add_signal_handler(signal.SIGUSR1, timers.toggle)
+
+
+def registry():
+    # Несколько процессов (воркеры uvicorn): метрики собираются из PROMETHEUS_MULTIPROC_DIR
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
@@ -8,6 +8,148 @@ class Settings(BaseSettings):
     DB_USER: str = "postgres"
     DB_PASSWORD: str = "password"
 
+    # Пул соединений
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    # Кэш подготовленных выражений asyncpg на соединение (0 — выключен, нужно за pgbouncer в режиме transaction)
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_ECHO: bool = False
+    # Схема меняется миграциями (python -m app.db.migrations); при старте только сверяется версия.
+    # DB_AUTO_MIGRATE — применять недостающие миграции при старте (для разработки)
+    DB_AUTO_MIGRATE: bool = False
+    # lock_timeout DDL в миграциях (секунды): не ждать блокировку таблицы дольше, повторить позже
+    MIGRATION_LOCK_TIMEOUT: float = 5.0
+
+    # Реплики для чтений (JSON-список DSN); реплика с отставанием больше DB_REPLICA_MAX_LAG секунд не используется
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_MAX_LAG: float = 5.0
+    DB_REPLICA_CHECK_INTERVAL: float = 2.0
+
+    # Мутации баланса одним guarded UPDATE ... RETURNING вместо SELECT FOR UPDATE + UPDATE
+    ATOMIC_MUTATIONS: bool = False
+
+    # Фоновые задачи (свипер, архиватор, релей outbox, выравнивание полос) в lifespan REST-процесса.
+    # Под супервизором (python -m app.supervisor) они идут в одном отдельном процессе, в воркерах выключены
+    BACKGROUND_JOBS_ENABLED: bool = True
+    # Супервизор: число REST- и gRPC-воркеров (0 — по числу ядер)
+    SUPERVISOR_REST_WORKERS: int = 0
+    SUPERVISOR_GRPC_WORKERS: int = 0
+    # Всего соединений пулов на все процессы супервизора, делится поровну (0 — у каждого DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    DB_CONNECTION_BUDGET: int = 0
+
+    # Свипер истёкших транзакций
+    SWEEPER_ENABLED: bool = True
+    SWEEPER_INTERVAL: float = 5.0
+    SWEEPER_BATCH_SIZE: int = 500
+    SWEEPER_SHARD_COUNT: int = 1
+    # Шарды, которые обслуживает этот процесс (JSON-список, например [0, 1]); пусто — все
+    SWEEPER_SHARDS: list[int] = []
+    # Отмена в срок вместо опроса: процесс-лидер держит сроки открытых транзакций в куче и отменяет их к expires_at
+    # (сроки в пределах EXPIRY_COALESCE секунд — одной пачкой). Новые сроки приходят к нему через NOTIFY в канал
+    # EXPIRY_CHANNEL; опрос БД раз в EXPIRY_RECOVERY_INTERVAL — только для восстановления
+    EXPIRY_SCHEDULER_ENABLED: bool = False
+    EXPIRY_CHANNEL: str = "balance_expiry"
+    EXPIRY_COALESCE: float = 0.05
+    EXPIRY_RECOVERY_INTERVAL: float = 30.0
+
+    # Закрытые транзакции старше окна хранения уходят в секционированный архив; в пределах окна
+    # повтор external_tx_id возвращает ту же транзакцию, после — считается новой. Включается явно:
+    # идемпотентность перестаёт быть бессрочной
+    ARCHIVER_ENABLED: bool = False
+    TRANSACTION_RETENTION_HOURS: float = 168.0
+    ARCHIVER_INTERVAL: float = 60.0
+    ARCHIVER_BATCH_SIZE: int = 5000
+    # На сколько месяцев вперёд создавать секции архива
+    ARCHIVE_PARTITIONS_AHEAD: int = 2
+
+    # Outbox: каждая мутация баланса пишет событие в balance_outbox в своей транзакции,
+    # релей (лидер среди процессов) нумерует события и публикует их в приёмник OUTBOX_SINK
+    # ("file:<путь>" — JSON lines, "unix:<путь сокета>" — потребитель, слушающий сокет)
+    OUTBOX_ENABLED: bool = False
+    OUTBOX_RELAY_ENABLED: bool = True
+    OUTBOX_SINK: str = "file:balance_events.jsonl"
+    OUTBOX_BATCH_SIZE: int = 1000
+    OUTBOX_INTERVAL: float = 0.5
+    # Доставленные события хранятся столько часов (из них потребитель может перечитать поток)
+    OUTBOX_RETENTION_HOURS: float = 24.0
+
+    # Журнал изменений баланса (balance_ledger) пишется в транзакции каждой мутации; снимки и сверка
+    # всех пользователей с журналом (python -m app.services.ledger) идут пачками по LEDGER_CHUNK_SIZE
+    # пользователей в LEDGER_WORKERS соединений
+    LEDGER_ENABLED: bool = False
+    LEDGER_WORKERS: int = 4
+    LEDGER_CHUNK_SIZE: int = 10_000
+
+    # Исправление locked_total всех пользователей (python -m app.services.repair, gRPC BalanceAdmin.RepairAll)
+    REPAIR_WORKERS: int = 4
+    REPAIR_CHUNK_SIZE: int = 1000
+
+    # Токен эндпоинтов /admin (заголовок Authorization: Bearer <токен>): там загрузка и выгрузка балансов,
+    # полосы и восстановление из журнала. Пусто — /admin выключен (403)
+    ADMIN_TOKEN: str = ""
+
+    # Массовая загрузка балансов (python -m app.services.bulk, POST /admin/import): строки вливаются
+    # в user_balances транзакциями по IMPORT_CHUNK_SIZE строк файла
+    IMPORT_CHUNK_SIZE: int = 50_000
+
+    # Выравнивание полос горячих аккаунтов (см. POST /admin/balance/{user_id}/stripes)
+    STRIPE_REBALANCE_ENABLED: bool = True
+    STRIPE_REBALANCE_INTERVAL: float = 1.0
+
+    # Кэш GetBalance в процессе; без NOTIFY процессы видят чужие изменения не позже чем через TTL
+    BALANCE_CACHE_ENABLED: bool = False
+    BALANCE_CACHE_SIZE: int = 100_000
+    BALANCE_CACHE_TTL: float = 5.0
+    # Рассылка изменённых user_id через LISTEN/NOTIFY между воркерами uvicorn и gRPC-сервером
+    BALANCE_NOTIFY_ENABLED: bool = False
+    BALANCE_NOTIFY_CHANNEL: str = "balance_changed"
+
+    # Объединение одновременных мутаций одного пользователя в процессе: пачка до COALESCE_MAX_BATCH операций
+    # под одной блокировкой строки и одним коммитом вместо очереди запросов на блокировке в БД
+    COALESCE_ENABLED: bool = False
+    COALESCE_MAX_BATCH: int = 100
+
+    # Кэш результатов операций с транзакциями по (user_id, service_id, external_tx_id): повторы отвечаются без БД
+    IDEMPOTENCY_CACHE_ENABLED: bool = False
+    IDEMPOTENCY_CACHE_SIZE: int = 100_000
+    IDEMPOTENCY_CACHE_TTL: float = 30.0
+
+    # Метрики Prometheus: REST отдаёт их на /metrics, gRPC-сервер — на http://0.0.0.0:METRICS_GRPC_PORT/metrics.
+    # METRICS_STAGE_TIMERS — таймеры этапов (блокировка, запросы, коммит, ожидание пула) на горячем пути,
+    # переключаются на лету: POST /admin/metrics/timers или SIGUSR1 процессу
+    METRICS_ENABLED: bool = True
+    METRICS_STAGE_TIMERS: bool = False
+    METRICS_GRPC_PORT: int = 9101
+
+    # gRPC-сервер: HTTP/2-потоков на соединение (0 — по умолчанию gRPC; потоки сверх лимита сбрасываются и клиент
+    # получает UNAVAILABLE), keepalive (секунды), лимит размера сообщения, сжатие ответов ("gzip", "deflate"; пусто —
+    # без сжатия), всего одновременных вызовов (0 — без лимита; сверх — RESOURCE_EXHAUSTED; WatchBalance тоже считается)
+    GRPC_MAX_CONCURRENT_STREAMS: int = 0
+    GRPC_KEEPALIVE_TIME: float = 30.0
+    GRPC_KEEPALIVE_TIMEOUT: float = 10.0
+    GRPC_MAX_MESSAGE_BYTES: int = 4 * 1024 * 1024
+    GRPC_COMPRESSION: str = ""
+    GRPC_MAX_CONCURRENT_RPCS: int = 0
+    # Сброс нагрузки: пока пул занят целиком, а ожидание соединения (скользящее среднее) дольше GRPC_SHED_POOL_WAIT
+    # секунд, новые вызовы сразу получают RESOURCE_EXHAUSTED (0 — выключено). Лимиты одновременных вызовов по методам —
+    # JSON, например {"OpenTransaction": 64} или {"balance.v2.BalanceAPI/GetBalance": 200}
+    GRPC_SHED_POOL_WAIT: float = 0.0
+    GRPC_METHOD_LIMITS: dict[str, int] = {}
+    # Сколько секунд после SIGTERM дорабатывают начатые вызовы
+    GRPC_SHUTDOWN_GRACE: float = 10.0
+
+    # Потоковые gRPC: операций ApplyStream в работе на поток, одновременных транзакций БД на поток, период опроса WatchBalance
+    GRPC_STREAM_MAX_IN_FLIGHT: int = 256
+    GRPC_STREAM_CONCURRENCY: int = 16
+    GRPC_WATCH_POLL_INTERVAL: float = 5.0
+
+    @property
+    def dsn(self):
+        return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
     @property
     def db_url(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
@@ -1,3 +1,3 @@
-from .session import get_db, AsyncSessionLocal, engine
+from .session import get_db, get_read_db, read_consistency, parse_read_consistency, AsyncSessionLocal, AsyncReadSessionLocal, engine, read_engine, replica_router, round_trips, pool_stats
 
-__all__ = ['get_db', 'AsyncSessionLocal', 'engine']
\ No newline at end of file
+__all__ = ['get_db', 'get_read_db', 'read_consistency', 'parse_read_consistency', 'AsyncSessionLocal', 'AsyncReadSessionLocal', 'engine', 'read_engine', 'replica_router', 'round_trips', 'pool_stats']
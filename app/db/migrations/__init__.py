@@ -0,0 +1,136 @@
+"""Версионные миграции схемы.
+
+Миграция — модуль vNNNN_<имя>.py в этом пакете с функцией upgrade(conn). Обычная миграция
+выполняется в своей транзакции (DDL с lock_timeout, при нехватке блокировки повторяется);
+модуль с TRANSACTIONAL = False выполняется вне транзакции — для CREATE/DROP INDEX CONCURRENTLY.
+Применённые версии записываются в schema_version; параллельные запуски сериализуются
+advisory-блокировкой. Приложение при старте только сверяет версию (check_schema).
+
+    python -m app.db.migrations [--check]
+"""
+import asyncio
+import importlib
+import logging
+import pkgutil
+from dataclasses import dataclass
+from types import ModuleType
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core import settings
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = "schema_version"
+_LOCK_NOT_AVAILABLE = "55P03"
+_LOCK_RETRIES = 5
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "TRANSACTIONAL", True)
+
+    @property
+    def description(self) -> str:
+        return (self.module.__doc__ or self.name).strip().splitlines()[0]
+
+
+def load_migrations() -> List[Migration]:
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if info.name.startswith("v") and info.name[1:5].isdigit():
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            migrations.append(Migration(int(info.name[1:5]), info.name, module))
+    migrations.sort(key=lambda migration: migration.version)
+    return migrations
+
+
+MIGRATIONS = load_migrations()
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def current_version(conn: AsyncConnection) -> Optional[int]:
+    try:
+        return (await conn.execute(text(f"SELECT max(version) FROM {VERSION_TABLE}"))).scalar_one()
+    except ProgrammingError:
+        # Таблицы версий ещё нет: схема не создавалась или создана до появления миграций
+        return None
+
+
+async def _apply_in_transaction(engine: AsyncEngine, migration: Migration) -> None:
+    for attempt in range(1, _LOCK_RETRIES + 1):
+        try:
+            async with engine.begin() as conn:
+                # ALTER TABLE в очереди за долгой транзакцией блокировал бы весь трафик к таблице — лучше повторить
+                await conn.execute(text(f"SET LOCAL lock_timeout = '{int(settings.MIGRATION_LOCK_TIMEOUT * 1000)}ms'"))
+                await migration.module.upgrade(conn)
+                await _record(conn, migration)
+            return
+        except DBAPIError as e:
+            if getattr(e.orig, "sqlstate", None) != _LOCK_NOT_AVAILABLE or attempt == _LOCK_RETRIES:
+                raise
+            logger.warning("Migration %s: lock timeout, retrying (%d/%d)", migration.name, attempt, _LOCK_RETRIES)
+            await asyncio.sleep(attempt)
+
+
+async def _record(conn: AsyncConnection, migration: Migration) -> None:
+    await conn.execute(
+        text(f"INSERT INTO {VERSION_TABLE} (version, name) VALUES (:version, :name)"),
+        {"version": migration.version, "name": migration.name},
+    )
+
+
+async def migrate(engine: AsyncEngine, target: Optional[int] = None) -> List[Migration]:
+    """Применяет недостающие миграции (до target включительно); возвращает применённые."""
+    applied = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        # Ждём опросом, а не pg_advisory_lock: CREATE INDEX CONCURRENTLY ждёт завершения чужих
+        # транзакций, и ожидающий блокировку второй запуск с ним бы взаимно заблокировался
+        while not (await conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": VERSION_TABLE})).scalar_one():
+            await asyncio.sleep(1.0)
+        try:
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+                "version integer PRIMARY KEY, name text NOT NULL, applied_at timestamp NOT NULL DEFAULT now())"
+            ))
+            version = await current_version(conn) or 0
+            for migration in MIGRATIONS:
+                if migration.version <= version or (target is not None and migration.version > target):
+                    continue
+                logger.info("Applying migration %s: %s", migration.name, migration.description)
+                if migration.transactional:
+                    await _apply_in_transaction(engine, migration)
+                else:
+                    await migration.module.upgrade(conn)
+                    await _record(conn, migration)
+                applied.append(migration)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": VERSION_TABLE})
+    return applied
+
+
+async def check_schema(engine: AsyncEngine) -> None:
+    """Проверка при старте: один запрос версии. При DB_AUTO_MIGRATE недостающие миграции применяются."""
+    if settings.DB_AUTO_MIGRATE:
+        await migrate(engine)
+        return
+    async with engine.connect() as conn:
+        version = await current_version(conn)
+    if version is None or version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Схема БД устарела: версия {version or 0}, требуется {LATEST_VERSION}. "
+            "Выполните python -m app.db.migrations"
+        )
+    if version > LATEST_VERSION:
+        # Миграции новой версии уже применены, а этот процесс ещё старый (rolling deploy) — работаем
+        logger.warning("Database schema version %d is newer than %d known to this build", version, LATEST_VERSION)
@@ -0,0 +1,32 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+from app.db.migrations import LATEST_VERSION, MIGRATIONS, current_version, migrate
+
+
+async def _main(args) -> int:
+    from app.db import engine
+
+    try:
+        if args.check:
+            async with engine.connect() as conn:
+                version = await current_version(conn)
+            pending = [migration.name for migration in MIGRATIONS if migration.version > (version or 0)]
+            print(f"version {version or 0}, latest {LATEST_VERSION}, pending: {', '.join(pending) or '-'}")
+            return 1 if pending else 0
+        applied = await migrate(engine, args.target)
+        if not applied:
+            logging.getLogger(__name__).info("Schema is up to date (version %d)", LATEST_VERSION)
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument("--check", action="store_true", help="только показать версию; код 1, если есть неприменённые миграции")
+    parser.add_argument("--target", type=int, default=None, help="применить миграции до этой версии включительно")
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(parser.parse_args())))
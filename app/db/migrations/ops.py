@@ -0,0 +1,18 @@
+"""Операции для модулей миграций."""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+
+async def execute(conn: AsyncConnection, *statements: str) -> None:
+    for statement in statements:
+        await conn.execute(text(statement))
+
+
+async def create_index_concurrently(conn: AsyncConnection, name: str, ddl: str) -> None:
+    """ddl — CREATE INDEX CONCURRENTLY IF NOT EXISTS <name> ...; недостроенный индекс прерванного запуска пересоздаётся."""
+    valid = (await conn.execute(
+        text("SELECT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(:name)"), {"name": name}
+    )).scalar_one_or_none()
+    if valid is False:
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    await conn.execute(text(ddl))
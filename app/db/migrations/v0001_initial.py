@@ -0,0 +1,47 @@
+"""Исходная схема: балансы и транзакции.
+
+IF NOT EXISTS — чтобы базы, созданные через create_all до появления миграций, принимались как есть.
+"""
+from app.db.migrations.ops import execute
+
+
+async def upgrade(conn):
+    await execute(
+        conn,
+        """
+        DO $$ BEGIN
+            CREATE TYPE transactionstatus AS ENUM ('LOCKED', 'CONFIRMED', 'CANCELED');
+        EXCEPTION WHEN duplicate_object THEN NULL;
+        END $$
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_balances (
+            user_id VARCHAR(128) NOT NULL PRIMARY KEY,
+            current BIGINT NOT NULL,
+            maximum BIGINT NOT NULL,
+            locked_total BIGINT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+            CONSTRAINT check_current_nonnegative CHECK (current >= 0),
+            CONSTRAINT check_maximum_nonnegative CHECK (maximum >= 0),
+            CONSTRAINT check_locked_nonnegative CHECK (locked_total >= 0),
+            CONSTRAINT check_current_le_maximum CHECK (current <= maximum),
+            CONSTRAINT check_current_plus_locked_le_maximum CHECK (current + locked_total <= maximum)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS balance_transactions (
+            id BIGSERIAL NOT NULL PRIMARY KEY,
+            user_id VARCHAR(128) NOT NULL,
+            service_id VARCHAR(128) NOT NULL,
+            external_tx_id VARCHAR(128) NOT NULL,
+            amount BIGINT NOT NULL,
+            status transactionstatus NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            closed_at TIMESTAMP WITHOUT TIME ZONE,
+            CONSTRAINT check_amount_positive CHECK (amount > 0)
+        )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_service_external_unique ON balance_transactions (user_id, service_id, external_tx_id)",
+    )
@@ -0,0 +1,27 @@
+"""Полосы горячих аккаунтов: user_balances.stripes, balance_transactions.stripe, user_balance_stripes."""
+from app.db.migrations.ops import execute
+
+
+async def upgrade(conn):
+    await execute(
+        conn,
+        # Колонки с константным DEFAULT добавляются без перезаписи таблицы
+        "ALTER TABLE user_balances ADD COLUMN IF NOT EXISTS stripes SMALLINT DEFAULT '0' NOT NULL",
+        "ALTER TABLE balance_transactions ADD COLUMN IF NOT EXISTS stripe SMALLINT",
+        """
+        CREATE TABLE IF NOT EXISTS user_balance_stripes (
+            user_id VARCHAR(128) NOT NULL,
+            stripe SMALLINT NOT NULL,
+            current BIGINT NOT NULL,
+            maximum BIGINT NOT NULL,
+            locked_total BIGINT NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+            PRIMARY KEY (user_id, stripe),
+            CONSTRAINT check_stripe_current_nonnegative CHECK (current >= 0),
+            CONSTRAINT check_stripe_maximum_nonnegative CHECK (maximum >= 0),
+            CONSTRAINT check_stripe_locked_nonnegative CHECK (locked_total >= 0),
+            CONSTRAINT check_stripe_current_le_maximum CHECK (current <= maximum),
+            CONSTRAINT check_stripe_current_plus_locked_le_maximum CHECK (current + locked_total <= maximum)
+        )
+        """,
+    )
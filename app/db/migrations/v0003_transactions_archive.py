@@ -0,0 +1,24 @@
+"""Архив закрытых транзакций, секционированный по created_at (секции создаёт архиватор)."""
+from app.db.migrations.ops import execute
+
+
+async def upgrade(conn):
+    await execute(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS balance_transactions_archive (
+            id BIGINT NOT NULL,
+            user_id VARCHAR(128) NOT NULL,
+            service_id VARCHAR(128) NOT NULL,
+            external_tx_id VARCHAR(128) NOT NULL,
+            amount BIGINT NOT NULL,
+            status transactionstatus NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            expires_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            closed_at TIMESTAMP WITHOUT TIME ZONE,
+            stripe SMALLINT,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_archive_user_created ON balance_transactions_archive (user_id, created_at)",
+    )
@@ -0,0 +1,28 @@
+"""Частичные индексы по открытым транзакциям вместо полных индексов по status и отдельным колонкам."""
+from app.db.migrations.ops import create_index_concurrently, execute
+
+# Без транзакции: индексы строятся и удаляются CONCURRENTLY, не блокируя запись
+TRANSACTIONAL = False
+
+INDEXES = {
+    "idx_locked_user_stripe": "ON balance_transactions (user_id, stripe) INCLUDE (amount) WHERE status = 'LOCKED'",
+    "idx_locked_expires": "ON balance_transactions (expires_at) INCLUDE (user_id, stripe) WHERE status = 'LOCKED'",
+    "idx_closed_at": "ON balance_transactions (closed_at) WHERE closed_at IS NOT NULL",
+}
+# Полные индексы по status и отдельные по колонкам, которые уже покрывает уникальный (user_id, service_id, external_tx_id)
+OBSOLETE = [
+    "ix_balance_transactions_user_id",
+    "ix_balance_transactions_service_id",
+    "ix_balance_transactions_external_tx_id",
+    "ix_balance_transactions_status",
+    "idx_user_status",
+    "idx_expires_status",
+    "idx_striped_locked_expires",
+]
+
+
+async def upgrade(conn):
+    # Сначала новые индексы, потом удаление старых — запросы не остаются без индекса
+    for name, definition in INDEXES.items():
+        await create_index_concurrently(conn, name, f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+    await execute(conn, *(f"DROP INDEX CONCURRENTLY IF EXISTS {name}" for name in OBSOLETE))
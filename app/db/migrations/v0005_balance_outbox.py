@@ -0,0 +1,31 @@
+"""Outbox событий изменения баланса и позиции потока."""
+from app.db.migrations.ops import execute
+
+
+async def upgrade(conn):
+    await execute(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS balance_outbox (
+            id BIGSERIAL NOT NULL PRIMARY KEY,
+            seq BIGINT,
+            type VARCHAR(32) NOT NULL,
+            user_id VARCHAR(128) NOT NULL,
+            amount BIGINT,
+            transaction_id BIGINT,
+            service_id VARCHAR(128),
+            external_tx_id VARCHAR(128),
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_unsequenced ON balance_outbox (id) WHERE seq IS NULL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_seq ON balance_outbox (seq) WHERE seq IS NOT NULL",
+        """
+        CREATE TABLE IF NOT EXISTS balance_outbox_cursors (
+            name VARCHAR(256) NOT NULL PRIMARY KEY,
+            seq BIGINT NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+        )
+        """,
+        "INSERT INTO balance_outbox_cursors (name, seq) VALUES ('stream', 0) ON CONFLICT DO NOTHING",
+    )
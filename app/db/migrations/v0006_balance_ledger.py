@@ -0,0 +1,40 @@
+"""Журнал изменений баланса, точки и снимки балансов."""
+from app.db.migrations.ops import execute
+
+
+async def upgrade(conn):
+    await execute(
+        conn,
+        """
+        CREATE TABLE IF NOT EXISTS balance_ledger (
+            id BIGSERIAL NOT NULL PRIMARY KEY,
+            user_id VARCHAR(128) NOT NULL,
+            xid xid8 DEFAULT pg_current_xact_id() NOT NULL,
+            type VARCHAR(32) NOT NULL,
+            current_delta BIGINT NOT NULL,
+            maximum_delta BIGINT NOT NULL,
+            locked_delta BIGINT NOT NULL,
+            transaction_id BIGINT,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_ledger_user_xid ON balance_ledger (user_id, xid)",
+        """
+        CREATE TABLE IF NOT EXISTS balance_checkpoints (
+            id BIGSERIAL NOT NULL PRIMARY KEY,
+            snapshot pg_snapshot DEFAULT pg_current_snapshot() NOT NULL,
+            baseline BOOLEAN NOT NULL,
+            users INTEGER NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS balance_snapshots (
+            user_id VARCHAR(128) NOT NULL PRIMARY KEY,
+            checkpoint_id BIGINT NOT NULL,
+            current BIGINT NOT NULL,
+            maximum BIGINT NOT NULL,
+            locked_total BIGINT NOT NULL
+        )
+        """,
+    )
@@ -0,0 +1,53 @@
+from datetime import date, datetime
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.models import BalanceTransactionArchive
+
+ARCHIVE_TABLE = BalanceTransactionArchive.__tablename__
+
+
+def month_start(value: datetime | date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    for _ in range(months):
+        value = next_month(value)
+    return value
+
+
+def partition_name(month: date) -> str:
+    return f"{ARCHIVE_TABLE}_{month:%Y_%m}"
+
+
+async def existing_partitions(conn: AsyncConnection) -> set:
+    result = await conn.execute(
+        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = CAST(:parent AS regclass)"),
+        {"parent": ARCHIVE_TABLE},
+    )
+    return set(result.scalars().all())
+
+
+async def ensure_partitions(conn: AsyncConnection, months: Iterable[date]) -> list:
+    """Создаёт недостающие месячные секции архива; возвращает имена созданных."""
+    # Несколько архиваторов не должны создавать одну и ту же секцию одновременно
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": ARCHIVE_TABLE})
+    existing = await existing_partitions(conn)
+    created = []
+    for month in sorted(set(months)):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        await conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {ARCHIVE_TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+        ))
+        created.append(name)
+    return created
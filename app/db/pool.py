@@ -0,0 +1,125 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.metrics import timers
+
+
+class PoolWaitStats:
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Экспоненциальное скользящее среднее: текущая нагрузка на пул, а не среднее с момента старта
+        self.recent = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent += self.alpha * (seconds - self.recent)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "recent": self.recent,
+        }
+
+
+class RoundTripStats:
+    """Счётчики обращений к БД: BEGIN, выражения, COMMIT/ROLLBACK (каждое — отдельный round trip asyncpg)."""
+
+    def __init__(self):
+        self.begins = 0
+        self.statements = 0
+        self.commits = 0
+        self.rollbacks = 0
+
+    def attach(self, engine) -> None:
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "begin", self._on_begin)
+        event.listen(sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(sync_engine, "commit", self._on_commit)
+        event.listen(sync_engine, "rollback", self._on_rollback)
+
+    def _on_begin(self, conn):
+        self.begins += 1
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def _on_commit(self, conn):
+        self.commits += 1
+
+    def _on_rollback(self, conn):
+        self.rollbacks += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "begins": self.begins,
+            "statements": self.statements,
+            "commits": self.commits,
+            "rollbacks": self.rollbacks,
+            "total": self.begins + self.statements + self.commits + self.rollbacks,
+        }
+
+
+def attach_stage_timers(engine) -> None:
+    """Таймеры этапов query (каждое выражение) для движка; commit считается для всех сессий ниже."""
+    event.listen(engine.sync_engine, "before_cursor_execute", _start_query)
+    event.listen(engine.sync_engine, "after_cursor_execute", _observe_query)
+
+
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = timers.start()
+
+
+def _observe_query(conn, cursor, statement, parameters, context, executemany):
+    timers.observe("query", conn.info.pop("query_started", None))
+
+
+@event.listens_for(Session, "before_commit")
+def _start_commit(session):
+    session.info["commit_started"] = timers.start()
+
+
+@event.listens_for(Session, "after_commit")
+def _observe_commit(session):
+    # Вместе с flush перед COMMIT: изменённые ORM-объекты пишутся в этот момент
+    timers.observe("commit", session.info.pop("commit_started", None))
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """QueuePool, который меряет время получения соединения (ожидание в очереди + установка соединения)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_stats.record(waited)
+            timers.record("pool_wait", waited)
+
+    def saturated(self) -> bool:
+        # Все соединения, включая overflow, выданы: следующий запрос будет ждать
+        return self._max_overflow >= 0 and self.checkedout() >= self.size() + self._max_overflow
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": self.overflow(),
+            "wait": self.wait_stats.as_dict(),
+        }
@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+logger = logging.getLogger(__name__)
+
+_HEALTH_QUERY = text(
+    "SELECT pg_is_in_recovery(), "
+    "CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END, "
+    "pg_last_wal_replay_lsn()::text"
+)
+
+
+def parse_lsn(lsn: str) -> int:
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def to_async_url(url: str) -> str:
+    for prefix in ("postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+class Replica:
+    def __init__(self, url: str, engine: AsyncEngine):
+        self.url = url
+        self.engine = engine
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.replay_lsn: Optional[int] = None
+        self.checked_at: Optional[float] = None
+
+
+class ReplicaRouter:
+    """Выбирает движок для чтения: здоровая реплика с допустимым отставанием (по кругу) или primary.
+
+    Read-your-writes: пользователи, чьи балансы менялись за последние max_lag секунд
+    (см. remember_writes), читаются с primary; запрос может также потребовать реплику,
+    догнавшую заданный LSN или отстающую не больше max_staleness.
+    """
+
+    def __init__(self, primary: AsyncEngine, urls: List[str], max_lag: float, **engine_kwargs):
+        self.primary = primary
+        self.max_lag = max_lag
+        self.replicas = [
+            Replica(url, create_async_engine(to_async_url(url), **engine_kwargs).execution_options(postgresql_readonly=True))
+            for url in urls
+        ]
+        self._round_robin = itertools.count()
+        self._recent_writes: dict[str, float] = {}
+
+    def remember_writes(self, user_ids) -> None:
+        now = time.monotonic()
+        for user_id in user_ids:
+            self._recent_writes[user_id] = now
+        if len(self._recent_writes) > 100_000:
+            cutoff = now - self.max_lag
+            self._recent_writes = {k: v for k, v in self._recent_writes.items() if v >= cutoff}
+
+    def pick(self, user_id: Optional[str] = None, min_lsn: Optional[str] = None, max_staleness: Optional[float] = None) -> AsyncEngine:
+        if not self.replicas:
+            return self.primary
+        if user_id is not None:
+            written_at = self._recent_writes.get(user_id)
+            if written_at is not None and time.monotonic() - written_at < self.max_lag:
+                return self.primary
+        max_lag = self.max_lag if max_staleness is None else min(self.max_lag, max_staleness)
+        required_lsn = parse_lsn(min_lsn) if min_lsn else None
+        candidates = [
+            replica for replica in self.replicas
+            if replica.healthy and replica.lag is not None and replica.lag <= max_lag
+            and (required_lsn is None or (replica.replay_lsn is not None and replica.replay_lsn >= required_lsn))
+        ]
+        if not candidates:
+            return self.primary
+        return candidates[next(self._round_robin) % len(candidates)].engine
+
+    async def check(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as conn:
+                in_recovery, lag, replay_lsn = (await conn.execute(_HEALTH_QUERY)).one()
+            replica.healthy = bool(in_recovery)
+            replica.lag = float(lag)
+            replica.replay_lsn = parse_lsn(replay_lsn) if replay_lsn else None
+        except Exception as e:
+            if replica.healthy:
+                logger.warning("Replica %s is unhealthy: %s", replica.url, e)
+            replica.healthy = False
+        replica.checked_at = time.monotonic()
+
+    async def run_health_checks(self, stop_event: asyncio.Event, interval: float) -> None:
+        while not stop_event.is_set():
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> list:
+        return [
+            {"url": replica.engine.url.render_as_string(hide_password=True), "healthy": replica.healthy, "lag": replica.lag}
+            for replica in self.replicas
+        ]
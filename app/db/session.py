@@ -1,12 +1,96 @@
-from typing import Any, AsyncGenerator
+import math
+import re
+from typing import Any, AsyncGenerator, Optional
 
+from fastapi import Request
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core import settings
+from app.core.errors import InvalidOperationError
+from app.db.pool import RoundTripStats, TimedQueuePool, attach_stage_timers
+from app.db.replicas import ReplicaRouter
 
-engine = create_async_engine(settings.db_url, echo=True)
+
+def engine_options() -> dict:
+    return {
+        "echo": settings.DB_ECHO,
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": {
+            # Кэш asyncpg и кэш подготовленных выражений адаптера SQLAlchemy
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        },
+    }
+
+
+engine = create_async_engine(settings.db_url, **engine_options())
+round_trips = RoundTripStats()
+round_trips.attach(engine)
+attach_stage_timers(engine)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+# Чтения идут в транзакциях BEGIN READ ONLY (без лишнего запроса: режим задаётся при старте транзакции asyncpg)
+read_engine = engine.execution_options(postgresql_readonly=True)
+replica_router = ReplicaRouter(read_engine, settings.DB_REPLICA_URLS, settings.DB_REPLICA_MAX_LAG, **engine_options())
+for _replica in replica_router.replicas:
+    round_trips.attach(_replica.engine)
+    attach_stage_timers(_replica.engine)
+
+
+class RoutingSessionMaker(async_sessionmaker):
+    """Sessionmaker для чтений: движок (реплика или primary) выбирается при создании сессии."""
+
+    def __call__(self, user_id: Optional[str] = None, min_lsn: Optional[str] = None, max_staleness: Optional[float] = None, **local_kw: Any) -> AsyncSession:
+        local_kw.setdefault("bind", replica_router.pick(user_id, min_lsn, max_staleness))
+        return super().__call__(**local_kw)
+
+
+AsyncReadSessionLocal = RoutingSessionMaker(read_engine, expire_on_commit=False)
+
+
+def pool_stats() -> dict:
+    return {
+        "primary": engine.pool.stats(),
+        "replicas": [replica.engine.pool.stats() for replica in replica_router.replicas],
+        "round_trips": round_trips.as_dict(),
+    }
+
 
 async def get_db() -> AsyncGenerator[AsyncSession, Any]:
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+_LSN = re.compile(r"[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}")
+
+
+def parse_read_consistency(min_lsn: Optional[str], max_staleness: Optional[str]) -> dict:
+    """min_lsn и max_staleness для AsyncReadSessionLocal из x-min-lsn и x-max-staleness (заголовки REST, метаданные gRPC).
+
+    Неверное значение — InvalidOperationError (400 в REST, INVALID_ARGUMENT в gRPC), а не ошибка при выборе реплики.
+    """
+    if min_lsn and not _LSN.fullmatch(min_lsn):
+        raise InvalidOperationError("x-min-lsn: ожидается LSN вида 16/B374D848")
+    staleness = None
+    if max_staleness:
+        try:
+            staleness = float(max_staleness)
+        except ValueError:
+            staleness = math.nan
+        if not math.isfinite(staleness) or staleness < 0:
+            raise InvalidOperationError("x-max-staleness: ожидается неотрицательное число секунд")
+    return {"min_lsn": min_lsn or None, "max_staleness": staleness}
+
+
+def read_consistency(request: Request) -> dict:
+    """Требования клиента к свежести чтения из заголовков: min_lsn и max_staleness для AsyncReadSessionLocal."""
+    return parse_read_consistency(request.headers.get("x-min-lsn"), request.headers.get("x-max-staleness"))
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, Any]:
+    async with AsyncReadSessionLocal(user_id=request.path_params.get("user_id"), **read_consistency(request)) as session:
+        yield session
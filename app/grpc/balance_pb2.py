@@ -14,7 +14,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rbalance.proto\x12\x07\x62\x61lance\"$\n\x11GetBalanceRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\"5\n\x13\x41\x64justLimitsRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x02 \x01(\x03\"6\n\x14\x41\x64justCurrentRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x02 \x01(\x03\"~\n\x16OpenTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\x12\x0e\n\x06\x61mount\x18\x04 \x01(\x03\x12\x17\n\x0ftimeout_seconds\x18\x05 \x01(\x05\"X\n\x19\x43onfirmTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\"W\n\x18\x43\x61ncelTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\"Z\n\x0f\x42\x61lanceResponse\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x0f\n\x07\x63urrent\x18\x02 \x01(\x03\x12\x0f\n\x07maximum\x18\x03 \x01(\x03\x12\x14\n\x0clocked_total\x18\x04 \x01(\x03\"\xb9\x01\n\x13TransactionResponse\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x12\n\nservice_id\x18\x03 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x04 \x01(\t\x12\x0e\n\x06\x61mount\x18\x05 \x01(\x03\x12\x0e\n\x06status\x18\x06 \x01(\t\x12\x12\n\ncreated_at\x18\x07 \x01(\t\x12\x12\n\nexpires_at\x18\x08 \x01(\t\x12\x11\n\tclosed_at\x18\t \x01(\t2\xe2\x03\n\nBalanceAPI\x12\x42\n\nGetBalance\x12\x1a.balance.GetBalanceRequest\x1a\x18.balance.BalanceResponse\x12\x46\n\x0c\x41\x64justLimits\x12\x1c.balance.AdjustLimitsRequest\x1a\x18.balance.BalanceResponse\x12H\n\rAdjustCurrent\x12\x1d.balance.AdjustCurrentRequest\x1a\x18.balance.BalanceResponse\x12P\n\x0fOpenTransaction\x12\x1f.balance.OpenTransactionRequest\x1a\x1c.balance.TransactionResponse\x12V\n\x12\x43onfirmTransaction\x12\".balance.ConfirmTransactionRequest\x1a\x1c.balance.TransactionResponse\x12T\n\x11\x43\x61ncelTransaction\x12!.balance.CancelTransactionRequest\x1a\x1c.balance.TransactionResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rbalance.proto\x12\x07\x62\x61lance\"$\n\x11GetBalanceRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\"5\n\x13\x41\x64justLimitsRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x02 \x01(\x03\"6\n\x14\x41\x64justCurrentRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x02 \x01(\x03\"~\n\x16OpenTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\x12\x0e\n\x06\x61mount\x18\x04 \x01(\x03\x12\x17\n\x0ftimeout_seconds\x18\x05 \x01(\x05\"X\n\x19\x43onfirmTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\"W\n\x18\x43\x61ncelTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\"Z\n\x0f\x42\x61lanceResponse\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x0f\n\x07\x63urrent\x18\x02 \x01(\x03\x12\x0f\n\x07maximum\x18\x03 \x01(\x03\x12\x14\n\x0clocked_total\x18\x04 \x01(\x03\"\xb9\x01\n\x13TransactionResponse\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x12\n\nservice_id\x18\x03 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x04 \x01(\t\x12\x0e\n\x06\x61mount\x18\x05 \x01(\x03\x12\x0e\n\x06status\x18\x06 \x01(\t\x12\x12\n\ncreated_at\x18\x07 \x01(\t\x12\x12\n\nexpires_at\x18\x08 \x01(\t\x12\x11\n\tclosed_at\x18\t \x01(\t\"\xc9\x02\n\x10\x42\x61lanceOperation\x12\x35\n\radjust_limits\x18\x01 \x01(\x0b\x32\x1c.balance.AdjustLimitsRequestH\x00\x12\x37\n\x0e\x61\x64just_current\x18\x02 \x01(\x0b\x32\x1d.balance.AdjustCurrentRequestH\x00\x12;\n\x10open_transaction\x18\x03 \x01(\x0b\x32\x1f.balance.OpenTransactionRequestH\x00\x12\x41\n\x13\x63onfirm_transaction\x18\x04 \x01(\x0b\x32\".balance.ConfirmTransactionRequestH\x00\x12?\n\x12\x63\x61ncel_transaction\x18\x05 \x01(\x0b\x32!.balance.CancelTransactionRequestH\x00\x42\x04\n\x02op\"B\n\x11\x42\x61tchApplyRequest\x12-\n\noperations\x18\x01 \x03(\x0b\x32\x19.balance.BalanceOperation\"\xa7\x01\n\x0f\x42\x61tchItemResult\x12\r\n\x05index\x18\x01 \x01(\x05\x12\n\n\x02ok\x18\x02 \x01(\x08\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12+\n\x07\x62\x61lance\x18\x04 \x01(\x0b\x32\x18.balance.BalanceResponseH\x00\x12\x33\n\x0btransaction\x18\x05 \x01(\x0b\x32\x1c.balance.TransactionResponseH\x00\x42\x08\n\x06result\"?\n\x12\x42\x61tchApplyResponse\x12)\n\x07results\x18\x01 \x03(\x0b\x32\x18.balance.BatchItemResult\"^\n\x16StreamOperationRequest\x12\x16\n\x0e\x63orrelation_id\x18\x01 \x01(\t\x12,\n\toperation\x18\x02 \x01(\x0b\x32\x19.balance.BalanceOperation\"\xb6\x01\n\x15StreamOperationResult\x12\x16\n\x0e\x63orrelation_id\x18\x01 \x01(\t\x12\n\n\x02ok\x18\x02 \x01(\x08\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12+\n\x07\x62\x61lance\x18\x04 \x01(\x0b\x32\x18.balance.BalanceResponseH\x00\x12\x33\n\x0btransaction\x18\x05 \x01(\x0b\x32\x1c.balance.TransactionResponseH\x00\x42\x08\n\x06result\"&\n\x13WatchBalanceRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\"H\n\x10RepairAllRequest\x12\x0f\n\x07\x64ry_run\x18\x01 \x01(\x08\x12\x0f\n\x07workers\x18\x02 \x01(\x05\x12\x12\n\nchunk_size\x18\x03 \x01(\x05\"\x80\x01\n\nRepairDiff\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x14\n\x0clocked_total\x18\x02 \x01(\x03\x12\x15\n\ractual_locked\x18\x03 \x01(\x03\x12\x0f\n\x07\x63urrent\x18\x04 \x01(\x03\x12\x13\n\x0bnew_current\x18\x05 \x01(\x03\x12\x0e\n\x06status\x18\x06 \x01(\t\"N\n\rRepairSummary\x12\x0f\n\x07\x64rifted\x18\x01 \x01(\x03\x12\r\n\x05\x66ixed\x18\x02 \x01(\x03\x12\x0c\n\x04\x62usy\x18\x03 \x01(\x03\x12\x0f\n\x07seconds\x18\x04 \x01(\x01\"i\n\x0eRepairAllEvent\x12#\n\x04\x64iff\x18\x01 \x01(\x0b\x32\x13.balance.RepairDiffH\x00\x12)\n\x07summary\x18\x02 \x01(\x0b\x32\x16.balance.RepairSummaryH\x00\x42\x07\n\x05\x65vent2\xc7\x05\n\nBalanceAPI\x12\x42\n\nGetBalance\x12\x1a.balance.GetBalanceRequest\x1a\x18.balance.BalanceResponse\x12\x46\n\x0c\x41\x64justLimits\x12\x1c.balance.AdjustLimitsRequest\x1a\x18.balance.BalanceResponse\x12H\n\rAdjustCurrent\x12\x1d.balance.AdjustCurrentRequest\x1a\x18.balance.BalanceResponse\x12P\n\x0fOpenTransaction\x12\x1f.balance.OpenTransactionRequest\x1a\x1c.balance.TransactionResponse\x12V\n\x12\x43onfirmTransaction\x12\".balance.ConfirmTransactionRequest\x1a\x1c.balance.TransactionResponse\x12T\n\x11\x43\x61ncelTransaction\x12!.balance.CancelTransactionRequest\x1a\x1c.balance.TransactionResponse\x12\x45\n\nBatchApply\x12\x1a.balance.BatchApplyRequest\x1a\x1b.balance.BatchApplyResponse\x12R\n\x0b\x41pplyStream\x12\x1f.balance.StreamOperationRequest\x1a\x1e.balance.StreamOperationResult(\x01\x30\x01\x12H\n\x0cWatchBalance\x12\x1c.balance.WatchBalanceRequest\x1a\x18.balance.BalanceResponse0\x01\x32Q\n\x0c\x42\x61lanceAdmin\x12\x41\n\tRepairAll\x12\x19.balance.RepairAllRequest\x1a\x17.balance.RepairAllEvent0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -37,6 +37,30 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _globals['_BALANCERESPONSE']._serialized_end=572
   _globals['_TRANSACTIONRESPONSE']._serialized_start=575
   _globals['_TRANSACTIONRESPONSE']._serialized_end=760
-  _globals['_BALANCEAPI']._serialized_start=763
-  _globals['_BALANCEAPI']._serialized_end=1245
+  _globals['_BALANCEOPERATION']._serialized_start=763
+  _globals['_BALANCEOPERATION']._serialized_end=1092
+  _globals['_BATCHAPPLYREQUEST']._serialized_start=1094
+  _globals['_BATCHAPPLYREQUEST']._serialized_end=1160
+  _globals['_BATCHITEMRESULT']._serialized_start=1163
+  _globals['_BATCHITEMRESULT']._serialized_end=1330
+  _globals['_BATCHAPPLYRESPONSE']._serialized_start=1332
+  _globals['_BATCHAPPLYRESPONSE']._serialized_end=1395
+  _globals['_STREAMOPERATIONREQUEST']._serialized_start=1397
+  _globals['_STREAMOPERATIONREQUEST']._serialized_end=1491
+  _globals['_STREAMOPERATIONRESULT']._serialized_start=1494
+  _globals['_STREAMOPERATIONRESULT']._serialized_end=1676
+  _globals['_WATCHBALANCEREQUEST']._serialized_start=1678
+  _globals['_WATCHBALANCEREQUEST']._serialized_end=1716
+  _globals['_REPAIRALLREQUEST']._serialized_start=1718
+  _globals['_REPAIRALLREQUEST']._serialized_end=1790
+  _globals['_REPAIRDIFF']._serialized_start=1793
+  _globals['_REPAIRDIFF']._serialized_end=1921
+  _globals['_REPAIRSUMMARY']._serialized_start=1923
+  _globals['_REPAIRSUMMARY']._serialized_end=2001
+  _globals['_REPAIRALLEVENT']._serialized_start=2003
+  _globals['_REPAIRALLEVENT']._serialized_end=2108
+  _globals['_BALANCEAPI']._serialized_start=2111
+  _globals['_BALANCEAPI']._serialized_end=2822
+  _globals['_BALANCEADMIN']._serialized_start=2824
+  _globals['_BALANCEADMIN']._serialized_end=2905
 # @@protoc_insertion_point(module_scope)
@@ -44,6 +44,21 @@ class BalanceAPIStub(object):
                 request_serializer=balance__pb2.CancelTransactionRequest.SerializeToString,
                 response_deserializer=balance__pb2.TransactionResponse.FromString,
                 )
+        self.BatchApply = channel.unary_unary(
+                '/balance.BalanceAPI/BatchApply',
+                request_serializer=balance__pb2.BatchApplyRequest.SerializeToString,
+                response_deserializer=balance__pb2.BatchApplyResponse.FromString,
+                )
+        self.ApplyStream = channel.stream_stream(
+                '/balance.BalanceAPI/ApplyStream',
+                request_serializer=balance__pb2.StreamOperationRequest.SerializeToString,
+                response_deserializer=balance__pb2.StreamOperationResult.FromString,
+                )
+        self.WatchBalance = channel.unary_stream(
+                '/balance.BalanceAPI/WatchBalance',
+                request_serializer=balance__pb2.WatchBalanceRequest.SerializeToString,
+                response_deserializer=balance__pb2.BalanceResponse.FromString,
+                )
 
 
 class BalanceAPIServicer(object):
@@ -85,6 +100,24 @@ class BalanceAPIServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchApply(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ApplyStream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchBalance(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_BalanceAPIServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -118,6 +151,21 @@ def add_BalanceAPIServicer_to_server(servicer, server):
                     request_deserializer=balance__pb2.CancelTransactionRequest.FromString,
                     response_serializer=balance__pb2.TransactionResponse.SerializeToString,
             ),
+            'BatchApply': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchApply,
+                    request_deserializer=balance__pb2.BatchApplyRequest.FromString,
+                    response_serializer=balance__pb2.BatchApplyResponse.SerializeToString,
+            ),
+            'ApplyStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.ApplyStream,
+                    request_deserializer=balance__pb2.StreamOperationRequest.FromString,
+                    response_serializer=balance__pb2.StreamOperationResult.SerializeToString,
+            ),
+            'WatchBalance': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchBalance,
+                    request_deserializer=balance__pb2.WatchBalanceRequest.FromString,
+                    response_serializer=balance__pb2.BalanceResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'balance.BalanceAPI', rpc_method_handlers)
@@ -229,3 +277,119 @@ class BalanceAPI(object):
             balance__pb2.TransactionResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def BatchApply(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/balance.BalanceAPI/BatchApply',
+            balance__pb2.BatchApplyRequest.SerializeToString,
+            balance__pb2.BatchApplyResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def ApplyStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/balance.BalanceAPI/ApplyStream',
+            balance__pb2.StreamOperationRequest.SerializeToString,
+            balance__pb2.StreamOperationResult.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def WatchBalance(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/balance.BalanceAPI/WatchBalance',
+            balance__pb2.WatchBalanceRequest.SerializeToString,
+            balance__pb2.BalanceResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+
+class BalanceAdminStub(object):
+    """Административные операции
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.RepairAll = channel.unary_stream(
+                '/balance.BalanceAdmin/RepairAll',
+                request_serializer=balance__pb2.RepairAllRequest.SerializeToString,
+                response_deserializer=balance__pb2.RepairAllEvent.FromString,
+                )
+
+
+class BalanceAdminServicer(object):
+    """Административные операции
+    """
+
+    def RepairAll(self, request, context):
+        """Исправление locked_total всех пользователей: поток исправлений (или найденных расхождений при dry_run), в конце итог
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_BalanceAdminServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'RepairAll': grpc.unary_stream_rpc_method_handler(
+                    servicer.RepairAll,
+                    request_deserializer=balance__pb2.RepairAllRequest.FromString,
+                    response_serializer=balance__pb2.RepairAllEvent.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'balance.BalanceAdmin', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+
+
+ # This class is part of an EXPERIMENTAL API.
+class BalanceAdmin(object):
+    """Административные операции
+    """
+
+    @staticmethod
+    def RepairAll(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/balance.BalanceAdmin/RepairAll',
+            balance__pb2.RepairAllRequest.SerializeToString,
+            balance__pb2.RepairAllEvent.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: balance_v2.proto
+# Protobuf Python Version: 4.25.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x10\x62\x61lance_v2.proto\x12\nbalance.v2\x1a\x1fgoogle/protobuf/timestamp.proto\"$\n\x11GetBalanceRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\"5\n\x13\x41\x64justLimitsRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x02 \x01(\x03\"6\n\x14\x41\x64justCurrentRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x02 \x01(\x03\"~\n\x16OpenTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\x12\x0e\n\x06\x61mount\x18\x04 \x01(\x03\x12\x17\n\x0ftimeout_seconds\x18\x05 \x01(\x05\"X\n\x19\x43onfirmTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\"W\n\x18\x43\x61ncelTransactionRequest\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x12\n\nservice_id\x18\x02 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x03 \x01(\t\"Z\n\x0f\x42\x61lanceResponse\x12\x0f\n\x07user_id\x18\x01 \x01(\t\x12\x0f\n\x07\x63urrent\x18\x02 \x01(\x03\x12\x0f\n\x07maximum\x18\x03 \x01(\x03\x12\x14\n\x0clocked_total\x18\x04 \x01(\x03\"\xac\x02\n\x13TransactionResponse\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x0f\n\x07user_id\x18\x02 \x01(\t\x12\x12\n\nservice_id\x18\x03 \x01(\t\x12\x16\n\x0e\x65xternal_tx_id\x18\x04 \x01(\t\x12\x0e\n\x06\x61mount\x18\x05 \x01(\x03\x12-\n\x06status\x18\x06 \x01(\x0e\x32\x1d.balance.v2.TransactionStatus\x12.\n\ncreated_at\x18\x07 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12.\n\nexpires_at\x18\x08 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12-\n\tclosed_at\x18\t \x01(\x0b\x32\x1a.google.protobuf.Timestamp\"\xd8\x02\n\x10\x42\x61lanceOperation\x12\x38\n\radjust_limits\x18\x01 \x01(\x0b\x32\x1f.balance.v2.AdjustLimitsRequestH\x00\x12:\n\x0e\x61\x64just_current\x18\x02 \x01(\x0b\x32 .balance.v2.AdjustCurrentRequestH\x00\x12>\n\x10open_transaction\x18\x03 \x01(\x0b\x32\".balance.v2.OpenTransactionRequestH\x00\x12\x44\n\x13\x63onfirm_transaction\x18\x04 \x01(\x0b\x32%.balance.v2.ConfirmTransactionRequestH\x00\x12\x42\n\x12\x63\x61ncel_transaction\x18\x05 \x01(\x0b\x32$.balance.v2.CancelTransactionRequestH\x00\x42\x04\n\x02op\"E\n\x11\x42\x61tchApplyRequest\x12\x30\n\noperations\x18\x01 \x03(\x0b\x32\x1c.balance.v2.BalanceOperation\"\xad\x01\n\x0f\x42\x61tchItemResult\x12\r\n\x05index\x18\x01 \x01(\x05\x12\n\n\x02ok\x18\x02 \x01(\x08\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12.\n\x07\x62\x61lance\x18\x04 \x01(\x0b\x32\x1b.balance.v2.BalanceResponseH\x00\x12\x36\n\x0btransaction\x18\x05 \x01(\x0b\x32\x1f.balance.v2.TransactionResponseH\x00\x42\x08\n\x06result\"B\n\x12\x42\x61tchApplyResponse\x12,\n\x07results\x18\x01 \x03(\x0b\x32\x1b.balance.v2.BatchItemResult*\x99\x01\n\x11TransactionStatus\x12\"\n\x1eTRANSACTION_STATUS_UNSPECIFIED\x10\x00\x12\x1d\n\x19TRANSACTION_STATUS_LOCKED\x10\x01\x12 \n\x1cTRANSACTION_STATUS_CONFIRMED\x10\x02\x12\x1f\n\x1bTRANSACTION_STATUS_CANCELED\x10\x03\x32\xd3\x04\n\nBalanceAPI\x12H\n\nGetBalance\x12\x1d.balance.v2.GetBalanceRequest\x1a\x1b.balance.v2.BalanceResponse\x12L\n\x0c\x41\x64justLimits\x12\x1f.balance.v2.AdjustLimitsRequest\x1a\x1b.balance.v2.BalanceResponse\x12N\n\rAdjustCurrent\x12 .balance.v2.AdjustCurrentRequest\x1a\x1b.balance.v2.BalanceResponse\x12V\n\x0fOpenTransaction\x12\".balance.v2.OpenTransactionRequest\x1a\x1f.balance.v2.TransactionResponse\x12\\\n\x12\x43onfirmTransaction\x12%.balance.v2.ConfirmTransactionRequest\x1a\x1f.balance.v2.TransactionResponse\x12Z\n\x11\x43\x61ncelTransaction\x12$.balance.v2.CancelTransactionRequest\x1a\x1f.balance.v2.TransactionResponse\x12K\n\nBatchApply\x12\x1d.balance.v2.BatchApplyRequest\x1a\x1e.balance.v2.BatchApplyResponseb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'balance_v2_pb2', _globals)
+if _descriptor._USE_C_DESCRIPTORS == False:
+  DESCRIPTOR._options = None
+  _globals['_TRANSACTIONSTATUS']._serialized_start=1579
+  _globals['_TRANSACTIONSTATUS']._serialized_end=1732
+  _globals['_GETBALANCEREQUEST']._serialized_start=65
+  _globals['_GETBALANCEREQUEST']._serialized_end=101
+  _globals['_ADJUSTLIMITSREQUEST']._serialized_start=103
+  _globals['_ADJUSTLIMITSREQUEST']._serialized_end=156
+  _globals['_ADJUSTCURRENTREQUEST']._serialized_start=158
+  _globals['_ADJUSTCURRENTREQUEST']._serialized_end=212
+  _globals['_OPENTRANSACTIONREQUEST']._serialized_start=214
+  _globals['_OPENTRANSACTIONREQUEST']._serialized_end=340
+  _globals['_CONFIRMTRANSACTIONREQUEST']._serialized_start=342
+  _globals['_CONFIRMTRANSACTIONREQUEST']._serialized_end=430
+  _globals['_CANCELTRANSACTIONREQUEST']._serialized_start=432
+  _globals['_CANCELTRANSACTIONREQUEST']._serialized_end=519
+  _globals['_BALANCERESPONSE']._serialized_start=521
+  _globals['_BALANCERESPONSE']._serialized_end=611
+  _globals['_TRANSACTIONRESPONSE']._serialized_start=614
+  _globals['_TRANSACTIONRESPONSE']._serialized_end=914
+  _globals['_BALANCEOPERATION']._serialized_start=917
+  _globals['_BALANCEOPERATION']._serialized_end=1261
+  _globals['_BATCHAPPLYREQUEST']._serialized_start=1263
+  _globals['_BATCHAPPLYREQUEST']._serialized_end=1332
+  _globals['_BATCHITEMRESULT']._serialized_start=1335
+  _globals['_BATCHITEMRESULT']._serialized_end=1508
+  _globals['_BATCHAPPLYRESPONSE']._serialized_start=1510
+  _globals['_BATCHAPPLYRESPONSE']._serialized_end=1576
+  _globals['_BALANCEAPI']._serialized_start=1735
+  _globals['_BALANCEAPI']._serialized_end=2330
+# @@protoc_insertion_point(module_scope)
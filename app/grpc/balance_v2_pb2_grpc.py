@@ -0,0 +1,264 @@
+# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
+"""Client and server classes corresponding to protobuf-defined services."""
+import grpc
+
+from . import balance_v2_pb2 as balance__v2__pb2
+
+
+class BalanceAPIStub(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.GetBalance = channel.unary_unary(
+                '/balance.v2.BalanceAPI/GetBalance',
+                request_serializer=balance__v2__pb2.GetBalanceRequest.SerializeToString,
+                response_deserializer=balance__v2__pb2.BalanceResponse.FromString,
+                )
+        self.AdjustLimits = channel.unary_unary(
+                '/balance.v2.BalanceAPI/AdjustLimits',
+                request_serializer=balance__v2__pb2.AdjustLimitsRequest.SerializeToString,
+                response_deserializer=balance__v2__pb2.BalanceResponse.FromString,
+                )
+        self.AdjustCurrent = channel.unary_unary(
+                '/balance.v2.BalanceAPI/AdjustCurrent',
+                request_serializer=balance__v2__pb2.AdjustCurrentRequest.SerializeToString,
+                response_deserializer=balance__v2__pb2.BalanceResponse.FromString,
+                )
+        self.OpenTransaction = channel.unary_unary(
+                '/balance.v2.BalanceAPI/OpenTransaction',
+                request_serializer=balance__v2__pb2.OpenTransactionRequest.SerializeToString,
+                response_deserializer=balance__v2__pb2.TransactionResponse.FromString,
+                )
+        self.ConfirmTransaction = channel.unary_unary(
+                '/balance.v2.BalanceAPI/ConfirmTransaction',
+                request_serializer=balance__v2__pb2.ConfirmTransactionRequest.SerializeToString,
+                response_deserializer=balance__v2__pb2.TransactionResponse.FromString,
+                )
+        self.CancelTransaction = channel.unary_unary(
+                '/balance.v2.BalanceAPI/CancelTransaction',
+                request_serializer=balance__v2__pb2.CancelTransactionRequest.SerializeToString,
+                response_deserializer=balance__v2__pb2.TransactionResponse.FromString,
+                )
+        self.BatchApply = channel.unary_unary(
+                '/balance.v2.BalanceAPI/BatchApply',
+                request_serializer=balance__v2__pb2.BatchApplyRequest.SerializeToString,
+                response_deserializer=balance__v2__pb2.BatchApplyResponse.FromString,
+                )
+
+
+class BalanceAPIServicer(object):
+    """Missing associated documentation comment in .proto file."""
+
+    def GetBalance(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AdjustLimits(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AdjustCurrent(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def OpenTransaction(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ConfirmTransaction(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CancelTransaction(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchApply(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_BalanceAPIServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'GetBalance': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetBalance,
+                    request_deserializer=balance__v2__pb2.GetBalanceRequest.FromString,
+                    response_serializer=balance__v2__pb2.BalanceResponse.SerializeToString,
+            ),
+            'AdjustLimits': grpc.unary_unary_rpc_method_handler(
+                    servicer.AdjustLimits,
+                    request_deserializer=balance__v2__pb2.AdjustLimitsRequest.FromString,
+                    response_serializer=balance__v2__pb2.BalanceResponse.SerializeToString,
+            ),
+            'AdjustCurrent': grpc.unary_unary_rpc_method_handler(
+                    servicer.AdjustCurrent,
+                    request_deserializer=balance__v2__pb2.AdjustCurrentRequest.FromString,
+                    response_serializer=balance__v2__pb2.BalanceResponse.SerializeToString,
+            ),
+            'OpenTransaction': grpc.unary_unary_rpc_method_handler(
+                    servicer.OpenTransaction,
+                    request_deserializer=balance__v2__pb2.OpenTransactionRequest.FromString,
+                    response_serializer=balance__v2__pb2.TransactionResponse.SerializeToString,
+            ),
+            'ConfirmTransaction': grpc.unary_unary_rpc_method_handler(
+                    servicer.ConfirmTransaction,
+                    request_deserializer=balance__v2__pb2.ConfirmTransactionRequest.FromString,
+                    response_serializer=balance__v2__pb2.TransactionResponse.SerializeToString,
+            ),
+            'CancelTransaction': grpc.unary_unary_rpc_method_handler(
+                    servicer.CancelTransaction,
+                    request_deserializer=balance__v2__pb2.CancelTransactionRequest.FromString,
+                    response_serializer=balance__v2__pb2.TransactionResponse.SerializeToString,
+            ),
+            'BatchApply': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchApply,
+                    request_deserializer=balance__v2__pb2.BatchApplyRequest.FromString,
+                    response_serializer=balance__v2__pb2.BatchApplyResponse.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'balance.v2.BalanceAPI', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+
+
+ # This class is part of an EXPERIMENTAL API.
+class BalanceAPI(object):
+    """Missing associated documentation comment in .proto file."""
+
+    @staticmethod
+    def GetBalance(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/balance.v2.BalanceAPI/GetBalance',
+            balance__v2__pb2.GetBalanceRequest.SerializeToString,
+            balance__v2__pb2.BalanceResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def AdjustLimits(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/balance.v2.BalanceAPI/AdjustLimits',
+            balance__v2__pb2.AdjustLimitsRequest.SerializeToString,
+            balance__v2__pb2.BalanceResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def AdjustCurrent(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/balance.v2.BalanceAPI/AdjustCurrent',
+            balance__v2__pb2.AdjustCurrentRequest.SerializeToString,
+            balance__v2__pb2.BalanceResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def OpenTransaction(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/balance.v2.BalanceAPI/OpenTransaction',
+            balance__v2__pb2.OpenTransactionRequest.SerializeToString,
+            balance__v2__pb2.TransactionResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def ConfirmTransaction(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/balance.v2.BalanceAPI/ConfirmTransaction',
+            balance__v2__pb2.ConfirmTransactionRequest.SerializeToString,
+            balance__v2__pb2.TransactionResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def CancelTransaction(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/balance.v2.BalanceAPI/CancelTransaction',
+            balance__v2__pb2.CancelTransactionRequest.SerializeToString,
+            balance__v2__pb2.TransactionResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def BatchApply(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/balance.v2.BalanceAPI/BatchApply',
+            balance__v2__pb2.BatchApplyRequest.SerializeToString,
+            balance__v2__pb2.BatchApplyResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
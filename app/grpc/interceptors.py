@@ -0,0 +1,223 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+import grpc
+from pydantic import ValidationError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.core import metrics
+from app.core.errors import InsufficientFundsError, InvalidOperationError, NotFoundError, TransactionClosedError
+
+# Коды, с которыми обработчики завершают вызов через context.abort
+_ABORT_OUTCOMES = {
+    grpc.StatusCode.INVALID_ARGUMENT: "validation",
+    grpc.StatusCode.NOT_FOUND: "not_found",
+    grpc.StatusCode.FAILED_PRECONDITION: "conflict",
+    grpc.StatusCode.ABORTED: "conflict",
+    grpc.StatusCode.ALREADY_EXISTS: "conflict",
+    grpc.StatusCode.RESOURCE_EXHAUSTED: "shed",
+}
+
+# Отказ правил баланса повтором не лечится: FAILED_PRECONDITION, а не UNKNOWN/UNAVAILABLE, которые клиенты повторяют
+_ERROR_CODES = (
+    (ValidationError, grpc.StatusCode.INVALID_ARGUMENT),
+    (InvalidOperationError, grpc.StatusCode.INVALID_ARGUMENT),
+    (NotFoundError, grpc.StatusCode.NOT_FOUND),
+    (InsufficientFundsError, grpc.StatusCode.FAILED_PRECONDITION),
+    (TransactionClosedError, grpc.StatusCode.FAILED_PRECONDITION),
+    (ValueError, grpc.StatusCode.FAILED_PRECONDITION),
+)
+
+_POOL_TIMEOUT = "Нет свободного соединения с БД"
+
+# Служебные вызовы не ограничиваются
+_EXEMPT_PREFIX = "/balance.BalanceAdmin/"
+
+
+def _outcome(error: BaseException, context) -> str:
+    # Клиент отключился (для WatchBalance — обычный конец подписки)
+    if isinstance(error, asyncio.CancelledError):
+        return "canceled"
+    # ValidationError pydantic — подкласс ValueError, проверяется первым
+    if isinstance(error, ValidationError):
+        return "validation"
+    if isinstance(error, ValueError):
+        return "conflict"
+    if isinstance(error, grpc.aio.AbortError):
+        return _ABORT_OUTCOMES.get(context.code(), "error")
+    return "error"
+
+
+def _wrap(handler, unary, stream):
+    """Тот же обработчик с обёрнутым поведением: unary(behavior) для unary-ответа, stream(behavior) для потока."""
+    if handler.unary_unary:
+        return grpc.unary_unary_rpc_method_handler(
+            unary(handler.unary_unary),
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+    if handler.unary_stream:
+        return grpc.unary_stream_rpc_method_handler(
+            stream(handler.unary_stream),
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+    if handler.stream_stream:
+        return grpc.stream_stream_rpc_method_handler(
+            stream(handler.stream_stream),
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+    return handler
+
+
+class MetricsInterceptor(grpc.aio.ServerInterceptor):
+    """Время unary-вызовов и исход всех вызовов по методу. У потоковых вызовов время не пишется:
+    WatchBalance живёт, пока подписан клиент, и испортил бы гистограмму."""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method.lstrip("/")
+        return _wrap(handler, lambda behavior: _timed_unary(behavior, method), lambda behavior: _counted_stream(behavior, method))
+
+
+def _timed_unary(behavior, method: str):
+    async def wrapper(request, context):
+        outcome = "ok"
+        started = time.perf_counter()
+        try:
+            return await behavior(request, context)
+        except BaseException as e:
+            outcome = _outcome(e, context)
+            raise
+        finally:
+            metrics.REQUEST_SECONDS.labels("grpc", method).observe(time.perf_counter() - started)
+            metrics.REQUESTS.labels("grpc", method, outcome).inc()
+
+    return wrapper
+
+
+def _counted_stream(behavior, method: str):
+    async def wrapper(request, context):
+        outcome = "ok"
+        try:
+            async for response in behavior(request, context):
+                yield response
+        except BaseException as e:
+            outcome = _outcome(e, context)
+            raise
+        finally:
+            metrics.REQUESTS.labels("grpc", method, outcome).inc()
+
+    return wrapper
+
+
+class AdmissionInterceptor(grpc.aio.ServerInterceptor):
+    """Быстрый отказ RESOURCE_EXHAUSTED вместо очереди на пул соединений.
+
+    Вызов отклоняется сразу, если пул занят целиком и скользящее среднее ожидания соединения больше
+    shed_pool_wait (пока пул не занят целиком, вызовы идут и среднее обновляется), или если у метода
+    уже limit одновременных вызовов. Лимит задаётся по полному имени ("balance.v2.BalanceAPI/GetBalance")
+    или по короткому ("GetBalance" — для обеих версий API).
+    """
+
+    def __init__(self, pool, shed_pool_wait: float, method_limits: Dict[str, int]):
+        self.pool = pool
+        self.shed_pool_wait = shed_pool_wait
+        self.method_limits = method_limits
+        self._in_flight: Dict[str, int] = {}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None or handler_call_details.method.startswith(_EXEMPT_PREFIX):
+            return handler
+        if not self.shed_pool_wait and not self.method_limits:
+            return handler
+        method = handler_call_details.method.lstrip("/")
+        short = method.rsplit("/", 1)[-1]
+        key = method if method in self.method_limits else short if short in self.method_limits else None
+        return _wrap(handler, lambda behavior: self._admitted_unary(behavior, key), lambda behavior: self._admitted_stream(behavior, key))
+
+    def _rejection(self, key: Optional[str]) -> Optional[str]:
+        if self.shed_pool_wait and self.pool.saturated() and self.pool.wait_stats.recent > self.shed_pool_wait:
+            return "Сервер перегружен: нет свободных соединений с БД"
+        if key is not None and self._in_flight.get(key, 0) >= self.method_limits[key]:
+            return f"Сервер перегружен: лимит одновременных вызовов {key}"
+        return None
+
+    def _admitted_unary(self, behavior, key: Optional[str]):
+        async def wrapper(request, context):
+            rejection = self._rejection(key)
+            if rejection is not None:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, rejection)
+            self._enter(key)
+            try:
+                return await behavior(request, context)
+            finally:
+                self._leave(key)
+
+        return wrapper
+
+    def _admitted_stream(self, behavior, key: Optional[str]):
+        async def wrapper(request, context):
+            rejection = self._rejection(key)
+            if rejection is not None:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, rejection)
+            self._enter(key)
+            try:
+                async for response in behavior(request, context):
+                    yield response
+            finally:
+                self._leave(key)
+
+        return wrapper
+
+    def _enter(self, key: Optional[str]) -> None:
+        if key is not None:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def _leave(self, key: Optional[str]) -> None:
+        if key is not None:
+            self._in_flight[key] -= 1
+
+
+class ErrorInterceptor(grpc.aio.ServerInterceptor):
+    """Исключения сервиса — в коды gRPC по классу ошибки (см. _ERROR_CODES) вместо UNKNOWN."""
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _wrap(handler, _mapped_unary, _mapped_stream)
+
+
+def _status(error: ValueError) -> grpc.StatusCode:
+    return next(code for error_type, code in _ERROR_CODES if isinstance(error, error_type))
+
+
+def _mapped_unary(behavior):
+    async def wrapper(request, context):
+        try:
+            return await behavior(request, context)
+        except ValueError as e:
+            await context.abort(_status(e), str(e))
+        except PoolTimeoutError:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, _POOL_TIMEOUT)
+
+    return wrapper
+
+
+def _mapped_stream(behavior):
+    async def wrapper(request, context):
+        try:
+            async for response in behavior(request, context):
+                yield response
+        except ValueError as e:
+            await context.abort(_status(e), str(e))
+        except PoolTimeoutError:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, _POOL_TIMEOUT)
+
+    return wrapper
@@ -1,64 +1,256 @@
 import asyncio
+import signal
 from datetime import datetime
+from typing import Optional
 import grpc
-from app.db import AsyncSessionLocal
+from prometheus_client import start_http_server
+from pydantic import ValidationError
+from app.core import metrics, settings
+from app.core.errors import InvalidOperationError
+from app.db import AsyncSessionLocal, AsyncReadSessionLocal, engine, parse_read_consistency, replica_router
+from app.db.migrations import check_schema
+from app.models import UserBalance, BalanceTransaction
+from app.schemas.user_balance_schema import BalanceRead
+from app.schemas.batch import BalanceOperation, BatchItemResult
+from app.schemas.transactions import TransactionResponse
+from app.services import balance_events
 from app.services.balance_service import BalanceService
-from . import balance_pb2, balance_pb2_grpc
+from app.services.coalescer import coalescer, operation
+from app.services.repair import BalanceRepairJob
+from .interceptors import AdmissionInterceptor, ErrorInterceptor, MetricsInterceptor
+from .streaming import StreamApplier
+from . import balance_pb2, balance_pb2_grpc, balance_v2_pb2_grpc
+
+
+_COMPRESSION = {"": grpc.Compression.NoCompression, "gzip": grpc.Compression.Gzip, "deflate": grpc.Compression.Deflate}
+
+
+def server_options() -> list:
+    options = [
+        # Несколько процессов слушают один порт (app.supervisor), ядро делит между ними соединения
+        ("grpc.so_reuseport", 1),
+        ("grpc.keepalive_time_ms", int(settings.GRPC_KEEPALIVE_TIME * 1000)),
+        ("grpc.keepalive_timeout_ms", int(settings.GRPC_KEEPALIVE_TIMEOUT * 1000)),
+        # Пинги клиентов не чаще keepalive сервера не считаются злоупотреблением
+        ("grpc.http2.min_ping_interval_without_data_ms", int(settings.GRPC_KEEPALIVE_TIME * 1000)),
+        ("grpc.max_receive_message_length", settings.GRPC_MAX_MESSAGE_BYTES),
+        ("grpc.max_send_message_length", settings.GRPC_MAX_MESSAGE_BYTES),
+    ]
+    if settings.GRPC_MAX_CONCURRENT_STREAMS:
+        options.append(("grpc.max_concurrent_streams", settings.GRPC_MAX_CONCURRENT_STREAMS))
+    return options
 
 
 def dt_to_str(dt: datetime | None) -> str:
     return dt.isoformat() if dt else ""
 
 
+def balance_to_pb(bal: UserBalance | BalanceRead) -> balance_pb2.BalanceResponse:
+    return balance_pb2.BalanceResponse(user_id=bal.user_id, current=bal.current, maximum=bal.maximum, locked_total=bal.locked_total)
+
+
+def transaction_to_pb(tx: BalanceTransaction) -> balance_pb2.TransactionResponse:
+    return balance_pb2.TransactionResponse(id=tx.id, user_id=tx.user_id, service_id=tx.service_id, external_tx_id=tx.external_tx_id, amount=tx.amount, status=tx.status.value, created_at=dt_to_str(tx.created_at), expires_at=dt_to_str(tx.expires_at), closed_at=dt_to_str(tx.closed_at))
+
+
+def transaction_read_to_pb(tx: TransactionResponse) -> balance_pb2.TransactionResponse:
+    return balance_pb2.TransactionResponse(id=tx.id, user_id=tx.user_id, service_id=tx.service_id, external_tx_id=tx.external_tx_id, amount=tx.amount, status=tx.status, created_at=dt_to_str(tx.created_at), expires_at=dt_to_str(tx.expires_at), closed_at=dt_to_str(tx.closed_at))
+
+
+def batch_item_to_pb(item: BatchItemResult) -> balance_pb2.BatchItemResult:
+    message = balance_pb2.BatchItemResult(index=item.index, ok=item.ok, error=item.error or "")
+    if item.balance is not None:
+        message.balance.CopyFrom(balance_to_pb(item.balance))
+    if item.transaction is not None:
+        message.transaction.CopyFrom(transaction_read_to_pb(item.transaction))
+    return message
+
+
+def stream_result_to_pb(correlation_id: str, item: BatchItemResult) -> balance_pb2.StreamOperationResult:
+    message = balance_pb2.StreamOperationResult(correlation_id=correlation_id, ok=item.ok, error=item.error or "")
+    if item.balance is not None:
+        message.balance.CopyFrom(balance_to_pb(item.balance))
+    if item.transaction is not None:
+        message.transaction.CopyFrom(transaction_read_to_pb(item.transaction))
+    return message
+
+
+def stream_operation_from_pb(message: balance_pb2.StreamOperationRequest) -> tuple[str, BalanceOperation]:
+    try:
+        return message.correlation_id, operation_from_pb(message.operation)
+    except ValidationError as e:
+        raise InvalidOperationError(str(e))
+
+
+def operation_from_pb(message: balance_pb2.BalanceOperation) -> BalanceOperation:
+    op = message.WhichOneof("op")
+    if op is None:
+        raise InvalidOperationError("Операция не задана")
+    payload = getattr(message, op)
+    return BalanceOperation(op=op, **{field.name: getattr(payload, field.name) for field in payload.DESCRIPTOR.fields})
+
+
 class BalanceAPI(balance_pb2_grpc.BalanceAPIServicer):
     async def GetBalance(self, request, context):
-        async with AsyncSessionLocal() as session:
+        metadata = dict(context.invocation_metadata() or ())
+        consistency = parse_read_consistency(metadata.get("x-min-lsn"), metadata.get("x-max-staleness"))
+        async with AsyncReadSessionLocal(user_id=request.user_id, **consistency) as session:
             service = BalanceService(session)
-            bal = await service.get_balance(request.user_id)
-            return balance_pb2.BalanceResponse(user_id=bal.user_id, current=bal.current, maximum=bal.maximum, locked_total=bal.locked_total)
+            bal = await service.read_balance(request.user_id)
+            return balance_to_pb(bal)
 
     async def AdjustLimits(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return balance_to_pb(await coalescer.apply(operation("adjust_limits", request.user_id, delta=int(request.delta))))
         async with AsyncSessionLocal() as session:
             service = BalanceService(session)
             bal = await service.adjust_limits(request.user_id, int(request.delta))
             await session.commit()
-            return balance_pb2.BalanceResponse(user_id=bal.user_id, current=bal.current, maximum=bal.maximum, locked_total=bal.locked_total)
+            return balance_to_pb(bal)
 
     async def AdjustCurrent(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return balance_to_pb(await coalescer.apply(operation("adjust_current", request.user_id, delta=int(request.delta))))
         async with AsyncSessionLocal() as session:
             service = BalanceService(session)
             bal = await service.adjust_current(request.user_id, int(request.delta))
             await session.commit()
-            return balance_pb2.BalanceResponse(user_id=bal.user_id, current=bal.current, maximum=bal.maximum, locked_total=bal.locked_total)
+            return balance_to_pb(bal)
 
     async def OpenTransaction(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return transaction_read_to_pb(await coalescer.apply(operation(
+                "open_transaction", request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id,
+                amount=int(request.amount), timeout_seconds=int(request.timeout_seconds),
+            )))
         async with AsyncSessionLocal() as session:
             service = BalanceService(session)
             tx = await service.open_transaction(user_id=request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id, amount=int(request.amount), timeout_seconds=int(request.timeout_seconds))
             await session.commit()
-            return balance_pb2.TransactionResponse(id=tx.id, user_id=tx.user_id, service_id=tx.service_id, external_tx_id=tx.external_tx_id, amount=tx.amount, status=tx.status.value, created_at=dt_to_str(tx.created_at), expires_at=dt_to_str(tx.expires_at), closed_at=dt_to_str(tx.closed_at))
+            return transaction_to_pb(tx)
 
     async def ConfirmTransaction(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return transaction_read_to_pb(await coalescer.apply(operation("confirm_transaction", request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id)))
         async with AsyncSessionLocal() as session:
             service = BalanceService(session)
             tx = await service.confirm_transaction(user_id=request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id)
             await session.commit()
-            return balance_pb2.TransactionResponse(id=tx.id, user_id=tx.user_id, service_id=tx.service_id, external_tx_id=tx.external_tx_id, amount=tx.amount, status=tx.status.value, created_at=dt_to_str(tx.created_at), expires_at=dt_to_str(tx.expires_at), closed_at=dt_to_str(tx.closed_at))
+            return transaction_to_pb(tx)
 
     async def CancelTransaction(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return transaction_read_to_pb(await coalescer.apply(operation("cancel_transaction", request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id)))
         async with AsyncSessionLocal() as session:
             service = BalanceService(session)
             tx = await service.cancel_transaction(user_id=request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id)
             await session.commit()
-            return balance_pb2.TransactionResponse(id=tx.id, user_id=tx.user_id, service_id=tx.service_id, external_tx_id=tx.external_tx_id, amount=tx.amount, status=tx.status.value, created_at=dt_to_str(tx.created_at), expires_at=dt_to_str(tx.expires_at), closed_at=dt_to_str(tx.closed_at))
+            return transaction_to_pb(tx)
+
+    async def BatchApply(self, request, context):
+        try:
+            operations = [operation_from_pb(message) for message in request.operations]
+        except (ValueError, ValidationError) as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        if not operations:
+            return balance_pb2.BatchApplyResponse()
+        async with AsyncSessionLocal() as session:
+            service = BalanceService(session)
+            results = await service.apply_batch(operations)
+            await session.commit()
+        return balance_pb2.BatchApplyResponse(results=[batch_item_to_pb(item) for item in results])
+
+    async def ApplyStream(self, request_iterator, context):
+        applier = StreamApplier(settings.GRPC_STREAM_MAX_IN_FLIGHT, settings.GRPC_STREAM_CONCURRENCY)
+        async for correlation_id, item in applier.run(request_iterator, stream_operation_from_pb):
+            yield stream_result_to_pb(correlation_id, item)
+
+    async def WatchBalance(self, request, context):
+        with balance_events.watch(request.user_id) as changed:
+            last = None
+            while True:
+                changed.clear()
+                async with AsyncReadSessionLocal(user_id=request.user_id) as session:
+                    bal = await BalanceService(session).read_balance(request.user_id)
+                if bal != last:
+                    yield balance_to_pb(bal)
+                    last = bal
+                # Без NOTIFY изменения из других процессов видны только при опросе
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=settings.GRPC_WATCH_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+
+class BalanceAdmin(balance_pb2_grpc.BalanceAdminServicer):
+    async def RepairAll(self, request, context):
+        job = BalanceRepairJob(
+            workers=request.workers or settings.REPAIR_WORKERS,
+            chunk_size=request.chunk_size or settings.REPAIR_CHUNK_SIZE,
+            dry_run=request.dry_run,
+        )
+        diffs = asyncio.Queue(maxsize=1000)
+
+        async def run():
+            try:
+                return await job.run(diffs.put)
+            finally:
+                # Конец потока; после отмены (клиент отключился) его уже никто не ждёт
+                if not asyncio.current_task().cancelling():
+                    await diffs.put(None)
+
+        task = asyncio.create_task(run())
+        try:
+            # Клиент читает медленнее, чем идёт проход — очередь ограничена, задача ждёт
+            while (diff := await diffs.get()) is not None:
+                yield balance_pb2.RepairAllEvent(diff=balance_pb2.RepairDiff(**vars(diff)))
+            report = await task
+        finally:
+            # Клиент отключился — проход останавливается, исправленные пачки уже закоммичены
+            task.cancel()
+        yield balance_pb2.RepairAllEvent(summary=balance_pb2.RepairSummary(
+            drifted=report.drifted, fixed=report.fixed, busy=report.busy, seconds=report.seconds,
+        ))
+
 
+async def serve(bind_addr: str = "0.0.0.0:50051", metrics_port: Optional[int] = settings.METRICS_GRPC_PORT):
+    # server_v2 переиспользует конвертеры этого модуля
+    from .server_v2 import BalanceAPIV2
 
-async def serve(bind_addr: str = "0.0.0.0:50051"):
-    server = grpc.aio.server()
+    await check_schema(engine)
+    interceptors = [MetricsInterceptor()] if settings.METRICS_ENABLED else []
+    interceptors += [AdmissionInterceptor(engine.pool, settings.GRPC_SHED_POOL_WAIT, settings.GRPC_METHOD_LIMITS), ErrorInterceptor()]
+    server = grpc.aio.server(
+        interceptors=interceptors,
+        options=server_options(),
+        maximum_concurrent_rpcs=settings.GRPC_MAX_CONCURRENT_RPCS or None,
+        compression=_COMPRESSION[settings.GRPC_COMPRESSION],
+    )
     balance_pb2_grpc.add_BalanceAPIServicer_to_server(BalanceAPI(), server)
+    balance_v2_pb2_grpc.add_BalanceAPIServicer_to_server(BalanceAPIV2(), server)
+    balance_pb2_grpc.add_BalanceAdminServicer_to_server(BalanceAdmin(), server)
     server.add_insecure_port(bind_addr)
+    if settings.METRICS_ENABLED and metrics_port is not None:
+        # /metrics отдаёт поток prometheus_client рядом с event loop
+        start_http_server(metrics_port, registry=metrics.registry())
+    loop = asyncio.get_running_loop()
+    metrics.install_toggle_signal(loop)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        # Начатые вызовы дорабатывают, новые не принимаются
+        loop.add_signal_handler(signum, lambda: asyncio.ensure_future(server.stop(settings.GRPC_SHUTDOWN_GRACE)))
+    stop_event = asyncio.Event()
+    tasks = []
+    if settings.BALANCE_NOTIFY_ENABLED:
+        tasks.append(asyncio.create_task(balance_events.listen(stop_event)))
+    if replica_router.replicas:
+        balance_events.subscribe(replica_router.remember_writes)
+        tasks.append(asyncio.create_task(replica_router.run_health_checks(stop_event, settings.DB_REPLICA_CHECK_INTERVAL)))
     await server.start()
-    await server.wait_for_termination()
+    try:
+        await server.wait_for_termination()
+    finally:
+        stop_event.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import grpc
+from google.protobuf.timestamp_pb2 import Timestamp
+from pydantic import ValidationError
+
+from app.core import settings
+from app.db import AsyncSessionLocal, AsyncReadSessionLocal, parse_read_consistency
+from app.models import UserBalance, BalanceTransaction, TransactionStatus
+from app.schemas.user_balance_schema import BalanceRead
+from app.schemas.batch import BatchItemResult
+from app.schemas.transactions import TransactionResponse
+from app.services.balance_service import BalanceService
+from app.services.coalescer import coalescer, operation
+from .server import operation_from_pb
+from . import balance_v2_pb2, balance_v2_pb2_grpc
+
+_STATUS_TO_PB = {status.value: balance_v2_pb2.TransactionStatus.Value(f"TRANSACTION_STATUS_{status.name}") for status in TransactionStatus}
+
+
+def dt_to_pb(dt: datetime | None) -> Timestamp | None:
+    if dt is None:
+        return None
+    timestamp = Timestamp()
+    # В БД хранится наивное UTC-время (datetime.utcnow)
+    timestamp.FromDatetime(dt)
+    return timestamp
+
+
+def balance_to_pb(bal: UserBalance | BalanceRead) -> balance_v2_pb2.BalanceResponse:
+    return balance_v2_pb2.BalanceResponse(user_id=bal.user_id, current=bal.current, maximum=bal.maximum, locked_total=bal.locked_total)
+
+
+def transaction_to_pb(tx: BalanceTransaction | TransactionResponse) -> balance_v2_pb2.TransactionResponse:
+    status = tx.status.value if isinstance(tx.status, TransactionStatus) else tx.status
+    return balance_v2_pb2.TransactionResponse(
+        id=tx.id,
+        user_id=tx.user_id,
+        service_id=tx.service_id,
+        external_tx_id=tx.external_tx_id,
+        amount=tx.amount,
+        status=_STATUS_TO_PB[status],
+        created_at=dt_to_pb(tx.created_at),
+        expires_at=dt_to_pb(tx.expires_at),
+        closed_at=dt_to_pb(tx.closed_at),
+    )
+
+
+def batch_item_to_pb(item: BatchItemResult) -> balance_v2_pb2.BatchItemResult:
+    message = balance_v2_pb2.BatchItemResult(index=item.index, ok=item.ok, error=item.error or "")
+    if item.balance is not None:
+        message.balance.CopyFrom(balance_to_pb(item.balance))
+    if item.transaction is not None:
+        message.transaction.CopyFrom(transaction_to_pb(item.transaction))
+    return message
+
+
+class BalanceAPIV2(balance_v2_pb2_grpc.BalanceAPIServicer):
+    """balance.v2: время в google.protobuf.Timestamp, статус транзакции — enum."""
+
+    async def GetBalance(self, request, context):
+        metadata = dict(context.invocation_metadata() or ())
+        consistency = parse_read_consistency(metadata.get("x-min-lsn"), metadata.get("x-max-staleness"))
+        async with AsyncReadSessionLocal(user_id=request.user_id, **consistency) as session:
+            bal = await BalanceService(session).read_balance(request.user_id)
+        return balance_to_pb(bal)
+
+    async def AdjustLimits(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return balance_to_pb(await coalescer.apply(operation("adjust_limits", request.user_id, delta=int(request.delta))))
+        async with AsyncSessionLocal() as session:
+            bal = await BalanceService(session).adjust_limits(request.user_id, int(request.delta))
+            await session.commit()
+            return balance_to_pb(bal)
+
+    async def AdjustCurrent(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return balance_to_pb(await coalescer.apply(operation("adjust_current", request.user_id, delta=int(request.delta))))
+        async with AsyncSessionLocal() as session:
+            bal = await BalanceService(session).adjust_current(request.user_id, int(request.delta))
+            await session.commit()
+            return balance_to_pb(bal)
+
+    async def OpenTransaction(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return transaction_to_pb(await coalescer.apply(operation(
+                "open_transaction", request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id,
+                amount=int(request.amount), timeout_seconds=int(request.timeout_seconds),
+            )))
+        async with AsyncSessionLocal() as session:
+            tx = await BalanceService(session).open_transaction(user_id=request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id, amount=int(request.amount), timeout_seconds=int(request.timeout_seconds))
+            await session.commit()
+            return transaction_to_pb(tx)
+
+    async def ConfirmTransaction(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return transaction_to_pb(await coalescer.apply(operation("confirm_transaction", request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id)))
+        async with AsyncSessionLocal() as session:
+            tx = await BalanceService(session).confirm_transaction(user_id=request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id)
+            await session.commit()
+            return transaction_to_pb(tx)
+
+    async def CancelTransaction(self, request, context):
+        if settings.COALESCE_ENABLED:
+            return transaction_to_pb(await coalescer.apply(operation("cancel_transaction", request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id)))
+        async with AsyncSessionLocal() as session:
+            tx = await BalanceService(session).cancel_transaction(user_id=request.user_id, service_id=request.service_id, external_tx_id=request.external_tx_id)
+            await session.commit()
+            return transaction_to_pb(tx)
+
+    async def BatchApply(self, request, context):
+        try:
+            operations = [operation_from_pb(message) for message in request.operations]
+        except (ValueError, ValidationError) as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        if not operations:
+            return balance_v2_pb2.BatchApplyResponse()
+        async with AsyncSessionLocal() as session:
+            results = await BalanceService(session).apply_batch(operations)
+            await session.commit()
+        return balance_v2_pb2.BatchApplyResponse(results=[batch_item_to_pb(item) for item in results])
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict
+
+from app.db import AsyncSessionLocal
+from app.schemas.batch import BalanceOperation, BatchItemResult
+from app.services.balance_service import BalanceService
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class StreamApplier:
+    """Применяет поток операций ApplyStream.
+
+    Операции одного пользователя выполняются строго по порядку поступления одним воркером,
+    который держит одну сессию, пока у пользователя есть очередь; разные пользователи идут
+    параллельно, но не больше concurrency одновременно. Новое сообщение из потока читается,
+    только когда в работе меньше max_in_flight операций (результат считается в работе, пока
+    его не забрал клиент), поэтому медленный клиент упирается в flow control HTTP/2.
+    """
+
+    def __init__(self, max_in_flight: int, concurrency: int, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._db_slots = asyncio.Semaphore(concurrency)
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: set = set()
+        self._results: asyncio.Queue = asyncio.Queue()
+
+    async def run(self, requests: AsyncIterator, parse) -> AsyncIterator:
+        reader = asyncio.create_task(self._read(requests, parse))
+        try:
+            while True:
+                item = await self._results.get()
+                if item is _DONE:
+                    break
+                self._in_flight.release()
+                yield item
+            await reader
+        finally:
+            reader.cancel()
+            for worker in list(self._workers):
+                worker.cancel()
+
+    async def _read(self, requests: AsyncIterator, parse) -> None:
+        try:
+            async for message in requests:
+                await self._in_flight.acquire()
+                try:
+                    correlation_id, op = parse(message)
+                except ValueError as e:
+                    self._results.put_nowait((getattr(message, "correlation_id", ""), BatchItemResult(index=0, ok=False, error=str(e))))
+                    continue
+                self._enqueue(correlation_id, op)
+            if self._workers:
+                await asyncio.gather(*self._workers, return_exceptions=True)
+        finally:
+            await self._results.put(_DONE)
+
+    def _enqueue(self, correlation_id: str, op: BalanceOperation) -> None:
+        queue = self._queues.get(op.user_id)
+        if queue is None:
+            queue = self._queues[op.user_id] = asyncio.Queue()
+            worker = asyncio.create_task(self._drain(op.user_id, queue))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        queue.put_nowait((correlation_id, op))
+
+    async def _drain(self, user_id: str, queue: asyncio.Queue) -> None:
+        pending = None
+        try:
+            async with self._db_slots:
+                async with self.session_factory() as session:
+                    service = BalanceService(session)
+                    while not queue.empty():
+                        pending = queue.get_nowait()
+                        self._results.put_nowait((pending[0], await self._apply(session, service, pending[1])))
+                        pending = None
+                    # Без await между проверкой и удалением: следующая операция пользователя запустит нового воркера
+                    del self._queues[user_id]
+        except Exception:
+            logger.exception("ApplyStream worker for %s failed", user_id)
+        finally:
+            # Воркер упал (например, rollback на оборванном соединении) или отменён: очередь снимается, а операции
+            # без ответа получают ошибку, иначе их разрешения _in_flight не вернутся и поток встанет
+            if self._queues.get(user_id) is queue:
+                del self._queues[user_id]
+            unanswered = [pending] if pending is not None else []
+            while not queue.empty():
+                unanswered.append(queue.get_nowait())
+            for correlation_id, _ in unanswered:
+                self._results.put_nowait((correlation_id, BatchItemResult(index=0, ok=False, error="Внутренняя ошибка")))
+
+    async def _apply(self, session, service: BalanceService, op: BalanceOperation) -> BatchItemResult:
+        try:
+            result = await service.apply_operation(op)
+            item = service.item_result(0, result)
+            await session.commit()
+            return item
+        except ValueError as e:
+            await session.rollback()
+            return BatchItemResult(index=0, ok=False, error=str(e))
+        except Exception:
+            await session.rollback()
+            logger.exception("ApplyStream operation failed")
+            return BatchItemResult(index=0, ok=False, error="Внутренняя ошибка")
@@ -1,3 +1,5 @@
 from app.handlers.balance import router as balance_router
+from app.handlers.admin import router as admin_router
+from app.handlers.metrics import router as metrics_router
 
-routers = [balance_router]
+routers = [balance_router, admin_router, metrics_router]
@@ -0,0 +1,148 @@
+import secrets
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import settings
+from app.core.metrics import timers
+from app.db import get_db, replica_router, pool_stats
+from app.repositories import OutboxRepository, LedgerRepository
+from app.schemas.mapping import balance_read
+from app.schemas.user_balance_schema import BalanceRead, SetStripesRequest, StripedBalanceRead, StripeRead
+from app.services.balance_cache import balance_cache
+from app.services.balance_service import BalanceService
+from app.services.bulk import BalanceImportJob, stream_export
+from app.services.idempotency import idempotency_cache
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def require_admin(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> None:
+    """Доступ к /admin только с ADMIN_TOKEN: эндпоинты перезаписывают балансы и выгружают таблицы целиком."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Админ-эндпоинты выключены: не задан ADMIN_TOKEN")
+    if credentials is None or not secrets.compare_digest(credentials.credentials.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный токен", headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix='/admin', tags=['admin'], dependencies=[Depends(require_admin)])
+
+
+@router.get("/cache")
+async def cache_stats():
+    return balance_cache.stats()
+
+
+@router.get("/idempotency")
+async def idempotency_stats():
+    return idempotency_cache.stats()
+
+
+@router.get("/replicas")
+async def replica_stats():
+    return replica_router.stats()
+
+
+@router.get("/pool")
+async def pool_statistics():
+    return pool_stats()
+
+
+@router.get("/metrics/timers")
+async def stage_timers():
+    return {"enabled": timers.enabled}
+
+
+@router.post("/metrics/timers")
+async def set_stage_timers(enabled: bool):
+    # Только этот процесс; во всех воркерах uvicorn — SIGUSR1 каждому
+    timers.enabled = enabled
+    return {"enabled": timers.enabled}
+
+
+@router.get("/outbox")
+async def outbox_stats(session: AsyncSession = Depends(get_db)):
+    repo = OutboxRepository(session)
+    return {
+        "enabled": settings.OUTBOX_ENABLED,
+        "pending": await repo.count_pending(),
+        "first_retained_seq": await repo.first_retained_seq(),
+        "cursors": await repo.list_cursors(),
+    }
+
+
+@router.get("/ledger/{user_id}")
+async def get_ledger_balance(user_id: str, session: AsyncSession = Depends(get_db)):
+    row = await LedgerRepository(session).replay(user_id)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Баланс не найден")
+    return {
+        "user_id": user_id,
+        "actual": {"current": row.actual_current, "maximum": row.actual_maximum, "locked_total": row.actual_locked_total},
+        "ledger": {"current": row.current, "maximum": row.maximum, "locked_total": row.locked_total},
+        "entries_since_snapshot": row.entries,
+    }
+
+
+@router.post("/ledger/{user_id}/rebuild", response_model=BalanceRead)
+async def rebuild_balance(user_id: str, session: AsyncSession = Depends(get_db)):
+    # Отказ (BalanceError) — 400 обработчиком приложения, незакоммиченное откатывает закрытие сессии
+    balance = await BalanceService(session).rebuild_user_balance(user_id)
+    await session.commit()
+    return balance_read(balance)
+
+
+async def _striped_balance(service: BalanceService, user_id: str) -> StripedBalanceRead:
+    balance = await service.get_balance(user_id)
+    stripes = await service.repo.list_stripes(user_id)
+    return StripedBalanceRead(
+        user_id=user_id,
+        current=balance.current,
+        maximum=balance.maximum,
+        locked_total=balance.locked_total,
+        stripes=[StripeRead(stripe=s.stripe, current=s.current, maximum=s.maximum, locked_total=s.locked_total) for s in stripes],
+    )
+
+
+@router.get("/balance/{user_id}/stripes", response_model=StripedBalanceRead)
+async def get_stripes(user_id: str, session: AsyncSession = Depends(get_db)):
+    return await _striped_balance(BalanceService(session), user_id)
+
+
+@router.post("/balance/{user_id}/stripes", response_model=StripedBalanceRead)
+async def set_stripes(user_id: str, request: SetStripesRequest, session: AsyncSession = Depends(get_db)):
+    service = BalanceService(session)
+    await service.set_stripes(user_id, request.stripes)
+    await session.commit()
+    return await _striped_balance(service, user_id)
+
+
+@router.post("/import")
+async def import_balances(request: Request, header: bool = True, insert_only: bool = False, max_rejects: int = 1000):
+    """Тело запроса — CSV (user_id,current,maximum); в ответе отчёт и первые max_rejects отклонённых строк."""
+    rejects = []
+
+    async def keep(reject) -> None:
+        if len(rejects) < max_rejects:
+            rejects.append(asdict(reject))
+
+    report = await BalanceImportJob(insert_only=insert_only).run(request.stream(), header=header, on_reject=keep)
+    return {**asdict(report), "rejects": rejects}
+
+
+@router.get("/export/{table}")
+async def export_table(table: str):
+    chunks = stream_export(table)
+    # Неизвестная таблица — 400 до начала ответа, а не обрыв уже начатого потока
+    first = await anext(chunks, b"")
+    return StreamingResponse(_prepend(first, chunks), media_type="text/csv")
+
+
+async def _prepend(first: bytes, chunks):
+    yield first
+    async for chunk in chunks:
+        yield chunk
@@ -1,160 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Request
 
-from app.db import get_db
+from app.db import read_consistency
 from app.schemas.user_balance_schema import BalanceRead, AdjustLimitsRequest, AdjustCurrentRequest
 from app.schemas.transactions import (
     CreateTransactionRequest,
     TransactionResponse,
     ServiceIdRequest,
 )
-from app.services.balance_service import BalanceService
+from app.schemas.batch import BatchRequest, BatchResponse
+from app.handlers.responses import respond
+from app.services.balance_facade import balance_facade
+from app.services.coalescer import operation
 
+# Отказы сервиса (BalanceError) отвечаются 400 обработчиком исключений приложения (app.handlers.responses.balance_error)
 router = APIRouter(prefix='/balance', tags=['balance'])
 
+
+@router.post("/batch", response_model=BatchResponse)
+async def apply_batch(request: BatchRequest):
+    return respond(BatchResponse(results=await balance_facade.apply_batch(request.operations)))
+
 @router.get("/{user_id}", response_model=BalanceRead)
-async def get_balance(user_id: str, session: AsyncSession = Depends(get_db)):
-    service = BalanceService(session)
-    balance = await service.get_balance(user_id)
-    await session.commit()  # Коммитим транзакцию
-    return BalanceRead(
-        user_id=balance.user_id,
-        current=balance.current,
-        maximum=balance.maximum,
-        locked_total=balance.locked_total
-    )
+async def get_balance(user_id: str, request: Request):
+    return respond(await balance_facade.read_balance(user_id, **read_consistency(request)))
 
 @router.post("/{user_id}/limits", response_model=BalanceRead)
-async def adjust_limits(
-    user_id: str,
-    request: AdjustLimitsRequest,
-    session: AsyncSession = Depends(get_db),
-):
-    service = BalanceService(session)
-    try:
-        balance = await service.adjust_limits(user_id, request.delta)
-        await session.commit()
-        return BalanceRead(
-            user_id=balance.user_id,
-            current=balance.current,
-            maximum=balance.maximum,
-            locked_total=balance.locked_total
-        )
-    except ValueError as e:
-        await session.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+async def adjust_limits(user_id: str, request: AdjustLimitsRequest):
+    return respond(await balance_facade.apply(operation("adjust_limits", user_id, delta=request.delta)))
 
 @router.post("/{user_id}/current", response_model=BalanceRead)
-async def adjust_current(
-    user_id: str,
-    request: AdjustCurrentRequest,
-    session: AsyncSession = Depends(get_db),
-):
-    service = BalanceService(session)
-    try:
-        balance = await service.adjust_current(user_id, request.delta)
-        await session.commit()
-        return BalanceRead(
-            user_id=balance.user_id,
-            current=balance.current,
-            maximum=balance.maximum,
-            locked_total=balance.locked_total
-        )
-    except ValueError as e:
-        await session.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+async def adjust_current(user_id: str, request: AdjustCurrentRequest):
+    return respond(await balance_facade.apply(operation("adjust_current", user_id, delta=request.delta)))
 
 @router.post("/{user_id}/transactions", response_model=TransactionResponse)
-async def open_transaction(
-    user_id: str,
-    request: CreateTransactionRequest,
-    session: AsyncSession = Depends(get_db),
-):
-    service = BalanceService(session)
-    try:
-        transaction = await service.open_transaction(
-            user_id=user_id,
-            service_id=request.service_id,
-            external_tx_id=request.external_tx_id,
-            amount=request.amount,
-            timeout_seconds=request.timeout_seconds,
-        )
-        await session.commit()
-        return TransactionResponse(
-            id=transaction.id,
-            user_id=transaction.user_id,
-            service_id=transaction.service_id,
-            external_tx_id=transaction.external_tx_id,
-            amount=transaction.amount,
-            status=transaction.status.value,
-            created_at=transaction.created_at,
-            expires_at=transaction.expires_at,
-            closed_at=transaction.closed_at
-        )
-    except ValueError as e:
-        await session.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+async def open_transaction(user_id: str, request: CreateTransactionRequest):
+    return respond(await balance_facade.apply(operation(
+        "open_transaction", user_id, service_id=request.service_id, external_tx_id=request.external_tx_id,
+        amount=request.amount, timeout_seconds=request.timeout_seconds,
+    )))
 
 @router.post("/{user_id}/transactions/{external_tx_id}/confirm", response_model=TransactionResponse)
-async def confirm_transaction(
-    user_id: str,
-    external_tx_id: str,
-    request: ServiceIdRequest,
-    session: AsyncSession = Depends(get_db),
-):
-    service = BalanceService(session)
-    try:
-        transaction = await service.confirm_transaction(user_id, request.service_id, external_tx_id)
-        await session.commit()
-        return TransactionResponse(
-            id=transaction.id,
-            user_id=transaction.user_id,
-            service_id=transaction.service_id,
-            external_tx_id=transaction.external_tx_id,
-            amount=transaction.amount,
-            status=transaction.status.value,
-            created_at=transaction.created_at,
-            expires_at=transaction.expires_at,
-            closed_at=transaction.closed_at
-        )
-    except ValueError as e:
-        await session.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+async def confirm_transaction(user_id: str, external_tx_id: str, request: ServiceIdRequest):
+    return respond(await balance_facade.apply(operation("confirm_transaction", user_id, service_id=request.service_id, external_tx_id=external_tx_id)))
 
 @router.post("/{user_id}/transactions/{external_tx_id}/cancel", response_model=TransactionResponse)
-async def cancel_transaction(
-    user_id: str,
-    external_tx_id: str,
-    request: ServiceIdRequest,
-    session: AsyncSession = Depends(get_db),
-):
-    service = BalanceService(session)
-    try:
-        transaction = await service.cancel_transaction(user_id, request.service_id, external_tx_id)
-        await session.commit()
-        return TransactionResponse(
-            id=transaction.id,
-            user_id=transaction.user_id,
-            service_id=transaction.service_id,
-            external_tx_id=transaction.external_tx_id,
-            amount=transaction.amount,
-            status=transaction.status.value,
-            created_at=transaction.created_at,
-            expires_at=transaction.expires_at,
-            closed_at=transaction.closed_at
-        )
-    except ValueError as e:
-        await session.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+async def cancel_transaction(user_id: str, external_tx_id: str, request: ServiceIdRequest):
+    return respond(await balance_facade.apply(operation("cancel_transaction", user_id, service_id=request.service_id, external_tx_id=external_tx_id)))
 
 @router.post("/{user_id}/repair", response_model=BalanceRead)
-async def repair_balance(user_id: str, session: AsyncSession = Depends(get_db)):
-    service = BalanceService(session)
-    balance = await service.repair_user_balance(user_id)
-    await session.commit()
-    return BalanceRead(
-        user_id=balance.user_id,
-        current=balance.current,
-        maximum=balance.maximum,
-        locked_total=balance.locked_total
-    )
+async def repair_balance(user_id: str):
+    return respond(await balance_facade.repair(user_id))
@@ -0,0 +1,48 @@
+import time
+
+from fastapi import APIRouter, Response
+
+from app.core import metrics
+
+router = APIRouter(tags=['metrics'])
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+def _outcome(status_code: int) -> str:
+    # 400 — BalanceError сервиса (правила баланса), 422 — тело или параметры не прошли валидацию
+    if status_code < 400:
+        return "ok"
+    return {400: "conflict", 409: "conflict", 404: "not_found", 422: "validation"}.get(status_code, "error")
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время и исход HTTP-запросов по шаблону пути (/balance/{user_id}, а не каждому user_id)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Маршрут FastAPI кладёт в scope при сопоставлении; без маршрута — одна метка на все 404
+            route = scope.get("route")
+            method = f"{scope['method']} {route.path}" if route is not None else "unmatched"
+            metrics.REQUEST_SECONDS.labels("rest", method).observe(time.perf_counter() - started)
+            metrics.REQUESTS.labels("rest", method, _outcome(status_code)).inc()
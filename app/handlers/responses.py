@@ -0,0 +1,19 @@
+from fastapi import Request, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+from app.core.errors import BalanceError
+
+
+def respond(model: BaseModel) -> ORJSONResponse:
+    """Ответ без повторной проверки по response_model: схема уже собрана из данных БД.
+
+    response_model в декораторе остаётся для OpenAPI; готовый Response FastAPI отдаёт как есть.
+    """
+    return ORJSONResponse(model.model_dump())
+
+
+async def balance_error(request: Request, exc: BalanceError) -> ORJSONResponse:
+    # Отказ правил баланса — 400 с текстом ошибки, как HTTPException. Прочие ValueError — ошибки кода,
+    # их текст наружу не отдаётся (500)
+    return ORJSONResponse({"detail": str(exc)}, status_code=status.HTTP_400_BAD_REQUEST)
@@ -1,42 +1,45 @@
 import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
+from app.core import metrics, settings
+from app.core.errors import BalanceError
 from app.handlers import routers
-from app.db import engine, AsyncSessionLocal
-from app.models import Base
-from app.services.balance_service import BalanceService
+from app.handlers.metrics import MetricsMiddleware
+from app.handlers.responses import balance_error
+from app.db import engine, replica_router
+from app.db.migrations import check_schema
+from app.services import balance_events
+from app.services.jobs import start_background_jobs
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await check_schema(engine)
+    metrics.install_toggle_signal(asyncio.get_running_loop())
 
     stop_event = asyncio.Event()
-
-    async def _sweeper_loop():
-        while not stop_event.is_set():
-            try:
-                async with AsyncSessionLocal() as session:
-                    async with session.begin():
-                        service = BalanceService(session)
-                        await service.sweep_expired_transactions()
-            except Exception as e:
-                print(f"Sweeper error: {e}")
-            await asyncio.sleep(5.0)
-
-    task = asyncio.create_task(_sweeper_loop())
+    tasks = start_background_jobs(stop_event) if settings.BACKGROUND_JOBS_ENABLED else []
+    if settings.BALANCE_NOTIFY_ENABLED:
+        tasks.append(asyncio.create_task(balance_events.listen(stop_event)))
+    if replica_router.replicas:
+        balance_events.subscribe(replica_router.remember_writes)
+        tasks.append(asyncio.create_task(replica_router.run_health_checks(stop_event, settings.DB_REPLICA_CHECK_INTERVAL)))
     try:
         yield
     finally:
         stop_event.set()
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
+        for task in tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_exception_handler(BalanceError, balance_error)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 for router in routers:
     app.include_router(router)
\ No newline at end of file
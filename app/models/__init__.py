@@ -3,6 +3,9 @@ from sqlalchemy.orm import declarative_base
 Base = declarative_base()
 
 from .user_balance import UserBalance
-from .transaction import BalanceTransaction, TransactionStatus
+from .user_balance_stripe import UserBalanceStripe
+from .transaction import BalanceTransaction, BalanceTransactionArchive, TransactionStatus
+from .outbox import OutboxEvent, OutboxCursor, OutboxEventType
+from .ledger import LedgerEntry, BalanceCheckpoint, BalanceSnapshot
 
-__all__ = ['Base', 'UserBalance', 'BalanceTransaction', 'TransactionStatus']
\ No newline at end of file
+__all__ = ['Base', 'UserBalance', 'UserBalanceStripe', 'BalanceTransaction', 'BalanceTransactionArchive', 'TransactionStatus', 'OutboxEvent', 'OutboxCursor', 'OutboxEventType', 'LedgerEntry', 'BalanceCheckpoint', 'BalanceSnapshot']
\ No newline at end of file
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Boolean, Integer, String, Enum, Index, text
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from sqlalchemy.types import UserDefinedType
+from . import Base
+from .outbox import OutboxEventType
+
+
+class XID8(UserDefinedType):
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "xid8"
+
+
+class PgSnapshot(UserDefinedType):
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "pg_snapshot"
+
+
+class LedgerEntry(Base):
+    """Запись журнала баланса: знаковые изменения current/maximum/locked_total одной мутации.
+
+    Журнал только дописывается, в той же транзакции, что и мутация. xid — id этой транзакции:
+    по нему снимок (BalanceCheckpoint) определяет, вошла ли запись в снимок.
+    """
+    __tablename__ = "balance_ledger"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    user_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    xid: Mapped[int] = mapped_column(XID8, nullable=False, server_default=text("pg_current_xact_id()"))
+    type: Mapped[OutboxEventType] = mapped_column(Enum(OutboxEventType, native_enum=False, length=32), nullable=False)
+    current_delta: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    maximum_delta: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    locked_delta: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    transaction_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # Воспроизведение: записи пользователя после xmin его снимка
+        Index("idx_ledger_user_xid", "user_id", "xid"),
+    )
+
+    def __repr__(self) -> str:
+        return f"<LedgerEntry id={self.id} user_id={self.user_id} type={self.type} current={self.current_delta} max={self.maximum_delta} locked={self.locked_delta}>"
+
+
+class BalanceCheckpoint(Base):
+    """Точка снимка: snapshot — снимок транзакций БД, в которой считались балансы.
+
+    Запись журнала вошла в снимки этой точки, если её xid виден в snapshot.
+    baseline — балансы взяты из user_balances как есть (начало журнала), а не из журнала.
+    """
+    __tablename__ = "balance_checkpoints"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    snapshot: Mapped[str] = mapped_column(PgSnapshot, nullable=False, server_default=text("pg_current_snapshot()"))
+    baseline: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    users: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(nullable=False, server_default=func.now())
+
+
+class BalanceSnapshot(Base):
+    """Последний снимок баланса пользователя; баланс = снимок + записи журнала, не вошедшие в его точку."""
+    __tablename__ = "balance_snapshots"
+
+    user_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    checkpoint_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    current: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    maximum: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    locked_total: Mapped[int] = mapped_column(BigInteger, nullable=False)
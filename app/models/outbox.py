@@ -0,0 +1,56 @@
+from datetime import datetime
+import enum
+
+from sqlalchemy import BigInteger, String, Enum, Index, text
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from . import Base
+
+
+class OutboxEventType(enum.Enum):
+    LIMITS_ADJUSTED = "limits_adjusted"
+    CURRENT_ADJUSTED = "current_adjusted"
+    TRANSACTION_OPENED = "transaction_opened"
+    TRANSACTION_CONFIRMED = "transaction_confirmed"
+    TRANSACTION_CANCELED = "transaction_canceled"
+    TRANSACTION_EXPIRED = "transaction_expired"
+    BALANCE_REPAIRED = "balance_repaired"
+    BALANCE_IMPORTED = "balance_imported"
+
+
+class OutboxEvent(Base):
+    """Событие изменения баланса; пишется в той же транзакции, что и само изменение.
+
+    seq — позиция в потоке без пропусков, её назначает релей (app.services.outbox) после коммита.
+    amount: delta для *_ADJUSTED, сумма транзакции для TRANSACTION_*, locked_total после BALANCE_REPAIRED,
+    current после BALANCE_IMPORTED.
+    """
+    __tablename__ = "balance_outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    type: Mapped[OutboxEventType] = mapped_column(Enum(OutboxEventType, native_enum=False, length=32), nullable=False)
+    user_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    transaction_id: Mapped[int] = mapped_column(BigInteger, nullable=True)
+    service_id: Mapped[str] = mapped_column(String(128), nullable=True)
+    external_tx_id: Mapped[str] = mapped_column(String(128), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # Ещё не пронумерованные релеем события и чтение потока по seq
+        Index("idx_outbox_unsequenced", "id", postgresql_where=text("seq IS NULL")),
+        Index("idx_outbox_seq", "seq", unique=True, postgresql_where=text("seq IS NOT NULL")),
+    )
+
+    def __repr__(self) -> str:
+        return f"<OutboxEvent id={self.id} seq={self.seq} type={self.type} user_id={self.user_id} amount={self.amount}>"
+
+
+class OutboxCursor(Base):
+    """Позиции в потоке: 'stream' — последний назначенный seq, остальные — доставленный приёмнику."""
+    __tablename__ = "balance_outbox_cursors"
+
+    name: Mapped[str] = mapped_column(String(256), primary_key=True)
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(nullable=False, server_default=func.now(), onupdate=func.now())
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from datetime import datetime
-from sqlalchemy import BigInteger, String, CheckConstraint, Enum, Index
+from sqlalchemy import BigInteger, SmallInteger, String, CheckConstraint, Enum, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 from . import Base
 import enum
@@ -10,27 +10,63 @@ class TransactionStatus(enum.Enum):
     CONFIRMED = "confirmed"
     CANCELED = "canceled"
 
+# Условие частичных индексов. Запросы по открытым транзакциям сравнивают статус с литералом
+# (см. _IS_LOCKED в репозитории), иначе с параметром планировщик не докажет, что индекс подходит
+LOCKED_ONLY = text("status = 'LOCKED'")
+
+
 class BalanceTransaction(Base):
     __tablename__ = "balance_transactions"
     
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    user_id: Mapped[str] = mapped_column(String(128), nullable=False, index=True)
-    service_id: Mapped[str] = mapped_column(String(128), nullable=False, index=True)
-    external_tx_id: Mapped[str] = mapped_column(String(128), nullable=False, index=True)
+    user_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    service_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    external_tx_id: Mapped[str] = mapped_column(String(128), nullable=False)
     amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
-    status: Mapped[TransactionStatus] = mapped_column(Enum(TransactionStatus), nullable=False, default=TransactionStatus.LOCKED, index=True)
+    status: Mapped[TransactionStatus] = mapped_column(Enum(TransactionStatus), nullable=False, default=TransactionStatus.LOCKED)
     created_at: Mapped[datetime] = mapped_column(nullable=False, default=datetime.utcnow)
     expires_at: Mapped[datetime] = mapped_column(nullable=False)
     closed_at: Mapped[datetime] = mapped_column(nullable=True)
+    # Полоса баланса, на которой заблокированы средства (только у полосатых аккаунтов)
+    stripe: Mapped[int] = mapped_column(SmallInteger, nullable=True)
     
     __table_args__ = (
         CheckConstraint("amount > 0", name="check_amount_positive"),
         Index("idx_user_service_external_unique", "user_id", "service_id", "external_tx_id", unique=True),
-        Index("idx_user_status", "user_id", "status"),
-        Index("idx_expires_status", "status", "expires_at"),
+        # Индексируются только открытые транзакции: закрытые (подавляющее большинство) не раздувают индексы,
+        # а INCLUDE-колонки дают index-only scan для сумм locked_total (repair) и выбора пачки свипера
+        Index("idx_locked_user_stripe", "user_id", "stripe", postgresql_include=["amount"], postgresql_where=LOCKED_ONLY),
+        Index("idx_locked_expires", "expires_at", postgresql_include=["user_id", "stripe"], postgresql_where=LOCKED_ONLY),
+        # Кандидаты в архив: закрытые транзакции старше окна хранения
+        Index("idx_closed_at", "closed_at", postgresql_where=text("closed_at IS NOT NULL")),
     )
     
     def __repr__(self) -> str:
         return f"<BalanceTransaction id={self.id} user_id={self.user_id} amount={self.amount} status={self.status}>"
 
 
+class BalanceTransactionArchive(Base):
+    """Закрытые транзакции старше TRANSACTION_RETENTION_HOURS (см. app.services.archiver).
+
+    Таблица секционирована по created_at (RANGE, секция на месяц); секции создаются архиватором заранее.
+    """
+    __tablename__ = "balance_transactions_archive"
+    
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    service_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    external_tx_id: Mapped[str] = mapped_column(String(128), nullable=False)
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    status: Mapped[TransactionStatus] = mapped_column(Enum(TransactionStatus), nullable=False)
+    # Ключ секционирования обязан входить в первичный ключ
+    created_at: Mapped[datetime] = mapped_column(primary_key=True)
+    expires_at: Mapped[datetime] = mapped_column(nullable=False)
+    closed_at: Mapped[datetime] = mapped_column(nullable=True)
+    stripe: Mapped[int] = mapped_column(SmallInteger, nullable=True)
+    
+    __table_args__ = (
+        Index("idx_archive_user_created", "user_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
-from sqlalchemy import BigInteger, String, CheckConstraint
+from sqlalchemy import BigInteger, SmallInteger, String, CheckConstraint
 from datetime import datetime
 from . import Base
 
@@ -10,6 +10,8 @@ class UserBalance(Base):
     current: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
     maximum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
     locked_total: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # > 0 — баланс разбит на столько полос user_balance_stripes, а current/maximum/locked_total здесь нулевые
+    stripes: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(nullable=False, server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(nullable=False, server_default=func.now(), onupdate=func.now())
     
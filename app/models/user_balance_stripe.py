@@ -0,0 +1,27 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+from sqlalchemy import BigInteger, SmallInteger, String, CheckConstraint
+from datetime import datetime
+from . import Base
+
+class UserBalanceStripe(Base):
+    """Полоса (sub-balance) баланса горячего аккаунта; баланс пользователя — сумма полос."""
+    __tablename__ = "user_balance_stripes"
+    user_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    stripe: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    current: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    maximum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    locked_total: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(nullable=False, server_default=func.now(), onupdate=func.now())
+    
+    # Те же инварианты, что у user_balances: выполняясь для каждой полосы, они выполняются и для суммы
+    __table_args__ = (
+        CheckConstraint("current >= 0", name="check_stripe_current_nonnegative"),
+        CheckConstraint("maximum >= 0", name="check_stripe_maximum_nonnegative"),
+        CheckConstraint("locked_total >= 0", name="check_stripe_locked_nonnegative"),
+        CheckConstraint("current <= maximum", name="check_stripe_current_le_maximum"),
+        CheckConstraint("current + locked_total <= maximum", name="check_stripe_current_plus_locked_le_maximum"),
+    )
+    
+    def __repr__(self) -> str:
+        return f"<UserBalanceStripe user_id={self.user_id} stripe={self.stripe} current={self.current} max={self.maximum} locked={self.locked_total}>"
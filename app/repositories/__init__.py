@@ -1,5 +1,5 @@
 from .balance_repository import BalanceRepository
+from .outbox_repository import OutboxRepository
+from .ledger_repository import LedgerRepository
 
-__all__ = ["BalanceRepository"]
-
-
+__all__ = ["BalanceRepository", "OutboxRepository", "LedgerRepository"]
@@ -1,12 +1,170 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List, Dict, Tuple
 
-from sqlalchemy import select, and_, func
+from sqlalchemy import (
+    select, update, insert, delete, cast, literal, literal_column, and_, or_, case, func, bindparam, any_, text,
+    BigInteger, String, Text, Table, Column, Identity, Index, MetaData,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.schema import CreateIndex, CreateTable, DropTable
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import UserBalance, BalanceTransaction, TransactionStatus
+from app.core import settings
+from app.core.errors import BalanceError, InsufficientFundsError, InvalidOperationError
+from app.core.metrics import timers
+from app.models import UserBalance, UserBalanceStripe, BalanceTransaction, BalanceTransactionArchive, TransactionStatus, OutboxEvent, OutboxEventType, LedgerEntry
+
+# Фиксированные запросы горячего пути собираются один раз: SQLAlchemy берёт их компиляцию из кэша,
+# а одинаковый текст SQL попадает в кэш подготовленных выражений asyncpg
+_GET_BALANCE = select(UserBalance).where(UserBalance.user_id == bindparam("user_id"))
+_LOCK_BALANCE = _GET_BALANCE.with_for_update()
+# Для ответов на чтение достаточно кортежа колонок, без ORM-объекта и identity map.
+# У полосатого аккаунта баланс — сумма полос, читается тем же запросом (один снимок)
+_STRIPE_TOTALS = (
+    select(
+        func.sum(UserBalanceStripe.current).label("current"),
+        func.sum(UserBalanceStripe.maximum).label("maximum"),
+        func.sum(UserBalanceStripe.locked_total).label("locked_total"),
+    )
+    .where(UserBalanceStripe.user_id == UserBalance.user_id)
+    .lateral("stripe_totals")
+)
+_GET_BALANCE_ROW = (
+    select(
+        UserBalance.user_id,
+        (UserBalance.current + func.coalesce(_STRIPE_TOTALS.c.current, 0)).label("current"),
+        (UserBalance.maximum + func.coalesce(_STRIPE_TOTALS.c.maximum, 0)).label("maximum"),
+        (UserBalance.locked_total + func.coalesce(_STRIPE_TOTALS.c.locked_total, 0)).label("locked_total"),
+    )
+    .outerjoin(_STRIPE_TOTALS, UserBalance.stripes > 0)
+    .where(UserBalance.user_id == bindparam("user_id"))
+)
+_LIST_STRIPES = select(UserBalanceStripe).where(UserBalanceStripe.user_id == bindparam("user_id")).order_by(UserBalanceStripe.stripe)
+_LOCK_STRIPES = _LIST_STRIPES.with_for_update().execution_options(populate_existing=True)
+_TRY_LOCK_STRIPES = _LIST_STRIPES.with_for_update(skip_locked=True).execution_options(populate_existing=True)
+_LOCK_STRIPE = (
+    select(UserBalanceStripe)
+    .where(UserBalanceStripe.user_id == bindparam("user_id"), UserBalanceStripe.stripe == bindparam("stripe"))
+    .with_for_update()
+    .execution_options(populate_existing=True)
+)
+# Любая полоса, где хватает средств и лимита; занятые другими транзакциями пропускаются
+_PICK_STRIPE = (
+    select(UserBalanceStripe)
+    .where(
+        UserBalanceStripe.user_id == bindparam("user_id"),
+        UserBalanceStripe.current - UserBalanceStripe.locked_total >= bindparam("amount"),
+        UserBalanceStripe.current + UserBalanceStripe.locked_total + bindparam("amount") <= UserBalanceStripe.maximum,
+    )
+    .order_by(func.random())
+    .limit(1)
+    .with_for_update(skip_locked=True)
+    .execution_options(populate_existing=True)
+)
+# Статус открытой транзакции литералом, а не параметром: только так подходят частичные индексы
+# WHERE status = 'LOCKED' (и в generic-плане подготовленного выражения тоже)
+_IS_LOCKED = BalanceTransaction.status == literal_column(f"'{TransactionStatus.LOCKED.name}'")
+_GET_TRANSACTION = select(BalanceTransaction).where(
+    BalanceTransaction.user_id == bindparam("user_id"),
+    BalanceTransaction.service_id == bindparam("service_id"),
+    BalanceTransaction.external_tx_id == bindparam("external_tx_id"),
+)
+# Изменения (current, maximum, locked_total) на единицу суммы события — для записей журнала
+_LEDGER_DELTAS = {
+    OutboxEventType.LIMITS_ADJUSTED: (0, 1, 0),
+    OutboxEventType.CURRENT_ADJUSTED: (1, 0, 0),
+    OutboxEventType.TRANSACTION_OPENED: (0, 0, 1),
+    OutboxEventType.TRANSACTION_CONFIRMED: (-1, 0, -1),
+    OutboxEventType.TRANSACTION_CANCELED: (0, 0, -1),
+    OutboxEventType.TRANSACTION_EXPIRED: (0, 0, -1),
+}
+_SUM_LOCKED_TRANSACTIONS = select(func.coalesce(func.sum(BalanceTransaction.amount), 0)).where(
+    BalanceTransaction.user_id == bindparam("user_id"),
+    _IS_LOCKED,
+)
+# Массовая загрузка (app.services.bulk): строки файла как есть копируются COPY во временную таблицу,
+# проверяются одним запросом и вливаются в user_balances пачками по номеру строки.
+# Временные таблицы живут в сессии соединения загрузки
+_IMPORT_METADATA = MetaData()
+_IMPORT_ROWS = Table(
+    "balance_import_rows", _IMPORT_METADATA,
+    Column("line", BigInteger, Identity()),
+    Column("user_id", Text),
+    Column("current", Text),
+    Column("maximum", Text),
+    # Колонка выгрузки: locked_total следует из открытых транзакций и не загружается
+    Column("locked_total", Text),
+    prefixes=["TEMPORARY"],
+)
+_IMPORT_CHECKED = Table(
+    "balance_import_checked", _IMPORT_METADATA,
+    Column("line", BigInteger),
+    Column("user_id", Text),
+    Column("current", BigInteger),
+    Column("maximum", BigInteger),
+    # NULL — строка прошла проверку, иначе причина отказа
+    Column("status", Text),
+    prefixes=["TEMPORARY"],
+)
+_IMPORT_PENDING = Index("balance_import_pending", _IMPORT_CHECKED.c.line, postgresql_where=_IMPORT_CHECKED.c.status.is_(None))
+IMPORT_COLUMNS = tuple(column.name for column in _IMPORT_ROWS.c if column.name != "line")
+_NUMBER = "^-?[0-9]{1,18}$"
+
+
+def _check_import_rows():
+    rows = _IMPORT_ROWS
+    current, maximum = cast(rows.c.current, BigInteger), cast(rows.c.maximum, BigInteger)
+    # Ветви CASE вычисляются по порядку: к bigint приводятся только строки правильного формата
+    status = case(
+        (or_(rows.c.user_id.is_(None), rows.c.user_id == "", func.length(rows.c.user_id) > UserBalance.user_id.type.length), "invalid_user_id"),
+        # Первая строка пользователя решает, остальные — дубликаты. Сортировка по байтам (COLLATE "C"):
+        # равенство то же, а сравнение строк с учётом локали в разы дороже на миллионах строк
+        (func.row_number().over(partition_by=rows.c.user_id.collate("C"), order_by=rows.c.line) > 1, "duplicate"),
+        (or_(*(or_(column.is_(None), ~column.regexp_match(_NUMBER)) for column in (rows.c.current, rows.c.maximum))), "invalid_number"),
+        (current < 0, "check_current_nonnegative"),
+        (maximum < 0, "check_maximum_nonnegative"),
+        (current > maximum, "check_current_le_maximum"),
+    )
+    checked = select(rows.c.line, rows.c.user_id, rows.c.current, rows.c.maximum, status.label("status")).subquery("checked")
+    valid = checked.c.status.is_(None)
+    return insert(_IMPORT_CHECKED).from_select(
+        ["line", "user_id", "current", "maximum", "status"],
+        select(
+            checked.c.line,
+            checked.c.user_id,
+            case((valid, cast(checked.c.current, BigInteger))),
+            case((valid, cast(checked.c.maximum, BigInteger))),
+            checked.c.status,
+        ),
+    )
+
+
+_CHECK_IMPORT_ROWS = _check_import_rows()
+_IMPORT_CHUNK = (
+    select(_IMPORT_CHECKED.c.line, _IMPORT_CHECKED.c.user_id, _IMPORT_CHECKED.c.current, _IMPORT_CHECKED.c.maximum)
+    .where(_IMPORT_CHECKED.c.status.is_(None), _IMPORT_CHECKED.c.line > bindparam("after"), _IMPORT_CHECKED.c.line <= bindparam("upto"))
+)
+_IMPORT_REJECTS = (
+    select(_IMPORT_CHECKED.c.line, _IMPORT_CHECKED.c.user_id, _IMPORT_CHECKED.c.status)
+    .where(_IMPORT_CHECKED.c.status.isnot(None))
+    .order_by(_IMPORT_CHECKED.c.line)
+)
+# Выгрузка COPY TO; баланс полосатого аккаунта — сумма полос, как в ответах на чтение
+_EXPORTS = {
+    "user_balances": (
+        select(
+            UserBalance.user_id,
+            cast(UserBalance.current + func.coalesce(_STRIPE_TOTALS.c.current, 0), BigInteger).label("current"),
+            cast(UserBalance.maximum + func.coalesce(_STRIPE_TOTALS.c.maximum, 0), BigInteger).label("maximum"),
+            cast(UserBalance.locked_total + func.coalesce(_STRIPE_TOTALS.c.locked_total, 0), BigInteger).label("locked_total"),
+        )
+        .outerjoin(_STRIPE_TOTALS, UserBalance.stripes > 0)
+    ),
+    "balance_transactions": select(BalanceTransaction.__table__),
+}
+EXPORT_TABLES = tuple(_EXPORTS)
 
 
 class BalanceRepository:
@@ -14,9 +172,13 @@ class BalanceRepository:
         self.session = session
 
     async def get_balance(self, user_id: str) -> Optional[UserBalance]:
-        result = await self.session.execute(select(UserBalance).where(UserBalance.user_id == user_id))
+        result = await self.session.execute(_GET_BALANCE, {"user_id": user_id})
         return result.scalar_one_or_none()
 
+    async def get_balance_row(self, user_id: str):
+        result = await self.session.execute(_GET_BALANCE_ROW, {"user_id": user_id})
+        return result.one_or_none()
+
     async def create_balance(self, user_id: str) -> UserBalance:
         balance = UserBalance(user_id=user_id, current=0, maximum=0, locked_total=0)
         self.session.add(balance)
@@ -24,68 +186,678 @@ class BalanceRepository:
         return balance
 
     async def lock_balance(self, user_id: str) -> UserBalance:
-        result = await self.session.execute(select(UserBalance).where(UserBalance.user_id == user_id).with_for_update())
+        started = timers.start()
+        result = await self.session.execute(_LOCK_BALANCE, {"user_id": user_id})
+        timers.observe("lock", started)
         balance = result.scalar_one_or_none()
         if balance is None:
             balance = await self.create_balance(user_id)
         return balance
 
+    async def lock_balances(self, user_ids: List[str]) -> Dict[str, UserBalance]:
+        # Один SELECT ... FOR UPDATE на всех пользователей, строки блокируются в порядке user_id
+        ordered_ids = sorted(set(user_ids))
+        started = timers.start()
+        result = await self.session.execute(select(UserBalance).where(UserBalance.user_id.in_(ordered_ids)).order_by(UserBalance.user_id).with_for_update())
+        timers.observe("lock", started)
+        balances = {balance.user_id: balance for balance in result.scalars().all()}
+        missing = [UserBalance(user_id=user_id, current=0, maximum=0, locked_total=0) for user_id in ordered_ids if user_id not in balances]
+        if missing:
+            self.session.add_all(missing)
+            await self.session.flush()
+            balances.update((balance.user_id, balance) for balance in missing)
+        return balances
+
     async def apply_limits_delta(self, balance: UserBalance, delta: int) -> UserBalance:
         new_maximum = balance.maximum + delta
         if new_maximum < 0:
-            raise ValueError("Максимальный баланс не может быть отрицательным")
+            raise BalanceError("Максимальный баланс не может быть отрицательным")
         if new_maximum < balance.current + balance.locked_total:
-            raise ValueError("Новый максимум меньше текущего баланса + заблокированных средств")
+            raise BalanceError("Новый максимум меньше текущего баланса + заблокированных средств")
         balance.maximum = new_maximum
+        self.add_event(OutboxEventType.LIMITS_ADJUSTED, balance.user_id, delta)
         return balance
 
     async def apply_current_delta(self, balance: UserBalance, delta: int) -> UserBalance:
         new_current = balance.current + delta
         if new_current < 0:
-            raise ValueError("Текущий баланс не может быть отрицательным")
+            raise InsufficientFundsError("Текущий баланс не может быть отрицательным")
         if new_current + balance.locked_total > balance.maximum:
-            raise ValueError("Текущий баланс + заблокированные средства превышают максимум")
+            raise BalanceError("Текущий баланс + заблокированные средства превышают максимум")
         balance.current = new_current
+        self.add_event(OutboxEventType.CURRENT_ADJUSTED, balance.user_id, delta)
         return balance
 
     async def increment_locked_total(self, balance: UserBalance, amount: int) -> None:
         if amount <= 0:
-            raise ValueError("Сумма должна быть положительной")
+            raise InvalidOperationError("Сумма должна быть положительной")
         if balance.locked_total + amount > balance.maximum - balance.current:
-            raise ValueError("Недостаточно доступного лимита для блокировки средств")
+            raise InsufficientFundsError("Недостаточно доступного лимита для блокировки средств")
         balance.locked_total += amount
 
     async def decrement_locked_total(self, balance: UserBalance, amount: int) -> None:
         if amount <= 0:
-            raise ValueError("Сумма должна быть положительной")
+            raise InvalidOperationError("Сумма должна быть положительной")
         if balance.locked_total - amount < 0:
-            raise ValueError("Заблокированные средства не могут быть отрицательными")
+            raise BalanceError("Заблокированные средства не могут быть отрицательными")
         balance.locked_total -= amount
 
+    # Атомарные мутации: один guarded UPDATE ... RETURNING вместо чтения под блокировкой и записи.
+    # Возвращают None, если строки нет, инвариант не выполнен или аккаунт полосатый — тогда сервис идёт обычным путём.
+
+    async def atomic_apply_limits_delta(self, user_id: str, delta: int) -> Optional[UserBalance]:
+        new_maximum = UserBalance.maximum + delta
+        stmt = (
+            update(UserBalance)
+            .where(UserBalance.user_id == user_id, UserBalance.stripes == 0, new_maximum >= 0, new_maximum >= UserBalance.current + UserBalance.locked_total)
+            .values(maximum=new_maximum)
+            .returning(UserBalance)
+        )
+        result = await self.session.execute(select(UserBalance).from_statement(stmt).execution_options(populate_existing=True))
+        balance = result.scalar_one_or_none()
+        if balance is not None:
+            self.add_event(OutboxEventType.LIMITS_ADJUSTED, user_id, delta)
+        return balance
+
+    async def atomic_apply_current_delta(self, user_id: str, delta: int) -> Optional[UserBalance]:
+        new_current = UserBalance.current + delta
+        stmt = (
+            update(UserBalance)
+            .where(UserBalance.user_id == user_id, UserBalance.stripes == 0, new_current >= 0, new_current + UserBalance.locked_total <= UserBalance.maximum)
+            .values(current=new_current)
+            .returning(UserBalance)
+        )
+        result = await self.session.execute(select(UserBalance).from_statement(stmt).execution_options(populate_existing=True))
+        balance = result.scalar_one_or_none()
+        if balance is not None:
+            self.add_event(OutboxEventType.CURRENT_ADJUSTED, user_id, delta)
+        return balance
+
+    async def atomic_open_transaction(self, user_id: str, service_id: str, external_tx_id: str, amount: int, expires_at: datetime) -> Optional[BalanceTransaction]:
+        # WITH locked AS (SELECT user_id FROM user_balances WHERE <инварианты> FOR UPDATE),
+        #      opened AS (INSERT INTO balance_transactions SELECT ... FROM locked ON CONFLICT DO NOTHING RETURNING *),
+        #      updated AS (UPDATE user_balances SET locked_total = locked_total + opened.amount FROM opened)
+        # SELECT * FROM opened
+        # FOR UPDATE перепроверяет инварианты на последней версии строки, а дубликат (в том числе вставленный
+        # параллельным запросом с тем же ключом уже после снимка) гасит ON CONFLICT: строки нет — сервис идёт
+        # обычным путём и возвращает существующую транзакцию.
+        locked = (
+            select(UserBalance.user_id)
+            .where(
+                UserBalance.user_id == user_id,
+                UserBalance.stripes == 0,
+                UserBalance.current - UserBalance.locked_total >= amount,
+                UserBalance.current + UserBalance.locked_total + amount <= UserBalance.maximum,
+            )
+            .with_for_update()
+            .cte("locked_balance")
+        )
+        opened = (
+            pg_insert(BalanceTransaction)
+            .from_select(
+                ["user_id", "service_id", "external_tx_id", "amount", "status", "created_at", "expires_at"],
+                select(
+                    locked.c.user_id,
+                    literal(service_id, BalanceTransaction.service_id.type),
+                    literal(external_tx_id, BalanceTransaction.external_tx_id.type),
+                    literal(amount, BalanceTransaction.amount.type),
+                    literal(TransactionStatus.LOCKED, BalanceTransaction.status.type),
+                    literal(datetime.utcnow(), BalanceTransaction.created_at.type),
+                    literal(expires_at, BalanceTransaction.expires_at.type),
+                ),
+            )
+            .on_conflict_do_nothing(index_elements=["user_id", "service_id", "external_tx_id"])
+        )
+        opened = self._returning_opened(opened).cte("opened_transaction")
+        balance_update = (
+            update(UserBalance)
+            .where(UserBalance.user_id == opened.c.user_id)
+            .values(locked_total=UserBalance.locked_total + opened.c.amount)
+            .cte("updated_balance")
+        )
+        stmt = select(*opened.c).add_cte(balance_update)
+        result = await self.session.execute(select(BalanceTransaction).from_statement(stmt).execution_options(populate_existing=True))
+        return self._opened(result.scalar_one_or_none())
+
+    async def atomic_close_transaction(self, user_id: str, service_id: str, external_tx_id: str, status: TransactionStatus) -> Optional[BalanceTransaction]:
+        # Сначала блокируется строка баланса (тот же порядок блокировок, что и в обычном пути),
+        # затем транзакция переводится из LOCKED, и баланс меняется на её сумму из RETURNING.
+        now = datetime.utcnow()
+        locked = select(UserBalance.user_id).where(UserBalance.user_id == user_id, UserBalance.stripes == 0).with_for_update().cte("locked_balance")
+        conditions = [
+            BalanceTransaction.user_id == locked.c.user_id,
+            BalanceTransaction.service_id == service_id,
+            BalanceTransaction.external_tx_id == external_tx_id,
+            _IS_LOCKED,
+        ]
+        if status == TransactionStatus.CONFIRMED:
+            conditions.append(BalanceTransaction.expires_at >= now)
+        closed = (
+            update(BalanceTransaction)
+            .where(*conditions)
+            .values(status=status, closed_at=now)
+            .returning(*BalanceTransaction.__table__.c)
+            .cte("closed_transaction")
+        )
+        values = {"locked_total": UserBalance.locked_total - closed.c.amount}
+        if status == TransactionStatus.CONFIRMED:
+            values["current"] = UserBalance.current - closed.c.amount
+        balance_update = (
+            update(UserBalance)
+            .where(UserBalance.user_id == closed.c.user_id)
+            .values(**values)
+            .cte("updated_balance")
+        )
+        stmt = select(*closed.c).add_cte(balance_update)
+        result = await self.session.execute(select(BalanceTransaction).from_statement(stmt).execution_options(populate_existing=True))
+        transaction = result.scalar_one_or_none()
+        if transaction is not None:
+            self._closed(transaction)
+        return transaction
+
     async def get_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> Optional[BalanceTransaction]:
-        result = await self.session.execute(select(BalanceTransaction).where(and_(BalanceTransaction.user_id == user_id, BalanceTransaction.service_id == service_id, BalanceTransaction.external_tx_id == external_tx_id)))
+        result = await self.session.execute(_GET_TRANSACTION, {"user_id": user_id, "service_id": service_id, "external_tx_id": external_tx_id})
         return result.scalar_one_or_none()
 
-    async def create_transaction(self, user_id: str, service_id: str, external_tx_id: str, amount: int, status: TransactionStatus, expires_at: datetime) -> BalanceTransaction:
-        transaction = BalanceTransaction(user_id=user_id, service_id=service_id, external_tx_id=external_tx_id, amount=amount, status=status, expires_at=expires_at)
-        self.session.add(transaction)
-        await self.session.flush()
-        return transaction
+    async def create_transaction_if_absent(self, user_id: str, service_id: str, external_tx_id: str, amount: int, expires_at: datetime, stripe: Optional[int] = None) -> Optional[BalanceTransaction]:
+        # None — транзакция с таким (user_id, service_id, external_tx_id) уже есть (или её параллельно вставили)
+        stmt = (
+            pg_insert(BalanceTransaction)
+            .values(user_id=user_id, service_id=service_id, external_tx_id=external_tx_id, amount=amount, status=TransactionStatus.LOCKED, created_at=datetime.utcnow(), expires_at=expires_at, stripe=stripe)
+            .on_conflict_do_nothing(index_elements=["user_id", "service_id", "external_tx_id"])
+        )
+        stmt = self._returning_opened(stmt)
+        result = await self.session.execute(select(BalanceTransaction).from_statement(stmt).execution_options(populate_existing=True))
+        return self._opened(result.scalar_one_or_none())
 
     async def sum_locked_transactions(self, user_id: str) -> int:
-        result = await self.session.execute(select(func.coalesce(func.sum(BalanceTransaction.amount), 0)).where(and_(BalanceTransaction.user_id == user_id, BalanceTransaction.status == TransactionStatus.LOCKED)))
+        result = await self.session.execute(_SUM_LOCKED_TRANSACTIONS, {"user_id": user_id})
         return int(result.scalar_one())
 
+    async def stream_open_deadlines(self, chunk_size: int) -> AsyncIterator[List[datetime]]:
+        # Сроки открытых транзакций пачками, серверным курсором (index-only scan по idx_locked_expires)
+        stmt = select(BalanceTransaction.expires_at).where(_IS_LOCKED).execution_options(yield_per=chunk_size)
+        result = await self.session.stream_scalars(stmt)
+        async for partition in result.partitions():
+            yield list(partition)
+
     async def list_expired_locked_transactions(self, now: datetime, limit: int) -> List[BalanceTransaction]:
-        result = await self.session.execute(select(BalanceTransaction).where(and_(BalanceTransaction.status == TransactionStatus.LOCKED, BalanceTransaction.expires_at < now)).limit(limit))
+        result = await self.session.execute(select(BalanceTransaction).where(and_(_IS_LOCKED, BalanceTransaction.expires_at < now)).limit(limit))
+        return list(result.scalars().all())
+
+    async def count_expired_locked_transactions(self, now: datetime, limit: int, shard: int = 0, shard_count: int = 1) -> int:
+        # Бэклог свипера, не больше limit (счёт по частичному индексу обрывается на limit строк)
+        expired = [_IS_LOCKED, BalanceTransaction.expires_at < now]
+        if shard_count > 1:
+            expired.append(self._shard_filter(shard, shard_count))
+        capped = select(BalanceTransaction.id).where(*expired).limit(limit).subquery("capped")
+        result = await self.session.execute(select(func.count()).select_from(capped))
+        return int(result.scalar_one())
+
+    async def cancel_expired_transactions(self, now: datetime, limit: int, shard: int = 0, shard_count: int = 1) -> list:
+        # Один запрос на пачку: идём по истёкшим транзакциям шарда от самых старых и блокируем балансы их
+        # пользователей с SKIP LOCKED (занятые живым трафиком или другим свипером пропускаются, пачку добирают
+        # следующие), пока не наберётся limit транзакций; отменяем ровно их и одним UPDATE уменьшаем
+        # locked_total на сумму по пользователю.
+        expired = [_IS_LOCKED, BalanceTransaction.expires_at < now, BalanceTransaction.stripe.is_(None)]
+        if shard_count > 1:
+            expired.append(self._shard_filter(shard, shard_count))
+        picked = (
+            select(BalanceTransaction.id)
+            .join(UserBalance, UserBalance.user_id == BalanceTransaction.user_id)
+            .where(*expired)
+            .order_by(BalanceTransaction.expires_at)
+            .limit(limit)
+            .with_for_update(of=UserBalance, skip_locked=True)
+            .cte("picked")
+        )
+        canceled = (
+            update(BalanceTransaction)
+            .where(BalanceTransaction.id == picked.c.id, _IS_LOCKED)
+            .values(status=TransactionStatus.CANCELED, closed_at=now)
+            .returning(BalanceTransaction.id, BalanceTransaction.user_id, BalanceTransaction.service_id, BalanceTransaction.external_tx_id, BalanceTransaction.amount)
+            .cte("canceled")
+        )
+        per_user = (
+            select(canceled.c.user_id, func.sum(canceled.c.amount).label("amount"), func.count().label("canceled"))
+            .group_by(canceled.c.user_id)
+            .cte("per_user")
+        )
+        balances = UserBalance.__table__
+        stmt = (
+            update(balances)
+            .where(balances.c.user_id == per_user.c.user_id)
+            # greatest(): рассинхронизированный locked_total не должен валить всю пачку, его чинит repair
+            .values(locked_total=func.greatest(balances.c.locked_total - per_user.c.amount, 0))
+            .returning(balances.c.user_id, per_user.c.canceled, per_user.c.amount)
+        )
+        stmt = self._add_expired_events(stmt, canceled)
+        result = await self.session.execute(stmt)
+        return list(result.all())
+
+    async def cancel_expired_striped_transactions(self, now: datetime, limit: int, shard: int = 0, shard_count: int = 1) -> list:
+        # То же для транзакций полосатых аккаунтов: блокируются полосы, а не строка баланса
+        stripes = UserBalanceStripe.__table__
+        expired = [_IS_LOCKED, BalanceTransaction.expires_at < now, BalanceTransaction.stripe.is_not(None)]
+        if shard_count > 1:
+            expired.append(self._shard_filter(shard, shard_count))
+        picked = (
+            select(BalanceTransaction.id)
+            .join(stripes, and_(stripes.c.user_id == BalanceTransaction.user_id, stripes.c.stripe == BalanceTransaction.stripe))
+            .where(*expired)
+            .order_by(BalanceTransaction.expires_at)
+            .limit(limit)
+            .with_for_update(of=stripes, skip_locked=True)
+            .cte("picked")
+        )
+        canceled = (
+            update(BalanceTransaction)
+            .where(BalanceTransaction.id == picked.c.id, _IS_LOCKED)
+            .values(status=TransactionStatus.CANCELED, closed_at=now)
+            .returning(BalanceTransaction.id, BalanceTransaction.user_id, BalanceTransaction.service_id, BalanceTransaction.external_tx_id, BalanceTransaction.stripe, BalanceTransaction.amount)
+            .cte("canceled")
+        )
+        per_stripe = (
+            select(canceled.c.user_id, canceled.c.stripe, func.sum(canceled.c.amount).label("amount"), func.count().label("canceled"))
+            .group_by(canceled.c.user_id, canceled.c.stripe)
+            .cte("per_stripe")
+        )
+        updated = (
+            update(stripes)
+            .where(stripes.c.user_id == per_stripe.c.user_id, stripes.c.stripe == per_stripe.c.stripe)
+            .values(locked_total=func.greatest(stripes.c.locked_total - per_stripe.c.amount, 0))
+            .returning(stripes.c.user_id, per_stripe.c.canceled, per_stripe.c.amount)
+            .cte("updated_stripes")
+        )
+        stmt = select(
+            updated.c.user_id,
+            func.sum(updated.c.canceled).label("canceled"),
+            func.sum(updated.c.amount).label("amount"),
+        ).group_by(updated.c.user_id)
+        stmt = self._add_expired_events(stmt, canceled)
+        result = await self.session.execute(stmt)
+        return list(result.all())
+
+    @staticmethod
+    def _shard_filter(shard: int, shard_count: int):
+        return (func.hashtext(BalanceTransaction.user_id).op("&")(0x7FFFFFFF) % shard_count) == shard
+
+    # Архив закрытых транзакций
+
+    async def lock_archivable_transactions(self, cutoff: datetime, limit: int) -> list:
+        result = await self.session.execute(
+            select(BalanceTransaction.id, BalanceTransaction.created_at)
+            .where(BalanceTransaction.closed_at.is_not(None), BalanceTransaction.closed_at < cutoff)
+            .order_by(BalanceTransaction.closed_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(result.all())
+
+    async def archive_transactions(self, ids: List[int]) -> int:
+        # WITH moved AS (DELETE ... RETURNING *) INSERT INTO balance_transactions_archive SELECT * FROM moved
+        transactions = BalanceTransaction.__table__
+        archive = BalanceTransactionArchive.__table__
+        columns = [column.name for column in archive.c]
+        moved = (
+            delete(transactions)
+            .where(transactions.c.id == any_(bindparam("ids", type_=ARRAY(BigInteger))))
+            .returning(*(transactions.c[name] for name in columns))
+            .cte("moved")
+        )
+        result = await self.session.execute(insert(archive).from_select(columns, select(moved)), {"ids": ids})
+        return result.rowcount
+
+    # Массовое исправление locked_total (repair-all)
+
+    async def stream_locked_drift(self, chunk_size: int) -> AsyncIterator[list]:
+        """Пользователи, у которых locked_total не равен сумме открытых транзакций, пачками по chunk_size.
+
+        Один сгруппированный запрос по частичному индексу открытых транзакций, читается
+        серверным курсором — без списка всех пользователей в памяти.
+        """
+        transactions = BalanceTransaction.__table__
+        sums = select(transactions.c.user_id, func.sum(transactions.c.amount).label("locked")).where(_IS_LOCKED).group_by(transactions.c.user_id).subquery("locked_sums")
+        recorded = cast(UserBalance.locked_total + func.coalesce(_STRIPE_TOTALS.c.locked_total, 0), BigInteger)
+        actual = cast(func.coalesce(sums.c.locked, 0), BigInteger)
+        stmt = (
+            select(
+                UserBalance.user_id,
+                UserBalance.stripes,
+                recorded.label("locked_total"),
+                actual.label("actual_locked"),
+                cast(UserBalance.current + func.coalesce(_STRIPE_TOTALS.c.current, 0), BigInteger).label("current"),
+                cast(UserBalance.maximum + func.coalesce(_STRIPE_TOTALS.c.maximum, 0), BigInteger).label("maximum"),
+            )
+            .outerjoin(_STRIPE_TOTALS, UserBalance.stripes > 0)
+            .outerjoin(sums, sums.c.user_id == UserBalance.user_id)
+            .where(recorded != actual)
+            .execution_options(yield_per=chunk_size)
+        )
+        result = await self.session.stream(stmt)
+        async for partition in result.partitions():
+            yield list(partition)
+
+    async def try_lock_balances(self, user_ids: List[str]) -> List[str]:
+        # Занятые живым трафиком строки пропускаются, их исправят следующим проходом
+        result = await self.session.execute(
+            select(UserBalance.user_id)
+            .where(UserBalance.user_id == any_(bindparam("user_ids", type_=ARRAY(String))), UserBalance.stripes == 0)
+            .order_by(UserBalance.user_id)
+            .with_for_update(skip_locked=True),
+            {"user_ids": user_ids},
+        )
+        return list(result.scalars().all())
+
+    async def repair_locked_totals(self, user_ids: List[str]) -> list:
+        """Приводит locked_total к сумме открытых транзакций одним UPDATE; current урезается, как в repair.
+
+        Строки должны быть заблокированы этой транзакцией заранее (try_lock_balances): тогда снимок
+        запроса видит все закоммиченные изменения их транзакций. Возвращает исправленные строки
+        (user_id, locked_total, actual_locked, current, new_current) — значения до и после.
+        """
+        balances = UserBalance.__table__
+        open_sum = (
+            select(func.coalesce(func.sum(BalanceTransaction.amount), 0))
+            .where(BalanceTransaction.user_id == balances.c.user_id, _IS_LOCKED)
+            .scalar_subquery()
+        )
+        actual = (
+            select(balances.c.user_id, balances.c.locked_total, balances.c.current, cast(open_sum, BigInteger).label("actual_locked"))
+            .where(balances.c.user_id == any_(bindparam("user_ids", type_=ARRAY(String))))
+            .cte("actual")
+        )
+        fixed = (
+            update(balances)
+            .where(balances.c.user_id == actual.c.user_id, actual.c.actual_locked != actual.c.locked_total)
+            .values(
+                locked_total=actual.c.actual_locked,
+                current=func.greatest(func.least(balances.c.current, balances.c.maximum - actual.c.actual_locked), 0),
+            )
+            .returning(
+                balances.c.user_id,
+                actual.c.locked_total,
+                actual.c.actual_locked,
+                actual.c.current,
+                balances.c.current.label("new_current"),
+            )
+            .cte("fixed")
+        )
+        stmt = select(fixed).order_by(fixed.c.user_id)
+        stmt = self._add_events(
+            stmt, "repaired", OutboxEventType.BALANCE_REPAIRED, fixed.c.user_id, fixed.c.actual_locked,
+            current=fixed.c.new_current - fixed.c.current, locked=fixed.c.actual_locked - fixed.c.locked_total,
+        )
+        result = await self.session.execute(stmt, {"user_ids": user_ids})
+        return list(result.all())
+
+    # Массовая загрузка и выгрузка
+
+    async def _driver_connection(self):
+        connection = await self.session.connection()
+        return (await connection.get_raw_connection()).driver_connection
+
+    async def create_import_tables(self) -> None:
+        for table in _IMPORT_METADATA.sorted_tables:
+            await self.session.execute(CreateTable(table))
+
+    async def drop_import_tables(self) -> None:
+        for table in _IMPORT_METADATA.sorted_tables:
+            await self.session.execute(DropTable(table, if_exists=True))
+
+    async def copy_import_rows(self, columns: List[str], source, header: bool) -> int:
+        """COPY CSV из source (async-итератор bytes) в balance_import_rows, без разбора строк в Python."""
+        driver = await self._driver_connection()
+        status = await driver.copy_to_table(_IMPORT_ROWS.name, source=source, columns=columns, format="csv", header=header)
+        return int(status.split()[-1])
+
+    async def check_import_rows(self) -> Dict[Optional[str], int]:
+        """Проверяет загруженные строки одним запросом; возвращает число строк по статусу (None — годные)."""
+        await self.session.execute(_CHECK_IMPORT_ROWS)
+        await self.session.execute(CreateIndex(_IMPORT_PENDING))
+        # Временные таблицы autovacuum не анализирует, а без статистики план пачек строится вслепую
+        await self.session.execute(text(f"ANALYZE {_IMPORT_CHECKED.name}"))
+        result = await self.session.execute(select(_IMPORT_CHECKED.c.status, func.count()).group_by(_IMPORT_CHECKED.c.status))
+        return dict(result.tuples().all())
+
+    async def stream_import_rejects(self, chunk_size: int) -> AsyncIterator[list]:
+        result = await self.session.stream(_IMPORT_REJECTS.execution_options(yield_per=chunk_size))
+        async for partition in result.partitions():
+            yield list(partition)
+
+    async def merge_imported_balances(self, after: int, upto: int, insert_only: bool = False) -> list:
+        """Вливает годные строки с номерами (after, upto] в user_balances одним INSERT ... ON CONFLICT.
+
+        Существующие строки пачки сначала блокируются по порядку user_id, так что снимок самого INSERT
+        видит их окончательные значения — от них считаются изменения для журнала и событий outbox.
+        Обновление не трогает полосатые аккаунты и строки, где current + locked_total превысил бы maximum.
+        Возвращает (line, user_id, status) строк пачки, кроме вставленных: updated, unchanged
+        или причина отказа (exists, striped, check_current_plus_locked_le_maximum).
+        """
+        balances = UserBalance.__table__
+        params = {"after": after, "upto": upto}
+        src = _IMPORT_CHUNK.cte("src")
+        # = ANY(ARRAY(...)), а не IN (SELECT ...): пачка ищется по первичному ключу, а не hash join
+        # с последовательным чтением всей user_balances на каждую пачку
+        in_chunk = balances.c.user_id == any_(func.array(select(src.c.user_id).scalar_subquery()))
+        locked = (
+            select(balances.c.user_id)
+            .where(in_chunk)
+            .order_by(balances.c.user_id)
+            .with_for_update()
+            .subquery("locked")
+        )
+        await self.session.execute(select(func.count()).select_from(locked), params)
+
+        old = (
+            select(balances.c.user_id, balances.c.current, balances.c.maximum, balances.c.stripes)
+            .where(in_chunk)
+            .cte("old")
+        )
+        stmt = pg_insert(balances).from_select(
+            ["user_id", "current", "maximum", "locked_total"],
+            select(src.c.user_id, src.c.current, src.c.maximum, literal(0, BigInteger)),
+            include_defaults=False,
+        )
+        if insert_only:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[balances.c.user_id])
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[balances.c.user_id],
+                set_={"current": stmt.excluded.current, "maximum": stmt.excluded.maximum, "updated_at": func.now()},
+                where=and_(
+                    balances.c.stripes == 0,
+                    # maximum - locked_total, а не current + locked_total: без переполнения bigint
+                    stmt.excluded.current <= stmt.excluded.maximum - balances.c.locked_total,
+                    or_(balances.c.current != stmt.excluded.current, balances.c.maximum != stmt.excluded.maximum),
+                ),
+            )
+        merged = stmt.returning(balances.c.user_id, balances.c.current, balances.c.maximum).cte("merged")
+        applied = (
+            select(
+                merged.c.user_id,
+                merged.c.current,
+                (merged.c.current - func.coalesce(old.c.current, 0)).label("current_delta"),
+                (merged.c.maximum - func.coalesce(old.c.maximum, 0)).label("maximum_delta"),
+            )
+            .outerjoin(old, old.c.user_id == merged.c.user_id)
+            .cte("applied")
+        )
+        status = case(
+            (applied.c.user_id.isnot(None), "updated"),
+            (literal(insert_only), "exists"),
+            (old.c.stripes > 0, "striped"),
+            (and_(old.c.current == src.c.current, old.c.maximum == src.c.maximum), "unchanged"),
+            else_="check_current_plus_locked_le_maximum",
+        )
+        stmt = (
+            select(src.c.line, src.c.user_id, status.label("status"))
+            .outerjoin(applied, applied.c.user_id == src.c.user_id)
+            .outerjoin(old, old.c.user_id == src.c.user_id)
+            # Вставленных (их пользователей не было в old) не возвращаем
+            .where(or_(applied.c.user_id.is_(None), old.c.user_id.isnot(None)))
+            .order_by(src.c.line)
+        )
+        stmt = self._add_events(
+            stmt, "imported", OutboxEventType.BALANCE_IMPORTED, applied.c.user_id, applied.c.current,
+            current=applied.c.current_delta, maximum=applied.c.maximum_delta,
+        )
+        result = await self.session.execute(stmt, params)
+        return list(result.all())
+
+    async def copy_export(self, table: str, output) -> None:
+        """COPY TO в CSV с заголовком; output — корутина, которая получает куски bytes по мере чтения."""
+        if table not in _EXPORTS:
+            raise InvalidOperationError("Неизвестная таблица выгрузки")
+        connection = await self.session.connection()
+        query = str(_EXPORTS[table].compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+        driver = await self._driver_connection()
+        await driver.copy_from_query(query, output=output, format="csv", header=True)
+
+    # Полосы горячих аккаунтов
+
+    async def list_stripes(self, user_id: str) -> List[UserBalanceStripe]:
+        result = await self.session.execute(_LIST_STRIPES, {"user_id": user_id})
+        return list(result.scalars().all())
+
+    async def lock_stripes(self, user_id: str) -> List[UserBalanceStripe]:
+        started = timers.start()
+        result = await self.session.execute(_LOCK_STRIPES, {"user_id": user_id})
+        timers.observe("lock", started)
+        return list(result.scalars().all())
+
+    async def try_lock_stripes(self, user_id: str) -> List[UserBalanceStripe]:
+        result = await self.session.execute(_TRY_LOCK_STRIPES, {"user_id": user_id})
+        return list(result.scalars().all())
+
+    async def lock_stripe(self, user_id: str, stripe: int) -> Optional[UserBalanceStripe]:
+        started = timers.start()
+        result = await self.session.execute(_LOCK_STRIPE, {"user_id": user_id, "stripe": stripe})
+        timers.observe("lock", started)
+        return result.scalar_one_or_none()
+
+    async def pick_stripe(self, user_id: str, amount: int) -> Optional[UserBalanceStripe]:
+        result = await self.session.execute(_PICK_STRIPE, {"user_id": user_id, "amount": amount})
+        return result.scalar_one_or_none()
+
+    async def assign_stripes(self, user_id: str, stripe_count: int) -> Dict[int, int]:
+        # Открытые транзакции раскладываются по полосам по кругу; возвращает заблокированную сумму по полосам
+        transactions = BalanceTransaction.__table__
+        result = await self.session.execute(
+            update(transactions)
+            .where(transactions.c.user_id == user_id, _IS_LOCKED)
+            .values(stripe=transactions.c.id % stripe_count)
+            .returning(transactions.c.stripe, transactions.c.amount)
+        )
+        locked: Dict[int, int] = {}
+        for stripe, amount in result.all():
+            locked[stripe] = locked.get(stripe, 0) + amount
+        return locked
+
+    async def unassign_stripes(self, user_id: str) -> None:
+        transactions = BalanceTransaction.__table__
+        await self.session.execute(
+            update(transactions)
+            .where(transactions.c.user_id == user_id, _IS_LOCKED, transactions.c.stripe.is_not(None))
+            .values(stripe=None)
+        )
+
+    async def sum_locked_transactions_by_stripe(self, user_id: str) -> Dict[Optional[int], int]:
+        result = await self.session.execute(
+            select(BalanceTransaction.stripe, func.sum(BalanceTransaction.amount))
+            .where(BalanceTransaction.user_id == user_id, _IS_LOCKED)
+            .group_by(BalanceTransaction.stripe)
+        )
+        return {stripe: int(amount) for stripe, amount in result.all()}
+
+    async def list_striped_user_ids(self) -> List[str]:
+        result = await self.session.execute(select(UserBalance.user_id).where(UserBalance.stripes > 0))
         return list(result.scalars().all())
 
     async def mark_transaction_confirmed(self, transaction: BalanceTransaction) -> None:
         transaction.status = TransactionStatus.CONFIRMED
         transaction.closed_at = datetime.utcnow()
+        self._closed(transaction)
 
     async def mark_transaction_canceled(self, transaction: BalanceTransaction) -> None:
         transaction.status = TransactionStatus.CANCELED
         transaction.closed_at = datetime.utcnow()
+        self._closed(transaction)
+
+    # События outbox и записи журнала: добавляются в сессию и пишутся тем же flush/коммитом, что и само
+    # изменение (откат SAVEPOINT в пачке убирает и их)
+
+    def add_event(
+        self,
+        event_type: OutboxEventType,
+        user_id: str,
+        amount: Optional[int] = None,
+        transaction: Optional[BalanceTransaction] = None,
+        deltas: Optional[Tuple[int, int, int]] = None,
+    ) -> None:
+        """deltas — изменения (current, maximum, locked_total); по умолчанию выводятся из типа события и amount."""
+        if settings.LEDGER_ENABLED:
+            current, maximum, locked = deltas or tuple(unit * amount for unit in _LEDGER_DELTAS[event_type])
+            if current or maximum or locked:
+                self.session.add(LedgerEntry(
+                    user_id=user_id,
+                    type=event_type,
+                    current_delta=current,
+                    maximum_delta=maximum,
+                    locked_delta=locked,
+                    transaction_id=transaction.id if transaction is not None else None,
+                ))
+        if settings.OUTBOX_ENABLED:
+            event = OutboxEvent(type=event_type, user_id=user_id, amount=amount)
+            if transaction is not None:
+                event.transaction_id = transaction.id
+                event.service_id = transaction.service_id
+                event.external_tx_id = transaction.external_tx_id
+            self.session.add(event)
+
+    def _opened(self, transaction: Optional[BalanceTransaction]) -> Optional[BalanceTransaction]:
+        if transaction is not None:
+            self.add_event(OutboxEventType.TRANSACTION_OPENED, transaction.user_id, transaction.amount, transaction)
+        return transaction
+
+    def _closed(self, transaction: BalanceTransaction) -> None:
+        event_type = OutboxEventType.TRANSACTION_CONFIRMED if transaction.status == TransactionStatus.CONFIRMED else OutboxEventType.TRANSACTION_CANCELED
+        self.add_event(event_type, transaction.user_id, transaction.amount, transaction)
+
+    @staticmethod
+    def _returning_opened(stmt):
+        stmt = stmt.returning(BalanceTransaction)
+        if settings.EXPIRY_SCHEDULER_ENABLED:
+            # Срок новой транзакции — планировщику истечения (app.services.expiry): NOTIFY тем же запросом,
+            # уходит при коммите
+            epoch = cast(func.extract("epoch", BalanceTransaction.expires_at), String)
+            stmt = stmt.returning(func.pg_notify(settings.EXPIRY_CHANNEL, epoch).label("expiry_notified"))
+        return stmt
+
+    @classmethod
+    def _add_expired_events(cls, stmt, canceled):
+        # Отменённые свипером транзакции: события и записи журнала тем же запросом
+        return cls._add_events(
+            stmt, "expired", OutboxEventType.TRANSACTION_EXPIRED, canceled.c.user_id, canceled.c.amount,
+            locked=-canceled.c.amount, transaction=(canceled.c.id, canceled.c.service_id, canceled.c.external_tx_id),
+        )
 
+    @staticmethod
+    def _add_events(stmt, name: str, event_type: OutboxEventType, user_id, amount, current=None, maximum=None, locked=None, transaction=None):
+        """События outbox и записи журнала для строк data-modifying CTE — в том же запросе (INSERT ... SELECT в CTE).
 
+        user_id, amount, изменения (None — 0) и transaction (id, service_id, external_tx_id) — колонки этого CTE.
+        """
+        event = literal(event_type, OutboxEvent.__table__.c.type.type)
+        if settings.OUTBOX_ENABLED:
+            columns = {"type": event, "user_id": user_id, "amount": amount}
+            if transaction is not None:
+                columns.update(zip(("transaction_id", "service_id", "external_tx_id"), transaction))
+            stmt = stmt.add_cte(insert(OutboxEvent.__table__).from_select(list(columns), select(*columns.values())).cte(f"{name}_events"))
+        if settings.LEDGER_ENABLED:
+            deltas = (literal(0) if delta is None else delta for delta in (current, maximum, locked))
+            columns = {"user_id": user_id, "type": event, **dict(zip(("current_delta", "maximum_delta", "locked_delta"), deltas))}
+            if transaction is not None:
+                columns["transaction_id"] = transaction[0]
+            stmt = stmt.add_cte(insert(LedgerEntry.__table__).from_select(list(columns), select(*columns.values())).cte(f"{name}_ledger"))
+        return stmt
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from sqlalchemy import select, update, delete, exists, cast, literal, literal_column, true, func, or_, BigInteger, Select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import UserBalance, LedgerEntry, BalanceCheckpoint, BalanceSnapshot
+from app.repositories.balance_repository import _STRIPE_TOTALS
+
+# Записи журнала, не вошедшие в снимок пользователя: видимые в текущей транзакции, но не в снимке
+# транзакций его точки. Условие по xid >= xmin точки — диапазон индекса (user_id, xid), так что
+# читается только хвост журнала после снимка
+_TAIL = (
+    select(
+        func.coalesce(func.sum(LedgerEntry.current_delta), 0).label("current"),
+        func.coalesce(func.sum(LedgerEntry.maximum_delta), 0).label("maximum"),
+        func.coalesce(func.sum(LedgerEntry.locked_delta), 0).label("locked_total"),
+        func.count().label("entries"),
+    )
+    .where(
+        LedgerEntry.user_id == UserBalance.user_id,
+        LedgerEntry.xid >= func.coalesce(func.pg_snapshot_xmin(BalanceCheckpoint.snapshot), literal_column("'0'::xid8")),
+        or_(BalanceCheckpoint.id.is_(None), ~func.pg_visible_in_snapshot(LedgerEntry.xid, BalanceCheckpoint.snapshot)),
+    )
+    .lateral("tail")
+)
+
+
+def _replay(after: Optional[str] = None, upto: Optional[str] = None) -> Select:
+    """Баланс пользователей из user_balances (actual_*) и по журналу (снимок + хвост) одним запросом."""
+    # sum() по bigint даёт numeric — приводим обратно
+    stmt = (
+        select(
+            UserBalance.user_id,
+            cast(UserBalance.current + func.coalesce(_STRIPE_TOTALS.c.current, 0), BigInteger).label("actual_current"),
+            cast(UserBalance.maximum + func.coalesce(_STRIPE_TOTALS.c.maximum, 0), BigInteger).label("actual_maximum"),
+            cast(UserBalance.locked_total + func.coalesce(_STRIPE_TOTALS.c.locked_total, 0), BigInteger).label("actual_locked_total"),
+            cast(func.coalesce(BalanceSnapshot.current, 0) + _TAIL.c.current, BigInteger).label("current"),
+            cast(func.coalesce(BalanceSnapshot.maximum, 0) + _TAIL.c.maximum, BigInteger).label("maximum"),
+            cast(func.coalesce(BalanceSnapshot.locked_total, 0) + _TAIL.c.locked_total, BigInteger).label("locked_total"),
+            _TAIL.c.entries,
+        )
+        .select_from(UserBalance)
+        .outerjoin(_STRIPE_TOTALS, UserBalance.stripes > 0)
+        .outerjoin(BalanceSnapshot, BalanceSnapshot.user_id == UserBalance.user_id)
+        .outerjoin(BalanceCheckpoint, BalanceCheckpoint.id == BalanceSnapshot.checkpoint_id)
+        .join(_TAIL, true())
+    )
+    if after is not None:
+        stmt = stmt.where(UserBalance.user_id > after)
+    if upto is not None:
+        stmt = stmt.where(UserBalance.user_id <= upto)
+    return stmt
+
+
+def _mismatch(replay) -> list:
+    return [
+        replay.c.actual_current != replay.c.current,
+        replay.c.actual_maximum != replay.c.maximum,
+        replay.c.actual_locked_total != replay.c.locked_total,
+    ]
+
+
+class LedgerRepository:
+    """Запросы журнала баланса. Пачки пользователей — диапазоны user_id (after, upto]."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def replay(self, user_id: str):
+        # None — у пользователя нет строки баланса
+        result = await self.session.execute(_replay().where(UserBalance.user_id == user_id))
+        return result.one_or_none()
+
+    async def next_bound(self, after: Optional[str], size: int) -> Optional[str]:
+        """user_id, которым заканчивается пачка из size пользователей после after (None — пачка последняя)."""
+        stmt = select(UserBalance.user_id).order_by(UserBalance.user_id).offset(size - 1).limit(1)
+        if after is not None:
+            stmt = stmt.where(UserBalance.user_id > after)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def list_mismatches(self, after: Optional[str], upto: Optional[str]) -> List:
+        replay = _replay(after, upto).subquery("replay")
+        result = await self.session.execute(select(replay).where(or_(*_mismatch(replay))).order_by(replay.c.user_id))
+        return list(result.all())
+
+    async def count_users(self, after: Optional[str], upto: Optional[str]) -> int:
+        stmt = select(func.count()).select_from(UserBalance)
+        if after is not None:
+            stmt = stmt.where(UserBalance.user_id > after)
+        if upto is not None:
+            stmt = stmt.where(UserBalance.user_id <= upto)
+        return int((await self.session.execute(stmt)).scalar_one())
+
+    async def checkpoint(self, after: Optional[str], upto: Optional[str], baseline: bool = False) -> int:
+        """Новая точка для пачки: снимки пользователей, у которых с прошлого снимка есть записи журнала.
+
+        Должна быть первым запросом транзакции REPEATABLE READ: точка запоминает её снимок, и снимки
+        балансов считаются в нём же. baseline — снимки всех пользователей пачки из user_balances
+        (начало журнала для балансов, существовавших до его включения). Возвращает число снимков.
+        """
+        checkpoint_id = (await self.session.execute(
+            pg_insert(BalanceCheckpoint).values(baseline=baseline, users=0).returning(BalanceCheckpoint.id)
+        )).scalar_one()
+        replay = _replay(after, upto).subquery("replay")
+        if baseline:
+            rows = select(replay.c.user_id, literal(checkpoint_id), replay.c.actual_current, replay.c.actual_maximum, replay.c.actual_locked_total)
+        else:
+            rows = select(replay.c.user_id, literal(checkpoint_id), replay.c.current, replay.c.maximum, replay.c.locked_total).where(replay.c.entries > 0)
+        stmt = pg_insert(BalanceSnapshot).from_select(["user_id", "checkpoint_id", "current", "maximum", "locked_total"], rows)
+        result = await self.session.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={name: stmt.excluded[name] for name in ("checkpoint_id", "current", "maximum", "locked_total")},
+        ))
+        await self.session.execute(update(BalanceCheckpoint).where(BalanceCheckpoint.id == checkpoint_id).values(users=result.rowcount))
+        return result.rowcount
+
+    async def prune_checkpoints(self) -> int:
+        # Точки, на которые не ссылается ни один снимок, больше не нужны
+        result = await self.session.execute(
+            delete(BalanceCheckpoint).where(~exists().where(BalanceSnapshot.checkpoint_id == BalanceCheckpoint.id))
+        )
+        return result.rowcount
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import OutboxEvent, OutboxCursor
+
+STREAM_CURSOR = "stream"
+
+
+class OutboxRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def assign_sequence(self, limit: int) -> int:
+        """Нумерует до limit ещё не пронумерованных событий подряд после головы потока; возвращает их число.
+
+        Видны только закоммиченные события, поэтому событие транзакции, закоммиченной позже,
+        получит больший seq, даже если его id меньше. Вызывает только релей-лидер.
+        """
+        events = OutboxEvent.__table__
+        cursors = OutboxCursor.__table__
+        batch = select(events.c.id).where(events.c.seq.is_(None)).order_by(events.c.id).limit(limit).cte("batch")
+        size = select(func.count()).select_from(batch).scalar_subquery()
+        head = (
+            update(cursors)
+            .where(cursors.c.name == STREAM_CURSOR)
+            .values(seq=cursors.c.seq + size, updated_at=func.now())
+            .returning((cursors.c.seq - size).label("base"))
+            .cte("head")
+        )
+        numbered = select(batch.c.id, func.row_number().over(order_by=batch.c.id).label("position")).cte("numbered")
+        result = await self.session.execute(
+            update(events)
+            .where(events.c.id == numbered.c.id)
+            .values(seq=head.c.base + numbered.c.position)
+        )
+        return result.rowcount
+
+    async def list_events(self, after_seq: int, limit: int) -> List[OutboxEvent]:
+        result = await self.session.execute(
+            select(OutboxEvent).where(OutboxEvent.seq > after_seq).order_by(OutboxEvent.seq).limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def get_cursor(self, name: str) -> Optional[int]:
+        result = await self.session.execute(select(OutboxCursor.seq).where(OutboxCursor.name == name))
+        return result.scalar_one_or_none()
+
+    async def save_cursor(self, name: str, seq: int) -> None:
+        stmt = pg_insert(OutboxCursor).values(name=name, seq=seq)
+        await self.session.execute(stmt.on_conflict_do_update(index_elements=["name"], set_={"seq": stmt.excluded.seq, "updated_at": func.now()}))
+
+    async def list_cursors(self) -> dict:
+        result = await self.session.execute(select(OutboxCursor.name, OutboxCursor.seq))
+        return dict(result.all())
+
+    async def count_pending(self) -> int:
+        result = await self.session.execute(select(func.count()).select_from(OutboxEvent).where(OutboxEvent.seq.is_(None)))
+        return int(result.scalar_one())
+
+    async def first_retained_seq(self) -> Optional[int]:
+        result = await self.session.execute(select(func.min(OutboxEvent.seq)))
+        return result.scalar_one()
+
+    async def purge(self, delivered_seq: int, before: datetime) -> int:
+        # Удаляются только доставленные события старше окна хранения
+        result = await self.session.execute(
+            delete(OutboxEvent).where(OutboxEvent.seq <= delivered_seq, OutboxEvent.created_at < before)
+        )
+        return result.rowcount
@@ -1,10 +1,15 @@
 from app.schemas.transactions import CreateTransactionRequest, TransactionResponse
 from app.schemas.user_balance_schema import BalanceRead, AdjustLimitsRequest, AdjustCurrentRequest
+from app.schemas.batch import BalanceOperation, BatchRequest, BatchItemResult, BatchResponse
 
 __all__ = [
     'CreateTransactionRequest',
     'TransactionResponse', 
     'BalanceRead',
     'AdjustLimitsRequest',
-    'AdjustCurrentRequest'
-]
\ No newline at end of file
+    'AdjustCurrentRequest',
+    'BalanceOperation',
+    'BatchRequest',
+    'BatchItemResult',
+    'BatchResponse',
+]
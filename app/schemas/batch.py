@@ -0,0 +1,67 @@
+from typing import Literal, Optional, List
+
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+
+from app.core.errors import BalanceError
+from app.schemas.transactions import TransactionResponse
+from app.schemas.user_balance_schema import BalanceRead
+
+OperationType = Literal[
+    "adjust_limits",
+    "adjust_current",
+    "open_transaction",
+    "confirm_transaction",
+    "cancel_transaction",
+]
+
+_REQUIRED_FIELDS = {
+    "adjust_limits": ("delta",),
+    "adjust_current": ("delta",),
+    "open_transaction": ("service_id", "external_tx_id", "amount", "timeout_seconds"),
+    "confirm_transaction": ("service_id", "external_tx_id"),
+    "cancel_transaction": ("service_id", "external_tx_id"),
+}
+
+
+class BalanceOperation(BaseModel):
+    op: OperationType
+    user_id: str
+    delta: Optional[int] = None
+    service_id: Optional[str] = None
+    external_tx_id: Optional[str] = None
+    amount: Optional[int] = Field(default=None, gt=0)
+    timeout_seconds: Optional[int] = Field(default=None, gt=0, le=3600)
+
+    @model_validator(mode="after")
+    def check_required_fields(self):
+        missing = [name for name in _REQUIRED_FIELDS[self.op] if getattr(self, name) is None]
+        if missing:
+            raise ValueError(f"Для операции {self.op} обязательны поля: {', '.join(missing)}")
+        return self
+
+
+class BatchRequest(BaseModel):
+    operations: List[BalanceOperation] = Field(min_length=1, max_length=1000)
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    error: Optional[str] = None
+    balance: Optional[BalanceRead] = None
+    transaction: Optional[TransactionResponse] = None
+    # Исключение отказа для вызывающего в этом же процессе (объединение запросов); в ответ не попадает
+    _exception: Optional[ValueError] = PrivateAttr(default=None)
+
+    @classmethod
+    def failed(cls, index: int, error: ValueError) -> "BatchItemResult":
+        item = cls(index=index, ok=False, error=str(error))
+        item._exception = error
+        return item
+
+    def raise_error(self) -> None:
+        raise self._exception or BalanceError(self.error)
+
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
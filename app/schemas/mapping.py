@@ -0,0 +1,31 @@
+from typing import Union
+
+from app.models import BalanceTransaction, UserBalance
+from app.schemas.transactions import TransactionResponse
+from app.schemas.user_balance_schema import BalanceRead
+
+
+def balance_read(balance) -> BalanceRead:
+    """Снимок баланса: UserBalance или строка запроса с теми же полями."""
+    return BalanceRead(user_id=balance.user_id, current=balance.current, maximum=balance.maximum, locked_total=balance.locked_total)
+
+
+def transaction_response(transaction: BalanceTransaction) -> TransactionResponse:
+    return TransactionResponse(
+        id=transaction.id,
+        user_id=transaction.user_id,
+        service_id=transaction.service_id,
+        external_tx_id=transaction.external_tx_id,
+        amount=transaction.amount,
+        status=transaction.status.value,
+        created_at=transaction.created_at,
+        expires_at=transaction.expires_at,
+        closed_at=transaction.closed_at,
+    )
+
+
+def operation_response(result: Union[UserBalance, BalanceTransaction]) -> Union[BalanceRead, TransactionResponse]:
+    """Ответ на операцию BalanceService.apply_operation."""
+    if isinstance(result, UserBalance):
+        return balance_read(result)
+    return transaction_response(result)
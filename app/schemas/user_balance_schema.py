@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel, Field
 
 class BalanceRead(BaseModel):
@@ -10,4 +12,16 @@ class AdjustLimitsRequest(BaseModel):
     delta: int
 
 class AdjustCurrentRequest(BaseModel):
-    delta: int
\ No newline at end of file
+    delta: int
+
+class SetStripesRequest(BaseModel):
+    stripes: int = Field(ge=0, le=64)
+
+class StripeRead(BaseModel):
+    stripe: int
+    current: int
+    maximum: int
+    locked_total: int
+
+class StripedBalanceRead(BalanceRead):
+    stripes: List[StripeRead]
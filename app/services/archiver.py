@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from app.core import settings
+from app.db import AsyncSessionLocal, engine
+from app.db.partitions import add_months, ensure_partitions, month_start
+from app.repositories import BalanceRepository
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionArchiver:
+    """Переносит закрытые транзакции старше окна хранения в секционированный архив.
+
+    В рабочей таблице остаются открытые транзакции и закрытые за последние retention_hours:
+    её размер и индексы не растут вместе с историей, а идемпотентность (external_tx_id)
+    соблюдается в пределах окна. Строки берутся с SKIP LOCKED, несколько архиваторов не мешают друг другу.
+    """
+
+    def __init__(
+        self,
+        retention_hours: float = settings.TRANSACTION_RETENTION_HOURS,
+        batch_size: int = settings.ARCHIVER_BATCH_SIZE,
+        interval: float = settings.ARCHIVER_INTERVAL,
+        months_ahead: int = settings.ARCHIVE_PARTITIONS_AHEAD,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.retention = timedelta(hours=retention_hours)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self.session_factory = session_factory
+        # Месяцы, секции для которых уже точно есть
+        self._partitions: set = set()
+
+    async def ensure_partitions(self, months) -> None:
+        missing = set(months) - self._partitions
+        if not missing:
+            return
+        async with engine.begin() as conn:
+            created = await ensure_partitions(conn, missing)
+        if created:
+            logger.info("archiver: created partitions %s", ", ".join(created))
+        self._partitions.update(missing)
+
+    async def ensure_future_partitions(self) -> None:
+        current = month_start(datetime.utcnow())
+        await self.ensure_partitions(add_months(current, offset) for offset in range(self.months_ahead + 1))
+
+    async def archive_once(self) -> int:
+        cutoff = datetime.utcnow() - self.retention
+        async with self.session_factory() as session:
+            async with session.begin():
+                repo = BalanceRepository(session)
+                rows = await repo.lock_archivable_transactions(cutoff, self.batch_size)
+                if not rows:
+                    return 0
+                # Секции создаются в отдельной транзакции: рабочую таблицу DDL не трогает
+                await self.ensure_partitions(month_start(row.created_at) for row in rows)
+                return await repo.archive_transactions([row.id for row in rows])
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                await self.ensure_future_partitions()
+                moved = await self.archive_once()
+                if moved:
+                    logger.info("archiver: moved %s transactions", moved)
+                if moved >= self.batch_size:
+                    continue
+            except Exception:
+                logger.exception("Archiver error")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _main(args) -> None:
+    archiver = TransactionArchiver(retention_hours=args.retention_hours, batch_size=args.batch_size, interval=args.interval)
+    await archiver.run(asyncio.Event())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Архивация закрытых транзакций")
+    parser.add_argument("--retention-hours", type=float, default=settings.TRANSACTION_RETENTION_HOURS)
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVER_BATCH_SIZE)
+    parser.add_argument("--interval", type=float, default=settings.ARCHIVER_INTERVAL)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
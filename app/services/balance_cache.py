@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.core import settings
+from app.schemas.user_balance_schema import BalanceRead
+from app.services import balance_events
+
+
+class BalanceCache:
+    """LRU-кэш снимков BalanceRead с TTL.
+
+    Запись, прочитанная из БД, кладётся только если с момента начала чтения ключ не
+    инвалидировали (см. token/put): иначе читатель, начавший до коммита записи, мог бы
+    вернуть в кэш устаревшее значение.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, BalanceRead]] = OrderedDict()
+        self._epoch = 0
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        self._forgotten_epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: str) -> Optional[BalanceRead]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def token(self) -> int:
+        return self._epoch
+
+    def put(self, user_id: str, value: BalanceRead, token: int) -> None:
+        if token < self._forgotten_epoch or self._invalidated.get(user_id, -1) >= token:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        self._entries.pop(user_id, None)
+        self._invalidated[user_id] = self._epoch
+        self._invalidated.move_to_end(user_id)
+        self._epoch += 1
+        self.invalidations += 1
+        if len(self._invalidated) > self.max_size:
+            _, epoch = self._invalidated.popitem(last=False)
+            self._forgotten_epoch = max(self._forgotten_epoch, epoch + 1)
+
+    def invalidate_many(self, user_ids) -> None:
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._invalidated.clear()
+        self._epoch += 1
+        self._forgotten_epoch = self._epoch
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.BALANCE_CACHE_ENABLED,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+balance_cache = BalanceCache(settings.BALANCE_CACHE_SIZE, settings.BALANCE_CACHE_TTL)
+balance_events.subscribe(balance_cache.invalidate_many)
+# Пока соединение LISTEN было потеряно, уведомления могли пропасть
+balance_events.subscribe_reset(balance_cache.clear)
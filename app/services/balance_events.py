@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Set
+
+import asyncpg
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.core import settings
+
+logger = logging.getLogger(__name__)
+
+_CHANGED_KEY = "balance_changed_user_ids"
+
+_subscribers: List[Callable[[set], None]] = []
+_reset_subscribers: List[Callable[[], None]] = []
+_watchers: Dict[str, Set[asyncio.Event]] = {}
+
+
+def subscribe(callback: Callable[[set], None]) -> None:
+    """callback(user_ids) вызывается после коммита изменений балансов (в этом процессе или, через NOTIFY, в другом)."""
+    _subscribers.append(callback)
+
+
+def subscribe_reset(callback: Callable[[], None]) -> None:
+    """callback() вызывается, когда часть уведомлений могла быть потеряна (переподключение LISTEN)."""
+    _reset_subscribers.append(callback)
+
+
+@contextmanager
+def watch(user_id: str) -> Iterator[asyncio.Event]:
+    """Событие, которое выставляется при каждом изменении баланса user_id (и при возможной потере уведомлений)."""
+    changed = asyncio.Event()
+    _watchers.setdefault(user_id, set()).add(changed)
+    try:
+        yield changed
+    finally:
+        watchers = _watchers.get(user_id)
+        if watchers is not None:
+            watchers.discard(changed)
+            if not watchers:
+                del _watchers[user_id]
+
+
+def mark_balances_changed(session, user_ids: Iterable[str]) -> None:
+    session.info.setdefault(_CHANGED_KEY, set()).update(user_ids)
+
+
+def _publish(user_ids: set) -> None:
+    if _watchers:
+        for user_id in user_ids:
+            for changed in _watchers.get(user_id, ()):
+                changed.set()
+    for callback in _subscribers:
+        try:
+            callback(user_ids)
+        except Exception:
+            logger.exception("Balance change subscriber failed")
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_before_commit(session):
+    # pg_notify внутри транзакции: уведомление уйдёт другим процессам только при успешном коммите
+    user_ids = session.info.get(_CHANGED_KEY)
+    if user_ids and settings.BALANCE_NOTIFY_ENABLED:
+        session.execute(
+            text("SELECT pg_notify(:channel, user_id) FROM unnest(CAST(:user_ids AS text[])) AS user_id"),
+            {"channel": settings.BALANCE_NOTIFY_CHANNEL, "user_ids": sorted(user_ids)},
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session):
+    user_ids = session.info.pop(_CHANGED_KEY, None)
+    if user_ids:
+        _publish(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_CHANGED_KEY, None)
+
+
+async def listen(stop_event: asyncio.Event, reconnect_delay: float = 1.0) -> None:
+    """Слушает NOTIFY от других процессов на отдельном соединении и переподключается при обрыве."""
+    def on_notify(connection, pid, channel, payload):
+        _publish({payload})
+
+    while not stop_event.is_set():
+        connection = None
+        try:
+            connection = await asyncpg.connect(settings.dsn)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(settings.BALANCE_NOTIFY_CHANNEL, on_notify)
+            for callback in _reset_subscribers:
+                callback()
+            for watchers in _watchers.values():
+                for changed in watchers:
+                    changed.set()
+            stop_wait = asyncio.create_task(stop_event.wait())
+            lost_wait = asyncio.create_task(lost.wait())
+            await asyncio.wait({stop_wait, lost_wait}, return_when=asyncio.FIRST_COMPLETED)
+            stop_wait.cancel()
+            lost_wait.cancel()
+        except Exception:
+            logger.exception("Balance notification listener error")
+        finally:
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        if not stop_event.is_set():
+            await asyncio.sleep(reconnect_delay)
@@ -0,0 +1,50 @@
+from typing import List, Optional, Union
+
+from app.core import settings
+from app.db import AsyncReadSessionLocal, AsyncSessionLocal
+from app.schemas.batch import BalanceOperation, BatchItemResult
+from app.schemas.mapping import balance_read, operation_response
+from app.schemas.transactions import TransactionResponse
+from app.schemas.user_balance_schema import BalanceRead
+from app.services.balance_service import BalanceService
+from app.services.coalescer import coalescer
+
+
+class BalanceFacade:
+    """Долгоживущая точка входа REST-обработчиков: сессия на вызов, ответ — готовая схема.
+
+    Обработчикам не нужны Depends(get_db) и своя сборка BalanceService: каждый уровень зависимостей
+    FastAPI стоит на запрос больше, чем вся работа фасада вокруг BalanceService.
+    Ошибки — ValueError, как у BalanceService; откат делает закрытие сессии.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, read_session_factory=AsyncReadSessionLocal):
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+
+    async def read_balance(self, user_id: str, min_lsn: Optional[str] = None, max_staleness: Optional[float] = None) -> BalanceRead:
+        async with self.read_session_factory(user_id=user_id, min_lsn=min_lsn, max_staleness=max_staleness) as session:
+            return await BalanceService(session).read_balance(user_id)
+
+    async def apply(self, op: BalanceOperation) -> Union[BalanceRead, TransactionResponse]:
+        if settings.COALESCE_ENABLED:
+            return await coalescer.apply(op)
+        async with self.session_factory() as session:
+            result = await BalanceService(session).apply_operation(op)
+            await session.commit()
+        return operation_response(result)
+
+    async def apply_batch(self, operations: List[BalanceOperation]) -> List[BatchItemResult]:
+        async with self.session_factory() as session:
+            results = await BalanceService(session).apply_batch(operations)
+            await session.commit()
+        return results
+
+    async def repair(self, user_id: str) -> BalanceRead:
+        async with self.session_factory() as session:
+            balance = await BalanceService(session).repair_user_balance(user_id)
+            await session.commit()
+        return balance_read(balance)
+
+
+balance_facade = BalanceFacade()
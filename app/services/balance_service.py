@@ -1,76 +1,244 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Dict, List, Union
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import UserBalance, BalanceTransaction, TransactionStatus
-from app.repositories import BalanceRepository
+from app.core import settings
+from app.core.errors import BalanceError, InsufficientFundsError, InvalidOperationError, NotFoundError, TransactionClosedError
+from app.models import UserBalance, BalanceTransaction, TransactionStatus, OutboxEventType
+from app.repositories import BalanceRepository, LedgerRepository
+from app.schemas.batch import BalanceOperation, BatchItemResult
+from app.schemas.mapping import balance_read, transaction_response
+from app.schemas.user_balance_schema import BalanceRead
+from app.services import idempotency
+from app.services.balance_cache import balance_cache
+from app.services.balance_events import mark_balances_changed
+from app.services.striped_balance import StripedBalances, aggregate, striped_users
 
 
 class BalanceService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.repo = BalanceRepository(session)
+        self.striped = StripedBalances(session, self.repo)
+        # Балансы, уже заблокированные в текущей пачке операций (см. apply_batch)
+        self._locked: Optional[Dict[str, UserBalance]] = None
 
     async def get_balance(self, user_id: str) -> UserBalance:
         balance = await self.repo.get_balance(user_id)
         if balance is None:
-            balance = await self.repo.create_balance(user_id)
+            # Строка создаётся только при первой мутации (lock_balance), чтение ничего не пишет
+            balance = UserBalance(user_id=user_id, current=0, maximum=0, locked_total=0)
+        elif balance.stripes:
+            balance = aggregate(user_id, await self.repo.list_stripes(user_id))
         return balance
 
+    async def read_balance(self, user_id: str) -> BalanceRead:
+        if not settings.BALANCE_CACHE_ENABLED:
+            return await self._read_balance_row(user_id)
+        cached = balance_cache.get(user_id)
+        if cached is not None:
+            return cached
+        token = balance_cache.token()
+        snapshot = await self._read_balance_row(user_id)
+        balance_cache.put(user_id, snapshot, token)
+        return snapshot
+
+    async def _read_balance_row(self, user_id: str) -> BalanceRead:
+        row = await self.repo.get_balance_row(user_id)
+        if row is None:
+            return BalanceRead(user_id=user_id, current=0, maximum=0, locked_total=0)
+        return balance_read(row)
+
+    def _changed(self, *user_ids: str) -> None:
+        # Кэш и подписчики узнают об изменении после коммита сессии
+        mark_balances_changed(self.session, user_ids)
+
     async def _lock_balance(self, user_id: str) -> UserBalance:
-        return await self.repo.lock_balance(user_id)
+        self._changed(user_id)
+        if self._locked is None:
+            balance = await self.repo.lock_balance(user_id)
+        else:
+            balance = self._locked.get(user_id)
+            if balance is None:
+                balance = self._locked[user_id] = await self.repo.lock_balance(user_id)
+        if balance.stripes:
+            striped_users.add(user_id)
+        return balance
+
+    def _known_striped(self, user_id: str) -> bool:
+        # Транзакции известных полосатых аккаунтов идут сразу по полосам, без блокировки строки баланса
+        if self._locked is None and user_id in striped_users:
+            self._changed(user_id)
+            return True
+        return False
+
+    def _atomic_enabled(self) -> bool:
+        # В пачке строки уже заблокированы, быстрый путь там ничего не даёт
+        return settings.ATOMIC_MUTATIONS and self._locked is None
+
+    async def _atomic(self, user_id: str, mutation):
+        # Быстрый путь: один guarded UPDATE. None означает, что нужен обычный путь
+        # (нет строки, не выполнен инвариант, транзакция уже закрыта) — он даст ту же ошибку или результат.
+        self._changed(user_id)
+        try:
+            return await mutation
+        except IntegrityError as e:
+            raise BalanceError("Операция нарушает ограничения баланса") from e
 
     async def adjust_limits(self, user_id: str, delta: int) -> UserBalance:
+        if self._atomic_enabled():
+            balance = await self._atomic(user_id, self.repo.atomic_apply_limits_delta(user_id, delta))
+            if balance is not None:
+                return balance
         balance = await self._lock_balance(user_id)
+        if balance.stripes:
+            return await self.striped.adjust_limits(balance, delta)
         return await self.repo.apply_limits_delta(balance, delta)
 
     async def adjust_current(self, user_id: str, delta: int) -> UserBalance:
+        if self._atomic_enabled():
+            balance = await self._atomic(user_id, self.repo.atomic_apply_current_delta(user_id, delta))
+            if balance is not None:
+                return balance
         balance = await self._lock_balance(user_id)
+        if balance.stripes:
+            return await self.striped.adjust_current(balance, delta)
         return await self.repo.apply_current_delta(balance, delta)
 
+    async def apply_batch(self, operations: List[BalanceOperation]) -> List[BatchItemResult]:
+        """Применяет пачку операций в текущей транзакции сессии.
+
+        Строки всех затронутых пользователей блокируются одним запросом в порядке user_id,
+        каждая операция выполняется в своём SAVEPOINT: ошибка откатывает только её.
+        """
+        self._locked = await self.repo.lock_balances([op.user_id for op in operations])
+        self._changed(*self._locked)
+        results = []
+        try:
+            for index, op in enumerate(operations):
+                try:
+                    async with self.session.begin_nested():
+                        result = await self.apply_operation(op)
+                    if isinstance(result, BalanceTransaction):
+                        idempotency.remember(self.session, result)
+                except ValueError as e:
+                    # После отката SAVEPOINT объект баланса просрочен, перечитаем его при следующей операции
+                    self._locked.pop(op.user_id, None)
+                    results.append(BatchItemResult.failed(index, e))
+                    continue
+                # Снимок берём сразу: следующие операции пачки меняют те же ORM-объекты
+                results.append(self.item_result(index, result))
+        finally:
+            self._locked = None
+        return results
+
+    @staticmethod
+    def item_result(index: int, result: Union[UserBalance, BalanceTransaction]) -> BatchItemResult:
+        if isinstance(result, UserBalance):
+            return BatchItemResult(index=index, ok=True, balance=balance_read(result))
+        return BatchItemResult(index=index, ok=True, transaction=transaction_response(result))
+
+    async def apply_operation(self, op: BalanceOperation) -> Union[UserBalance, BalanceTransaction]:
+        if op.op == "adjust_limits":
+            return await self.adjust_limits(op.user_id, op.delta)
+        if op.op == "adjust_current":
+            return await self.adjust_current(op.user_id, op.delta)
+        if op.op == "open_transaction":
+            return await self.open_transaction(op.user_id, op.service_id, op.external_tx_id, op.amount, op.timeout_seconds)
+        if op.op == "confirm_transaction":
+            return await self.confirm_transaction(op.user_id, op.service_id, op.external_tx_id)
+        if op.op == "cancel_transaction":
+            return await self.cancel_transaction(op.user_id, op.service_id, op.external_tx_id)
+        raise InvalidOperationError(f"Неизвестная операция: {op.op}")
+
     async def open_transaction(self, user_id: str, service_id: str, external_tx_id: str, amount: int, timeout_seconds: int) -> BalanceTransaction:
         if amount <= 0:
-            raise ValueError("Сумма транзакции должна быть положительной")
-        
-        balance = await self._lock_balance(user_id)
+            raise InvalidOperationError("Сумма транзакции должна быть положительной")
+        # Повтор уже выполненного open отвечается без блокировки баланса: из кэша или по уникальному индексу
+        cached = idempotency.lookup(user_id, service_id, external_tx_id)
+        if cached is not None:
+            return self._reopened(cached)
+        if self._locked is None:
+            existing_tx = await self.repo.get_transaction(user_id, service_id, external_tx_id)
+            if existing_tx is not None:
+                return self._remember(self._reopened(existing_tx))
+        return self._remember(await self._open_transaction(user_id, service_id, external_tx_id, amount, timeout_seconds))
+
+    async def _open_transaction(self, user_id: str, service_id: str, external_tx_id: str, amount: int, timeout_seconds: int) -> BalanceTransaction:
         expires_at = datetime.utcnow() + timedelta(seconds=timeout_seconds)
-        
-        existing_tx = await self.repo.get_transaction(user_id, service_id, external_tx_id)
-        if existing_tx:
-            if existing_tx.status == TransactionStatus.LOCKED:
-                return existing_tx
-            else:
-                raise ValueError("Транзакция уже завершена")
-        
+        if self._atomic_enabled():
+            transaction = await self._atomic(user_id, self.repo.atomic_open_transaction(user_id, service_id, external_tx_id, amount, expires_at))
+            if transaction is not None:
+                return transaction
+        if self._known_striped(user_id):
+            transaction = await self.striped.open_transaction(user_id, service_id, external_tx_id, amount, expires_at)
+            if transaction is not None:
+                return transaction
+
+        balance = await self._lock_balance(user_id)
+        if balance.stripes:
+            transaction = await self.striped.open_transaction(user_id, service_id, external_tx_id, amount, expires_at)
+            if transaction is not None:
+                return transaction
+
+        # Дубликат (в пачке или вставленный параллельно после проверки) упирается в уникальный индекс;
+        # если средств не хватает, вставка откатывается вместе с операцией
+        transaction = await self.repo.create_transaction_if_absent(user_id, service_id, external_tx_id, amount, expires_at)
+        if transaction is None:
+            return self._reopened(await self.repo.get_transaction(user_id, service_id, external_tx_id))
+
         available = balance.current - balance.locked_total
         if available < amount or balance.current + balance.locked_total + amount > balance.maximum:
-            raise ValueError(f"Недостаточно средств. Доступно: {available}, требуется: {amount}")
-
-        transaction = await self.repo.create_transaction(
-            user_id=user_id,
-            service_id=service_id,
-            external_tx_id=external_tx_id,
-            amount=amount,
-            status=TransactionStatus.LOCKED,
-            expires_at=expires_at,
-        )
+            raise InsufficientFundsError(f"Недостаточно средств. Доступно: {available}, требуется: {amount}")
         await self.repo.increment_locked_total(balance, amount)
-        
+
+        return transaction
+
+    @staticmethod
+    def _reopened(transaction: BalanceTransaction) -> BalanceTransaction:
+        if transaction.status != TransactionStatus.LOCKED:
+            raise TransactionClosedError("Транзакция уже завершена")
+        return transaction
+
+    def _remember(self, transaction: BalanceTransaction) -> BalanceTransaction:
+        # Результат попадает в кэш повторов после коммита; в пачке — после успешного SAVEPOINT (см. apply_batch)
+        if self._locked is None:
+            idempotency.remember(self.session, transaction)
         return transaction
 
     async def confirm_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> BalanceTransaction:
+        closed = idempotency.lookup(user_id, service_id, external_tx_id, final=True)
+        if closed is not None:
+            return closed
+        return self._remember(await self._confirm_transaction(user_id, service_id, external_tx_id))
+
+    async def _confirm_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> BalanceTransaction:
+        if self._atomic_enabled():
+            transaction = await self._atomic(user_id, self.repo.atomic_close_transaction(user_id, service_id, external_tx_id, TransactionStatus.CONFIRMED))
+            if transaction is not None:
+                return transaction
+        if self._known_striped(user_id):
+            transaction = await self.striped.close_transaction(user_id, service_id, external_tx_id, TransactionStatus.CONFIRMED)
+            if transaction is not None:
+                return transaction
+
         balance = await self._lock_balance(user_id)
+        if balance.stripes:
+            transaction = await self.striped.close_transaction(user_id, service_id, external_tx_id, TransactionStatus.CONFIRMED)
+            if transaction is not None:
+                return transaction
         transaction = await self.repo.get_transaction(user_id, service_id, external_tx_id)
         
         if not transaction:
-            raise ValueError("Транзакция не найдена")
+            raise NotFoundError("Транзакция не найдена")
         
         if transaction.status != TransactionStatus.LOCKED:
             return transaction
         
         if transaction.expires_at < datetime.utcnow():
             await self._cancel_transaction_internal(balance, transaction)
-            raise ValueError("Транзакция истекла")
+            raise TransactionClosedError("Транзакция истекла")
         
         balance.current -= transaction.amount
         await self.repo.decrement_locked_total(balance, transaction.amount)
@@ -79,11 +247,30 @@ class BalanceService:
         return transaction
 
     async def cancel_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> BalanceTransaction:
+        closed = idempotency.lookup(user_id, service_id, external_tx_id, final=True)
+        if closed is not None:
+            return closed
+        return self._remember(await self._cancel_transaction(user_id, service_id, external_tx_id))
+
+    async def _cancel_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> BalanceTransaction:
+        if self._atomic_enabled():
+            transaction = await self._atomic(user_id, self.repo.atomic_close_transaction(user_id, service_id, external_tx_id, TransactionStatus.CANCELED))
+            if transaction is not None:
+                return transaction
+        if self._known_striped(user_id):
+            transaction = await self.striped.close_transaction(user_id, service_id, external_tx_id, TransactionStatus.CANCELED)
+            if transaction is not None:
+                return transaction
+
         balance = await self._lock_balance(user_id)
+        if balance.stripes:
+            transaction = await self.striped.close_transaction(user_id, service_id, external_tx_id, TransactionStatus.CANCELED)
+            if transaction is not None:
+                return transaction
         transaction = await self.repo.get_transaction(user_id, service_id, external_tx_id)
         
         if not transaction:
-            raise ValueError("Транзакция не найдена")
+            raise NotFoundError("Транзакция не найдена")
         
         if transaction.status != TransactionStatus.LOCKED:
             return transaction
@@ -99,36 +286,65 @@ class BalanceService:
 
     async def repair_user_balance(self, user_id: str) -> UserBalance:
         balance = await self._lock_balance(user_id)
-        
-        actual_locked = await self.repo.sum_locked_transactions(user_id)
-        
-        balance.locked_total = actual_locked
-        
-        max_allowed = max(0, balance.maximum - balance.locked_total)
-        if balance.current > max_allowed:
-            balance.current = max_allowed
-        if balance.current < 0:
-            balance.current = 0
-        
+        if balance.stripes:
+            before, balance = await self.striped.repair(balance)
+        else:
+            before = balance_read(balance)
+            actual_locked = await self.repo.sum_locked_transactions(user_id)
+
+            balance.locked_total = actual_locked
+
+            max_allowed = max(0, balance.maximum - balance.locked_total)
+            if balance.current > max_allowed:
+                balance.current = max_allowed
+            if balance.current < 0:
+                balance.current = 0
+
+        deltas = (balance.current - before.current, 0, balance.locked_total - before.locked_total)
+        self.repo.add_event(OutboxEventType.BALANCE_REPAIRED, user_id, balance.locked_total, deltas=deltas)
         return balance
 
-    async def sweep_expired_transactions(self, batch_size: int = 100) -> int:
+    async def rebuild_user_balance(self, user_id: str) -> UserBalance:
+        """Восстанавливает current и maximum из журнала, locked_total — по открытым транзакциям, как repair."""
+        if not settings.LEDGER_ENABLED:
+            raise BalanceError("Журнал баланса выключен (LEDGER_ENABLED)")
+        balance = await self._lock_balance(user_id)
+        stripes = balance.stripes
+        if stripes:
+            # Полосы собираются в строку баланса и после восстановления раскладываются заново
+            await self.striped.set_stripes(balance, 0)
+        ledger = await LedgerRepository(self.session).replay(user_id)
+        locked = await self.repo.sum_locked_transactions(user_id)
+        if ledger.current < 0 or ledger.current + locked > ledger.maximum:
+            raise BalanceError(f"Журнал не согласован с открытыми транзакциями: current={ledger.current}, maximum={ledger.maximum}, locked_total={locked}")
+        balance.current, balance.maximum, balance.locked_total = ledger.current, ledger.maximum, locked
+        # Журнал получает поправку locked_total до суммы открытых транзакций
+        self.repo.add_event(OutboxEventType.BALANCE_REPAIRED, user_id, locked, deltas=(0, 0, locked - ledger.locked_total))
+        if stripes:
+            return await self.striped.set_stripes(balance, stripes)
+        return balance
+
+    async def cancel_expired_transactions(self, batch_size: int = 100, shard: int = 0, shard_count: int = 1) -> list:
+        """Отменяет пачку истёкших транзакций шарда, возвращает строки (user_id, canceled, amount)."""
         now = datetime.utcnow()
-        
-        expired_transactions = await self.repo.list_expired_locked_transactions(
-            now=now, limit=batch_size
-        )
-        
-        canceled_count = 0
-        for tx in expired_transactions:
-            try:
-                balance = await self._lock_balance(tx.user_id)
-                if tx.status == TransactionStatus.LOCKED:
-                    await self._cancel_transaction_internal(balance, tx)
-                    canceled_count += 1
-            except Exception:
-                continue
-        
-        return canceled_count
+        rows = await self.repo.cancel_expired_transactions(now, batch_size, shard, shard_count)
+        rows += await self.repo.cancel_expired_striped_transactions(now, batch_size, shard, shard_count)
+        self._changed(*(row.user_id for row in rows))
+        return rows
 
+    async def set_stripes(self, user_id: str, count: int) -> UserBalance:
+        """Включает (count > 0) или выключает полосатый режим аккаунта."""
+        if count < 0:
+            raise InvalidOperationError("Число полос не может быть отрицательным")
+        balance = await self._lock_balance(user_id)
+        return await self.striped.set_stripes(balance, count)
+
+    async def rebalance_stripes(self, user_id: str) -> bool:
+        changed = await self.striped.rebalance(user_id)
+        if changed:
+            self._changed(user_id)
+        return changed
 
+    async def sweep_expired_transactions(self, batch_size: int = 100) -> int:
+        rows = await self.cancel_expired_transactions(batch_size)
+        return sum(row.canceled for row in rows)
@@ -0,0 +1,268 @@
+"""Массовая загрузка балансов из CSV/Parquet и выгрузка таблиц в CSV через COPY.
+
+    python -m app.services.bulk import balances.csv [--format parquet] [--no-header] [--insert-only] [--chunk-size 50000]
+    python -m app.services.bulk export user_balances|balance_transactions [файл]
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import asyncpg
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import settings
+from app.core.errors import InvalidOperationError
+from app.db import engine
+from app.repositories import BalanceRepository
+from app.repositories.balance_repository import EXPORT_TABLES, IMPORT_COLUMNS
+from app.services.balance_events import mark_balances_changed
+
+logger = logging.getLogger(__name__)
+
+_REQUIRED_COLUMNS = ("user_id", "current", "maximum")
+_READ_SIZE = 1 << 20
+
+
+@dataclass
+class ImportReject:
+    line: int
+    user_id: Optional[str]
+    # Причина: invalid_user_id, duplicate, invalid_number, имя нарушенного CheckConstraint, exists, striped
+    reason: str
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    # Значения в файле совпали с текущими — строка не менялась
+    unchanged: int = 0
+    rejected: int = 0
+    seconds: float = 0.0
+
+
+class BalanceImportJob:
+    """Загрузка (user_id, current, maximum) миллионов пользователей вместо /limits и /current на каждого.
+
+    Файл без разбора в Python идёт COPY во временную таблицу, проверяется одним запросом и вливается
+    в user_balances транзакциями по chunk_size строк: INSERT ... ON CONFLICT с записями журнала и событиями
+    outbox тем же запросом. Строки, нарушающие формат или CheckConstraint'ы, не грузятся и попадают в отчёт;
+    остальные строки файла это не останавливает. Повторная загрузка того же файла ничего не меняет.
+    """
+
+    def __init__(self, chunk_size: int = settings.IMPORT_CHUNK_SIZE, insert_only: bool = False, engine=engine):
+        self.chunk_size = chunk_size
+        self.insert_only = insert_only
+        self.engine = engine
+
+    async def run(
+        self,
+        source: AsyncIterable[bytes],
+        header: bool = True,
+        on_reject: Optional[Callable[[ImportReject], Awaitable[None]]] = None,
+    ) -> ImportReport:
+        report = ImportReport()
+        started = time.perf_counter()
+
+        async def reject(line: int, user_id: Optional[str], reason: str) -> None:
+            report.rejected += 1
+            if on_reject is not None:
+                await on_reject(ImportReject(line, user_id, reason))
+
+        merge_rejected = 0
+        columns, source = await _read_columns(source, header)
+        # Временные таблицы видны только своему соединению: вся загрузка идёт по одному
+        async with self.engine.connect() as conn:
+            async with AsyncSession(bind=conn) as session:
+                repo = BalanceRepository(session)
+                try:
+                    async with session.begin():
+                        await repo.create_import_tables()
+                        try:
+                            report.rows = await repo.copy_import_rows(columns, source, header)
+                        except asyncpg.DataError as e:
+                            # context: "COPY balance_import_rows, line N: <строка>"
+                            where = (e.context or "").split(":", 1)[0]
+                            raise InvalidOperationError(f"Файл не разобран: {e} ({where})") from e
+                        statuses = await repo.check_import_rows()
+                    async with session.begin():
+                        async for rows in repo.stream_import_rejects(self.chunk_size):
+                            for row in rows:
+                                await reject(row.line, row.user_id, row.status)
+                    for after in range(0, report.rows, self.chunk_size):
+                        async with session.begin():
+                            rows = await repo.merge_imported_balances(after, after + self.chunk_size, self.insert_only)
+                            mark_balances_changed(session, [row.user_id for row in rows if row.status == "updated"])
+                        for row in rows:
+                            if row.status in ("updated", "unchanged"):
+                                setattr(report, row.status, getattr(report, row.status) + 1)
+                            else:
+                                merge_rejected += 1
+                                await reject(row.line, row.user_id, row.status)
+                        logger.debug("import: %d/%d rows merged", min(after + self.chunk_size, report.rows), report.rows)
+                finally:
+                    # Ошибка уборки не должна подменить исходную ошибку загрузки. Соединение с неубранными
+                    # временными таблицами в пул не возвращается: они исчезнут вместе с ним
+                    try:
+                        if session.in_transaction():
+                            await session.rollback()
+                        async with session.begin():
+                            await repo.drop_import_tables()
+                    except Exception:
+                        logger.exception("import: failed to drop import tables")
+                        await conn.invalidate()
+        report.inserted = statuses.get(None, 0) - report.updated - report.unchanged - merge_rejected
+        report.seconds = round(time.perf_counter() - started, 3)
+        return report
+
+
+async def _read_columns(source: AsyncIterable[bytes], header: bool) -> Tuple[List[str], AsyncIterator[bytes]]:
+    """Колонки файла: из заголовка по именам (в любом порядке), без заголовка — user_id,current,maximum."""
+    chunks = source.__aiter__()
+    head = b""
+    if not header:
+        columns = list(_REQUIRED_COLUMNS)
+    else:
+        while b"\n" not in head:
+            chunk = await anext(chunks, None)
+            if chunk is None:
+                break
+            head += chunk
+        line = head.split(b"\n", 1)[0].decode("utf-8-sig").rstrip("\r")
+        columns = next(csv.reader([line]), [])
+        unknown = [column for column in columns if column not in IMPORT_COLUMNS]
+        if unknown:
+            raise InvalidOperationError(f"Неизвестные колонки: {', '.join(unknown)}")
+        missing = [column for column in _REQUIRED_COLUMNS if column not in columns]
+        if missing:
+            raise InvalidOperationError(f"Нет колонок: {', '.join(missing)}")
+
+    async def replay() -> AsyncIterator[bytes]:
+        if head:
+            yield head
+        async for chunk in chunks:
+            yield chunk
+
+    return columns, replay()
+
+
+async def read_file(path: str) -> AsyncIterator[bytes]:
+    """CSV из файла или stdin ("-") кусками по 1 МиБ."""
+    with (open(path, "rb") if path != "-" else sys.stdin.buffer) as f:
+        while chunk := await asyncio.to_thread(f.read, _READ_SIZE):
+            yield chunk
+
+
+async def read_parquet(path: str, batch_size: int = 65_536) -> AsyncIterator[bytes]:
+    """Parquet (нужен pyarrow) как CSV с заголовком: пачки строк перекодируются в CSV по одной, память не растёт с файлом."""
+    try:
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError as e:
+        raise InvalidOperationError("Для Parquet нужен pyarrow: pip install pyarrow") from e
+
+    parquet = pyarrow.parquet.ParquetFile(path)
+    columns = [name for name in parquet.schema_arrow.names if name in IMPORT_COLUMNS]
+
+    def encode(batch, include_header: bool) -> bytes:
+        sink = io.BytesIO()
+        pyarrow.csv.write_csv(batch, sink, pyarrow.csv.WriteOptions(include_header=include_header))
+        return sink.getvalue()
+
+    include_header = True
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+        yield await asyncio.to_thread(encode, batch, include_header)
+        include_header = False
+    if include_header:
+        yield ",".join(columns).encode() + b"\n"
+
+
+async def export_table(table: str, output: Callable[[bytes], Awaitable[None]], engine=engine) -> None:
+    """COPY TO таблицы в CSV с заголовком; output получает куски по мере чтения, память не растёт с таблицей."""
+    if table not in EXPORT_TABLES:
+        raise InvalidOperationError("Неизвестная таблица выгрузки")
+    async with AsyncSession(engine) as session:
+        async with session.begin():
+            await BalanceRepository(session).copy_export(table, output)
+
+
+async def stream_export(table: str, engine=engine) -> AsyncIterator[bytes]:
+    """export_table как async-итератор (для StreamingResponse): COPY ждёт, пока клиент заберёт уже прочитанное."""
+    if table not in EXPORT_TABLES:
+        raise InvalidOperationError("Неизвестная таблица выгрузки")
+    queue = asyncio.Queue(maxsize=8)
+
+    async def put(chunk) -> None:
+        # asyncpg отдаёт bytearray своего буфера
+        await queue.put(bytes(chunk))
+
+    async def copy() -> None:
+        try:
+            await export_table(table, put, engine)
+        finally:
+            await queue.put(None)
+
+    task = asyncio.create_task(copy())
+    try:
+        while (chunk := await queue.get()) is not None:
+            yield chunk
+        await task
+    finally:
+        task.cancel()
+
+
+async def _print_reject(reject: ImportReject) -> None:
+    print(json.dumps(asdict(reject), ensure_ascii=False), flush=True)
+
+
+async def _import(args) -> int:
+    source = read_parquet(args.path) if args.format == "parquet" else read_file(args.path)
+    job = BalanceImportJob(chunk_size=args.chunk_size, insert_only=args.insert_only)
+    report = await job.run(source, header=args.format == "parquet" or args.header, on_reject=_print_reject)
+    logger.info("import: %s", report)
+    return 1 if report.rejected else 0
+
+
+async def _export(args) -> int:
+    with (open(args.path, "wb") if args.path != "-" else sys.stdout.buffer) as f:
+        async def write(chunk: bytes) -> None:
+            f.write(chunk)
+
+        await export_table(args.table, write)
+    return 0
+
+
+async def _main(args) -> int:
+    try:
+        return await args.command(args)
+    except InvalidOperationError as e:
+        logger.error("%s", e)
+        return 2
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Массовая загрузка и выгрузка балансов")
+    commands = parser.add_subparsers(required=True)
+    importer = commands.add_parser("import", help="загрузка; отклонённые строки — JSON lines в stdout, код 1, если они есть")
+    importer.set_defaults(command=_import)
+    importer.add_argument("path", help="файл или - (stdin, только CSV)")
+    importer.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    importer.add_argument("--no-header", dest="header", action="store_false", help="в CSV нет заголовка: колонки user_id,current,maximum")
+    importer.add_argument("--insert-only", action="store_true", help="только новые пользователи, существующие — в отказ (exists)")
+    importer.add_argument("--chunk-size", type=int, default=settings.IMPORT_CHUNK_SIZE)
+    exporter = commands.add_parser("export", help="выгрузка таблицы в CSV")
+    exporter.set_defaults(command=_export)
+    exporter.add_argument("table", choices=EXPORT_TABLES)
+    exporter.add_argument("path", nargs="?", default="-", help="файл или - (stdout)")
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(parser.parse_args())))
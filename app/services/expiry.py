@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import heapq
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Iterable, List, Optional, Set
+
+import asyncpg
+
+from app.core import metrics, settings
+from app.db import AsyncSessionLocal
+from app.repositories import BalanceRepository
+from app.services.sweeper import ExpirySweeper
+
+logger = logging.getLogger(__name__)
+
+_STANDBY_INTERVAL = 5.0
+_LOAD_CHUNK_SIZE = 10_000
+
+
+@dataclass
+class SchedulerStats:
+    leader: bool = False
+    # Корзин сроков в куче
+    pending: int = 0
+    sweeps: int = 0
+    canceled: int = 0
+    recoveries: int = 0
+    # Через сколько секунд после конца сработавшей корзины закончилась её отмена
+    last_lag: Optional[float] = None
+    errors: int = 0
+
+
+class ExpiryScheduler:
+    """Отмена истёкших транзакций к их сроку вместо опроса раз в SWEEPER_INTERVAL.
+
+    Работает один планировщик на БД: лидер держит advisory-блокировку на своём соединении и на нём же
+    слушает EXPIRY_CHANNEL, остальные процессы ждут в резерве. Сроки открытых транзакций лидер загружает
+    при старте, новые приходят через NOTIFY из запроса, который открывает транзакцию. Сроки хранятся
+    корзинами по coalesce секунд в куче: память не зависит от числа открытых транзакций, и всё, что
+    истекает в пределах корзины, отменяется одной пачкой свипера в конце корзины. О закрытиях лидер не
+    знает: корзина, все транзакции которой уже закрыты, стоит одного пустого запроса по частичному
+    индексу. Транзакции, пропущенные из-за занятой строки баланса или потерянного уведомления,
+    отменяет опрос раз в recovery_interval.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.SWEEPER_BATCH_SIZE,
+        coalesce: float = settings.EXPIRY_COALESCE,
+        recovery_interval: float = settings.EXPIRY_RECOVERY_INTERVAL,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.sweeper = ExpirySweeper(batch_size=batch_size, shard_count=1, shards=[0], session_factory=session_factory)
+        self.coalesce = max(coalesce, 0.001)
+        self.recovery_interval = recovery_interval
+        self.session_factory = session_factory
+        self.stats = SchedulerStats()
+        # Номера корзин: корзина n заканчивается в n * coalesce (секунды UTC)
+        self._buckets: Set[int] = set()
+        self._heap: List[int] = []
+        self._wakeup = asyncio.Event()
+
+    def schedule(self, expires_at: float) -> None:
+        """Срок открытой транзакции, секунды UTC."""
+        bucket = math.ceil(expires_at / self.coalesce)
+        if bucket in self._buckets:
+            return
+        self._buckets.add(bucket)
+        heapq.heappush(self._heap, bucket)
+        self.stats.pending = len(self._heap)
+        if self._heap[0] == bucket:
+            self._wakeup.set()
+
+    def next_deadline(self) -> Optional[float]:
+        return self._heap[0] * self.coalesce if self._heap else None
+
+    def pop_due(self, now: float) -> Optional[float]:
+        """Снимает наступившие корзины и возвращает конец самой ранней из них (None — ничего не истекло)."""
+        first = None
+        while self._heap and self._heap[0] * self.coalesce <= now:
+            bucket = heapq.heappop(self._heap)
+            self._buckets.discard(bucket)
+            if first is None:
+                first = bucket * self.coalesce
+        self.stats.pending = len(self._heap)
+        return first
+
+    async def _sweep(self) -> int:
+        canceled = 0
+        while True:
+            batch = await self.sweeper.sweep_once(0)
+            canceled += batch.canceled
+            if batch.canceled < self.sweeper.batch_size:
+                break
+        self.stats.sweeps += 1
+        self.stats.canceled += canceled
+        return canceled
+
+    async def _load(self) -> None:
+        count = 0
+        async with self.session_factory() as session:
+            async with session.begin():
+                async for deadlines in BalanceRepository(session).stream_open_deadlines(_LOAD_CHUNK_SIZE):
+                    for expires_at in deadlines:
+                        self.schedule(expires_at.replace(tzinfo=timezone.utc).timestamp())
+                    count += len(deadlines)
+        logger.info("Expiry scheduler: %d open transactions in %d buckets", count, len(self._heap))
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        self.schedule(float(payload))
+
+    async def _lead(self, lost: asyncio.Event, stop_event: asyncio.Event) -> None:
+        await self._load()
+        # Сразу после загрузки — опрос: за время без лидера могли истечь транзакции
+        recovered_at = float("-inf")
+        while not stop_event.is_set() and not lost.is_set():
+            self._wakeup.clear()
+            first = self.pop_due(time.time())
+            if first is not None:
+                await self._sweep()
+                self.stats.last_lag = round(time.time() - first, 6)
+                metrics.EXPIRY_LAG.observe(self.stats.last_lag)
+            elif time.monotonic() - recovered_at >= self.recovery_interval:
+                if await self._sweep():
+                    logger.info("Expiry scheduler: recovery poll canceled overdue transactions")
+                self.stats.recoveries += 1
+                recovered_at = time.monotonic()
+            timeout = self.recovery_interval - (time.monotonic() - recovered_at)
+            deadline = self.next_deadline()
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.time())
+            if timeout > 0:
+                await _wait_any((self._wakeup, stop_event, lost), timeout)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            connection = None
+            try:
+                connection = await asyncpg.connect(settings.dsn)
+                # Блокировка уровня сессии: держится, пока живо соединение
+                if await connection.fetchval("SELECT pg_try_advisory_lock(hashtext('balance_expiry'))"):
+                    lost = asyncio.Event()
+                    connection.add_termination_listener(lambda _: lost.set())
+                    # LISTEN до загрузки сроков: открытые во время загрузки не теряются
+                    await connection.add_listener(settings.EXPIRY_CHANNEL, self._on_notify)
+                    self.stats.leader = True
+                    logger.info("Expiry scheduler is the leader")
+                    await self._lead(lost, stop_event)
+            except Exception:
+                self.stats.errors += 1
+                logger.exception("Expiry scheduler error")
+            finally:
+                self.stats.leader = False
+                self._buckets.clear()
+                self._heap.clear()
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=_STANDBY_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _wait_any(events: Iterable[asyncio.Event], timeout: float) -> None:
+    waits = [asyncio.create_task(event.wait()) for event in events]
+    try:
+        await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for wait in waits:
+            wait.cancel()
+
+
+async def _main(args) -> None:
+    scheduler = ExpiryScheduler(batch_size=args.batch_size, coalesce=args.coalesce, recovery_interval=args.recovery_interval)
+    await scheduler.run(asyncio.Event())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отмена истёкших транзакций к сроку")
+    parser.add_argument("--batch-size", type=int, default=settings.SWEEPER_BATCH_SIZE)
+    parser.add_argument("--coalesce", type=float, default=settings.EXPIRY_COALESCE)
+    parser.add_argument("--recovery-interval", type=float, default=settings.EXPIRY_RECOVERY_INTERVAL)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core import settings
+from app.models import BalanceTransaction, TransactionStatus
+
+_PENDING_KEY = "idempotency_results"
+_COLUMNS = [column.key for column in BalanceTransaction.__table__.columns]
+
+Key = tuple[str, str, str]
+
+
+class IdempotencyCache:
+    """LRU-кэш результатов операций с транзакциями по ключу (user_id, service_id, external_tx_id).
+
+    Закрытая транзакция больше не меняется, её повторные confirm/cancel отвечаются из кэша. Открытая
+    (LOCKED) отвечает только на повтор open: если её закрыл другой процесс, повтор в пределах TTL
+    получит исходный ответ open, а не ошибку. Результат попадает в кэш только после коммита.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Key, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Key) -> Optional[BalanceTransaction]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Отдельный объект на каждый ответ: в сессию он не попадает
+        return BalanceTransaction(**entry[1])
+
+    def put(self, key: Key, values: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, values)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.IDEMPOTENCY_CACHE_ENABLED,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+idempotency_cache = IdempotencyCache(settings.IDEMPOTENCY_CACHE_SIZE, settings.IDEMPOTENCY_CACHE_TTL)
+
+
+def lookup(user_id: str, service_id: str, external_tx_id: str, final: bool = False) -> Optional[BalanceTransaction]:
+    """Результат из кэша; final — только закрытая транзакция, LOCKED после истечения срока не отдаётся."""
+    if not settings.IDEMPOTENCY_CACHE_ENABLED:
+        return None
+    transaction = idempotency_cache.get((user_id, service_id, external_tx_id))
+    if transaction is None or transaction.status != TransactionStatus.LOCKED:
+        return transaction
+    if final or transaction.expires_at < datetime.utcnow():
+        return None
+    return transaction
+
+
+def remember(session, transaction: BalanceTransaction) -> None:
+    # Снимок сразу: до коммита те же ORM-объекты могут измениться (например, в пачке)
+    if settings.IDEMPOTENCY_CACHE_ENABLED:
+        key = (transaction.user_id, transaction.service_id, transaction.external_tx_id)
+        session.info.setdefault(_PENDING_KEY, {})[key] = {name: getattr(transaction, name) for name in _COLUMNS}
+
+
+@event.listens_for(Session, "after_commit")
+def _put_after_commit(session):
+    for key, values in session.info.pop(_PENDING_KEY, {}).items():
+        idempotency_cache.put(key, values)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,27 @@
+import asyncio
+from typing import List
+
+from app.core import settings
+from app.services.archiver import TransactionArchiver
+from app.services.expiry import ExpiryScheduler
+from app.services.outbox import OutboxRelay
+from app.services.stripe_rebalancer import StripeRebalancer
+from app.services.sweeper import ExpirySweeper
+
+
+def start_background_jobs(stop_event: asyncio.Event) -> List[asyncio.Task]:
+    """Фоновые задачи, которых на узле нужно по одной: свипер, архиватор, релей outbox, выравнивание полос.
+
+    Запускаются в lifespan REST-процесса или, под супервизором (app.supervisor), в отдельном процессе jobs.
+    """
+    tasks = []
+    if settings.SWEEPER_ENABLED:
+        sweeper = ExpiryScheduler() if settings.EXPIRY_SCHEDULER_ENABLED else ExpirySweeper()
+        tasks.append(asyncio.create_task(sweeper.run(stop_event)))
+    if settings.ARCHIVER_ENABLED:
+        tasks.append(asyncio.create_task(TransactionArchiver().run(stop_event)))
+    if settings.OUTBOX_ENABLED and settings.OUTBOX_RELAY_ENABLED:
+        tasks.append(asyncio.create_task(OutboxRelay().run(stop_event)))
+    if settings.STRIPE_REBALANCE_ENABLED:
+        tasks.append(asyncio.create_task(StripeRebalancer().run(stop_event)))
+    return tasks
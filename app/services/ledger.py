@@ -0,0 +1,143 @@
+"""Снимки балансов и сверка всех пользователей с журналом.
+
+    python -m app.services.ledger verify [--workers 8] [--chunk-size 10000]
+    python -m app.services.ledger checkpoint [--baseline]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import settings
+from app.db import engine
+from app.repositories import LedgerRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LedgerReport:
+    chunks: int = 0
+    users: int = 0
+    mismatched: int = 0
+    snapshots: int = 0
+    seconds: float = 0.0
+
+
+class LedgerJob:
+    """Проход по всем пользователям пачками по chunk_size в workers соединениях.
+
+    Границы пачек (диапазоны user_id) читает отдельная задача по индексу и отдаёт их через очередь,
+    так что проход идёт потоком, без списка всех пользователей в памяти. Каждая пачка — одна
+    транзакция REPEATABLE READ: user_balances, снимки и журнал читаются в одном снимке, и сверка
+    точна при параллельной записи.
+    """
+
+    def __init__(self, workers: int = settings.LEDGER_WORKERS, chunk_size: int = settings.LEDGER_CHUNK_SIZE, engine=engine):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.engine = engine
+
+    async def _produce(self, queue: asyncio.Queue) -> None:
+        after = None
+        async with AsyncSession(self.engine) as session:
+            repo = LedgerRepository(session)
+            while True:
+                async with session.begin():
+                    upto = await repo.next_bound(after, self.chunk_size)
+                await queue.put((after, upto))
+                if upto is None:
+                    break
+                after = upto
+        for _ in range(self.workers):
+            await queue.put(None)
+
+    async def _work(self, queue: asyncio.Queue, handle, report: LedgerReport, read_only: bool) -> None:
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=read_only)
+            async with AsyncSession(bind=conn) as session:
+                repo = LedgerRepository(session)
+                while (bounds := await queue.get()) is not None:
+                    async with session.begin():
+                        await handle(repo, *bounds)
+                    report.chunks += 1
+
+    async def _run(self, handle, report: LedgerReport, read_only: bool) -> LedgerReport:
+        started = time.perf_counter()
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+        tasks = [asyncio.create_task(self._produce(queue))]
+        tasks += [asyncio.create_task(self._work(queue, handle, report, read_only)) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        report.seconds = round(time.perf_counter() - started, 3)
+        return report
+
+    async def verify(self, on_mismatch: Optional[Callable] = None) -> LedgerReport:
+        """Сверяет балансы всех пользователей с журналом; расхождения передаются в on_mismatch."""
+        report = LedgerReport()
+
+        async def handle(repo: LedgerRepository, after, upto) -> None:
+            users = await repo.count_users(after, upto)
+            report.users += users
+            for row in await repo.list_mismatches(after, upto):
+                report.mismatched += 1
+                if on_mismatch is not None:
+                    on_mismatch(row)
+
+        return await self._run(handle, report, read_only=True)
+
+    async def checkpoint(self, baseline: bool = False) -> LedgerReport:
+        """Новые снимки пользователей, у которых журнал изменился (baseline — всех, из user_balances)."""
+        report = LedgerReport()
+
+        async def handle(repo: LedgerRepository, after, upto) -> None:
+            snapshots = await repo.checkpoint(after, upto, baseline)
+            report.snapshots += snapshots
+
+        await self._run(handle, report, read_only=False)
+        async with AsyncSession(self.engine) as session:
+            async with session.begin():
+                pruned = await LedgerRepository(session).prune_checkpoints()
+        logger.info("ledger: %d snapshots in %d chunks, %d stale checkpoints pruned", report.snapshots, report.chunks, pruned)
+        return report
+
+
+def _print_mismatch(row) -> None:
+    print(json.dumps({
+        "user_id": row.user_id,
+        "actual": {"current": row.actual_current, "maximum": row.actual_maximum, "locked_total": row.actual_locked_total},
+        "ledger": {"current": row.current, "maximum": row.maximum, "locked_total": row.locked_total},
+    }, ensure_ascii=False), flush=True)
+
+
+async def _main(args) -> int:
+    job = LedgerJob(workers=args.workers, chunk_size=args.chunk_size)
+    try:
+        if args.command == "verify":
+            report = await job.verify(_print_mismatch)
+            logger.info("ledger: %d users in %.1fs, %d mismatched", report.users, report.seconds, report.mismatched)
+            return 1 if report.mismatched else 0
+        await job.checkpoint(baseline=args.baseline)
+        return 0
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Снимки балансов и сверка с журналом")
+    parser.add_argument("command", choices=["verify", "checkpoint"])
+    parser.add_argument("--workers", type=int, default=settings.LEDGER_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=settings.LEDGER_CHUNK_SIZE)
+    parser.add_argument("--baseline", action="store_true", help="снимки всех пользователей из user_balances (начало журнала)")
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(parser.parse_args())))
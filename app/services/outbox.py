@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.core import settings
+from app.db import engine
+from app.repositories import OutboxRepository
+from app.services.outbox_sinks import EventSink, event_message, make_sink
+
+logger = logging.getLogger(__name__)
+
+_STANDBY_INTERVAL = 5.0
+_PURGE_INTERVAL = 60.0
+
+
+@dataclass
+class RelayStats:
+    leader: bool = False
+    published: int = 0
+    position: Optional[int] = None
+    gaps: int = 0
+    errors: int = 0
+
+
+class OutboxRelay:
+    """Публикует события balance_outbox в приёмник.
+
+    Работает один релей на БД: лидер держит advisory-блокировку на своём соединении, остальные
+    процессы ждут в резерве. Лидер нумерует новые события подряд (seq) и отдаёт приёмнику всё,
+    что после его позиции (позицию знает приёмник, иначе берётся сохранённый курсор), так что
+    после сбоя доставка продолжается с того же места, а повторы потребитель отсекает по seq.
+    Доставленные события старше retention_hours удаляются.
+    """
+
+    def __init__(
+        self,
+        sink: Optional[EventSink] = None,
+        batch_size: int = settings.OUTBOX_BATCH_SIZE,
+        interval: float = settings.OUTBOX_INTERVAL,
+        retention_hours: float = settings.OUTBOX_RETENTION_HOURS,
+        engine=engine,
+    ):
+        self.sink = sink or make_sink(settings.OUTBOX_SINK)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retention = timedelta(hours=retention_hours)
+        self.engine = engine
+        self.stats = RelayStats()
+        self._purged_at = 0.0
+
+    async def relay_once(self, conn: AsyncConnection) -> int:
+        async with AsyncSession(bind=conn, expire_on_commit=False) as session:
+            repo = OutboxRepository(session)
+            position = await self.sink.position()
+            async with session.begin():
+                await repo.assign_sequence(self.batch_size)
+                if position is None:
+                    position = await repo.get_cursor(self.sink.name) or 0
+                events = await repo.list_events(position, self.batch_size)
+            if events and events[0].seq != position + 1:
+                # События после позиции приёмника уже удалены по сроку хранения
+                self.stats.gaps += 1
+                logger.error("Outbox gap for %s: position %d, next retained seq %d", self.sink.name, position, events[0].seq)
+            if events:
+                await self.sink.publish([event_message(event) for event in events])
+                position = events[-1].seq
+                self.stats.published += len(events)
+            self.stats.position = position
+            purge = time.monotonic() - self._purged_at > _PURGE_INTERVAL
+            if events or purge:
+                async with session.begin():
+                    await repo.save_cursor(self.sink.name, position)
+                    if purge:
+                        purged = await repo.purge(position, datetime.utcnow() - self.retention)
+                        self._purged_at = time.monotonic()
+                        if purged:
+                            logger.info("Outbox: purged %d delivered events", purged)
+        return len(events)
+
+    async def _lead(self, conn: AsyncConnection, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            if await self.relay_once(conn) >= self.batch_size:
+                # Бэклог: следующую пачку берём сразу
+                continue
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                async with self.engine.connect() as conn:
+                    # Блокировка уровня сессии: держится, пока живо соединение
+                    leader = (await conn.execute(text("SELECT pg_try_advisory_lock(hashtext('balance_outbox'))"))).scalar_one()
+                    await conn.commit()
+                    if leader:
+                        self.stats.leader = True
+                        logger.info("Outbox relay is the leader, publishing to %s", self.sink.name)
+                        await self._lead(conn, stop_event)
+            except Exception:
+                self.stats.errors += 1
+                logger.exception("Outbox relay error")
+            finally:
+                self.stats.leader = False
+                await self.sink.close()
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=_STANDBY_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _main(args) -> None:
+    relay = OutboxRelay(sink=make_sink(args.sink), batch_size=args.batch_size, interval=args.interval)
+    await relay.run(asyncio.Event())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Публикация событий outbox")
+    parser.add_argument("--sink", default=settings.OUTBOX_SINK, help="file:<путь> или unix:<путь сокета>")
+    parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+    parser.add_argument("--interval", type=float, default=settings.OUTBOX_INTERVAL)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,181 @@
+"""Приёмники потока событий outbox и чтение потока из файла.
+
+Сообщение — JSON-строка события (см. event_message). seq идут подряд без пропусков: потребитель
+хранит последний обработанный seq как курсор, повторы (seq <= курсора) пропускает, а скачок seq
+означает потерянные события (StreamGapError).
+"""
+import asyncio
+import json
+import os
+from typing import Iterator, List, Optional
+
+from app.models import OutboxEvent
+
+
+class StreamGapError(RuntimeError):
+    def __init__(self, expected: int, got: int):
+        super().__init__(f"Пропуск в потоке событий: ожидался seq {expected}, получен {got}")
+        self.expected = expected
+        self.got = got
+
+
+def event_message(event: OutboxEvent) -> dict:
+    return {
+        "seq": event.seq,
+        "id": event.id,
+        "type": event.type.value,
+        "user_id": event.user_id,
+        "amount": event.amount,
+        "transaction_id": event.transaction_id,
+        "service_id": event.service_id,
+        "external_tx_id": event.external_tx_id,
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+def encode(events: List[dict]) -> bytes:
+    return b"".join(json.dumps(event, ensure_ascii=False, separators=(",", ":")).encode() + b"\n" for event in events)
+
+
+class EventSink:
+    """Приёмник; position() — seq последнего события, которое у него уже есть (None — неизвестно)."""
+
+    name = ""
+
+    async def position(self) -> Optional[int]:
+        return None
+
+    async def publish(self, events: List[dict]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class FileSink(EventSink):
+    """Дописывает события в файл JSON lines (с fsync); позиция — seq последней строки файла."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = f"file:{path}"
+
+    async def position(self) -> Optional[int]:
+        return await asyncio.to_thread(self._recover)
+
+    def _recover(self) -> int:
+        # Недописанная при сбое строка обрезается, чтобы следующая запись начиналась с новой строки
+        try:
+            with open(self.path, "rb+") as file:
+                end = file.seek(0, os.SEEK_END)
+                position = end
+                while position > 0:
+                    step = min(4096, position)
+                    file.seek(position - step)
+                    newline = file.read(step).rfind(b"\n")
+                    if newline >= 0:
+                        position = position - step + newline + 1
+                        break
+                    position -= step
+                if position < end:
+                    file.truncate(position)
+        except FileNotFoundError:
+            pass
+        return last_seq(self.path)
+
+    async def publish(self, events: List[dict]) -> None:
+        await asyncio.to_thread(self._append, encode(events))
+
+    def _append(self, data: bytes) -> None:
+        with open(self.path, "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class UnixSocketSink(EventSink):
+    """Пишет события в Unix-сокет потребителя.
+
+    После подключения потребитель присылает строку со своим курсором (последний обработанный seq,
+    0 — с начала); релей продолжает с него, перечитывая события из outbox.
+    """
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.path = path
+        self.name = f"unix:{path}"
+        self.timeout = timeout
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._cursor: Optional[int] = None
+
+    async def position(self) -> Optional[int]:
+        if self._writer is None:
+            reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), self.timeout)
+            try:
+                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                self._cursor = int(line)
+            except (ValueError, asyncio.TimeoutError):
+                writer.close()
+                raise
+            self._writer = writer
+        return self._cursor
+
+    async def publish(self, events: List[dict]) -> None:
+        if self._writer is None:
+            await self.position()
+        try:
+            self._writer.write(encode(events))
+            await asyncio.wait_for(self._writer.drain(), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            # Переподключимся и продолжим с курсора, который пришлёт потребитель
+            await self.close()
+            raise
+        self._cursor = events[-1]["seq"]
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def make_sink(spec: str) -> EventSink:
+    kind, _, path = spec.partition(":")
+    if kind == "file" and path:
+        return FileSink(path)
+    if kind == "unix" and path:
+        return UnixSocketSink(path)
+    raise ValueError(f"Неизвестный приёмник событий: {spec}")
+
+
+def last_seq(path: str) -> int:
+    # seq последней целой строки файла; недописанный после сбоя хвост не считается
+    try:
+        with open(path, "rb") as file:
+            position = file.seek(0, os.SEEK_END)
+            tail = b""
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                file.seek(position)
+                tail = file.read(step) + tail
+                lines = tail[:tail.rfind(b"\n") + 1].split(b"\n")
+                # Последняя строка целая, если перед ней есть перевод строки или это начало файла
+                if len(lines) > 2 or (position == 0 and len(lines) == 2):
+                    return json.loads(lines[-2])["seq"]
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def read_events(path: str, after_seq: int = 0) -> Iterator[dict]:
+    """События файла с seq > after_seq по порядку; повторы пропускаются, на пропуске — StreamGapError."""
+    expected = after_seq + 1
+    with open(path, "rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            event = json.loads(line)
+            if event["seq"] < expected:
+                continue
+            if event["seq"] > expected:
+                raise StreamGapError(expected, event["seq"])
+            yield event
+            expected += 1
@@ -0,0 +1,161 @@
+"""Исправление locked_total всех пользователей (repair-all).
+
+    python -m app.services.repair [--dry-run] [--workers 4] [--chunk-size 1000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import settings
+from app.db import engine
+from app.repositories import BalanceRepository
+from app.services.balance_events import mark_balances_changed
+from app.services.balance_service import BalanceService
+
+logger = logging.getLogger(__name__)
+
+_BUSY_RETRIES = 3
+_BUSY_PAUSE = 1.0
+
+
+@dataclass
+class RepairDiff:
+    user_id: str
+    locked_total: int
+    actual_locked: int
+    current: int
+    new_current: int
+    # drift — найдено (dry-run), fixed — исправлено, busy — строка была занята весь проход
+    status: str
+
+
+@dataclass
+class RepairReport:
+    drifted: int = 0
+    fixed: int = 0
+    busy: int = 0
+    seconds: float = 0.0
+
+
+class BalanceRepairJob:
+    """То же, что POST /balance/{user_id}/repair, для всех пользователей сразу.
+
+    Расхождения locked_total с суммой открытых транзакций находит один сгруппированный запрос,
+    читаемый серверным курсором; пачки по chunk_size исправляют workers соединений одним UPDATE
+    на пачку. Строки берутся с SKIP LOCKED: занятые живым трафиком пользователи повторяются
+    в конце прохода, а не ждут. Полосатые аккаунты исправляются по одному, как в repair.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.REPAIR_WORKERS,
+        chunk_size: int = settings.REPAIR_CHUNK_SIZE,
+        dry_run: bool = False,
+        engine=engine,
+    ):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.engine = engine
+
+    async def run(self, on_diff: Optional[Callable[[RepairDiff], Awaitable[None]]] = None) -> RepairReport:
+        report = RepairReport()
+        started = time.perf_counter()
+
+        async def emit(diff: RepairDiff) -> None:
+            if on_diff is not None:
+                await on_diff(diff)
+
+        busy: List = []
+        queue = asyncio.Queue(maxsize=self.workers * 2)
+        tasks = [asyncio.create_task(self._produce(queue, report, emit))]
+        tasks += [asyncio.create_task(self._work(queue, report, emit, busy)) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*tasks)
+            for _ in range(_BUSY_RETRIES):
+                if not busy:
+                    break
+                await asyncio.sleep(_BUSY_PAUSE)
+                retry, busy[:] = busy[:], []
+                for start in range(0, len(retry), self.chunk_size):
+                    await queue.put(retry[start:start + self.chunk_size])
+                for _ in range(self.workers):
+                    await queue.put(None)
+                await asyncio.gather(*(self._work(queue, report, emit, busy) for _ in range(self.workers)))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        for row in busy:
+            report.busy += 1
+            await emit(RepairDiff(row.user_id, row.locked_total, row.actual_locked, row.current, row.current, "busy"))
+        report.seconds = round(time.perf_counter() - started, 3)
+        return report
+
+    async def _produce(self, queue: asyncio.Queue, report: RepairReport, emit) -> None:
+        async with AsyncSession(self.engine) as session:
+            async for rows in BalanceRepository(session).stream_locked_drift(self.chunk_size):
+                report.drifted += len(rows)
+                if self.dry_run:
+                    for row in rows:
+                        new_current = max(0, min(row.current, row.maximum - row.actual_locked))
+                        await emit(RepairDiff(row.user_id, row.locked_total, row.actual_locked, row.current, new_current, "drift"))
+                    continue
+                await queue.put(rows)
+        for _ in range(self.workers):
+            await queue.put(None)
+
+    async def _work(self, queue: asyncio.Queue, report: RepairReport, emit, busy: List) -> None:
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            repo = BalanceRepository(session)
+            while (drifted := await queue.get()) is not None:
+                async with session.begin():
+                    locked = await repo.try_lock_balances([row.user_id for row in drifted if not row.stripes])
+                    rows = await repo.repair_locked_totals(locked) if locked else []
+                    mark_balances_changed(session, [row.user_id for row in rows])
+                taken = set(locked)
+                busy.extend(row for row in drifted if not row.stripes and row.user_id not in taken)
+                report.fixed += len(rows)
+                for row in rows:
+                    await emit(RepairDiff(row.user_id, row.locked_total, row.actual_locked, row.current, row.new_current, "fixed"))
+                for row in drifted:
+                    if row.stripes:
+                        await self._repair_striped(session, row, report, emit)
+
+    async def _repair_striped(self, session: AsyncSession, row, report: RepairReport, emit) -> None:
+        async with session.begin():
+            balance = await BalanceService(session).repair_user_balance(row.user_id)
+        report.fixed += 1
+        await emit(RepairDiff(row.user_id, row.locked_total, balance.locked_total, row.current, balance.current, "fixed"))
+
+
+async def _print_diff(diff: RepairDiff) -> None:
+    print(json.dumps(asdict(diff), ensure_ascii=False), flush=True)
+
+
+async def _main(args) -> int:
+    job = BalanceRepairJob(workers=args.workers, chunk_size=args.chunk_size, dry_run=args.dry_run)
+    try:
+        report = await job.run(_print_diff)
+    finally:
+        await engine.dispose()
+    logger.info("repair-all: %s", report)
+    if args.dry_run:
+        return 1 if report.drifted else 0
+    return 1 if report.busy else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Исправление locked_total всех пользователей")
+    parser.add_argument("--dry-run", action="store_true", help="только отчёт о расхождениях; код 1, если они есть")
+    parser.add_argument("--workers", type=int, default=settings.REPAIR_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=settings.REPAIR_CHUNK_SIZE)
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(parser.parse_args())))
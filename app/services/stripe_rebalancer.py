@@ -0,0 +1,49 @@
+import asyncio
+import logging
+
+from app.core import settings
+from app.db import AsyncSessionLocal
+from app.repositories import BalanceRepository
+from app.services.balance_service import BalanceService
+from app.services.striped_balance import striped_users
+
+logger = logging.getLogger(__name__)
+
+
+class StripeRebalancer:
+    """Периодически выравнивает средства и лимит между полосами полосатых аккаунтов.
+
+    Берёт только полосы, которые сейчас никто не держит (SKIP LOCKED), поэтому не ждёт живой трафик;
+    несколько процессов могут работать одновременно. Заодно обновляет список известных
+    полосатых аккаунтов процесса.
+    """
+
+    def __init__(self, interval: float = settings.STRIPE_REBALANCE_INTERVAL, session_factory=AsyncSessionLocal):
+        self.interval = interval
+        self.session_factory = session_factory
+
+    async def rebalance_once(self) -> int:
+        async with self.session_factory() as session:
+            user_ids = await BalanceRepository(session).list_striped_user_ids()
+        striped_users.clear()
+        striped_users.update(user_ids)
+        rebalanced = 0
+        for user_id in user_ids:
+            async with self.session_factory() as session:
+                async with session.begin():
+                    if await BalanceService(session).rebalance_stripes(user_id):
+                        rebalanced += 1
+        return rebalanced
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                rebalanced = await self.rebalance_once()
+                if rebalanced:
+                    logger.info("stripe rebalancer: rebalanced %s accounts", rebalanced)
+            except Exception:
+                logger.exception("Stripe rebalancer error")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
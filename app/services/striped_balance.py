@@ -0,0 +1,230 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.errors import InsufficientFundsError, NotFoundError, TransactionClosedError
+from app.models import UserBalance, UserBalanceStripe, BalanceTransaction, TransactionStatus
+from app.repositories import BalanceRepository
+
+# Аккаунты, которые этот процесс уже видел полосатыми: для них открытие и закрытие транзакций
+# сразу идут по полосам, без блокировки строки user_balances. Это только подсказка —
+# обычный путь, заблокировав строку и увидев stripes > 0, тоже уходит на полосы.
+striped_users: set = set()
+
+
+def split_evenly(total: int, parts: int) -> List[int]:
+    base, extra = divmod(total, parts)
+    return [base + (1 if index < extra else 0) for index in range(parts)]
+
+
+def redistribute(stripes: List[UserBalanceStripe], current: int, maximum: int) -> None:
+    """Раскладывает current и maximum по полосам, не трогая их locked_total.
+
+    Свободные средства (current - locked_total) и свободный лимит (maximum - current - locked_total)
+    делятся поровну, так что каждая полоса удовлетворяет инвариантам user_balances.
+    """
+    locked = [stripe.locked_total for stripe in stripes]
+    total_locked = sum(locked)
+    if current >= total_locked:
+        currents = [amount + free for amount, free in zip(locked, split_evenly(current - total_locked, len(stripes)))]
+    else:
+        currents = split_evenly(current, len(stripes))
+    spare = split_evenly(maximum - current - total_locked, len(stripes))
+    for stripe, stripe_current, stripe_locked, stripe_spare in zip(stripes, currents, locked, spare):
+        stripe.current = stripe_current
+        stripe.maximum = stripe_current + stripe_locked + stripe_spare
+
+
+def concentrate(stripes: List[UserBalanceStripe], target: UserBalanceStripe, amount: int) -> bool:
+    """Переносит в target свободные средства и лимит других полос, пока на target не хватит amount."""
+    need_available = amount - (target.current - target.locked_total)
+    need_spare = amount - (target.maximum - target.current - target.locked_total)
+    for stripe in stripes:
+        if stripe is target:
+            continue
+        if need_available > 0:
+            # Средства переезжают вместе с равной частью максимума: запас лимита обеих полос не меняется
+            moved = min(need_available, max(0, stripe.current - stripe.locked_total))
+            stripe.current -= moved
+            stripe.maximum -= moved
+            target.current += moved
+            target.maximum += moved
+            need_available -= moved
+        if need_spare > 0:
+            moved = min(need_spare, stripe.maximum - stripe.current - stripe.locked_total)
+            stripe.maximum -= moved
+            target.maximum += moved
+            need_spare -= moved
+    return need_available <= 0 and need_spare <= 0
+
+
+def needs_rebalance(stripes: List[UserBalanceStripe]) -> bool:
+    # Перекладываем, только если какая-то полоса заметно беднее средней по средствам или лимиту
+    available = [stripe.current - stripe.locked_total for stripe in stripes]
+    spare = [stripe.maximum - stripe.current - stripe.locked_total for stripe in stripes]
+    return any(min(values) * 2 < sum(values) / len(values) for values in (available, spare))
+
+
+def aggregate(user_id: str, stripes: List[UserBalanceStripe]) -> UserBalance:
+    return UserBalance(
+        user_id=user_id,
+        current=sum(stripe.current for stripe in stripes),
+        maximum=sum(stripe.maximum for stripe in stripes),
+        locked_total=sum(stripe.locked_total for stripe in stripes),
+        stripes=len(stripes),
+    )
+
+
+class StripedBalances:
+    """Операции полосатых аккаунтов: баланс разбит на полосы user_balance_stripes.
+
+    Транзакция блокирует средства на любой полосе, где их хватает (занятые полосы пропускаются),
+    и закрывается на той же полосе; если такой полосы нет, берутся все полосы и средства
+    собираются на одной. Изменения лимита и текущего баланса берут все полосы
+    по порядку номеров и заново раскладывают сумму. Порядок блокировок: строка user_balances
+    (если нужна), полосы по возрастанию номера, затем транзакции.
+    """
+
+    def __init__(self, session: AsyncSession, repo: BalanceRepository):
+        self.session = session
+        self.repo = repo
+
+    async def open_transaction(self, user_id: str, service_id: str, external_tx_id: str, amount: int, expires_at: datetime) -> Optional[BalanceTransaction]:
+        """None — у пользователя нет полос."""
+        stripe = await self.repo.pick_stripe(user_id, amount)
+        if stripe is None:
+            # Свободной полосы с запасом нет: ждём все полосы и при необходимости перекладываем средства
+            stripes = await self.repo.lock_stripes(user_id)
+            if not stripes:
+                striped_users.discard(user_id)
+                return None
+            stripe = self._with_capacity(stripes, amount)
+            if stripe is None:
+                stripe = max(stripes, key=lambda s: min(s.current - s.locked_total, s.maximum - s.current - s.locked_total))
+                if not concentrate(stripes, stripe, amount):
+                    total = aggregate(user_id, stripes)
+                    available = total.current - total.locked_total
+                    raise InsufficientFundsError(f"Недостаточно средств. Доступно: {available}, требуется: {amount}")
+
+        # Повтор той же транзакции (в том числе параллельный, на другой полосе) упирается в уникальный индекс
+        transaction = await self.repo.create_transaction_if_absent(user_id, service_id, external_tx_id, amount, expires_at, stripe.stripe)
+        if transaction is None:
+            transaction = await self.repo.get_transaction(user_id, service_id, external_tx_id)
+            if transaction.status == TransactionStatus.LOCKED:
+                return transaction
+            raise TransactionClosedError("Транзакция уже завершена")
+        await self.repo.increment_locked_total(stripe, amount)
+        return transaction
+
+    @staticmethod
+    def _with_capacity(stripes: List[UserBalanceStripe], amount: int) -> Optional[UserBalanceStripe]:
+        for stripe in stripes:
+            if stripe.current - stripe.locked_total >= amount and stripe.current + stripe.locked_total + amount <= stripe.maximum:
+                return stripe
+        return None
+
+    async def close_transaction(self, user_id: str, service_id: str, external_tx_id: str, status: TransactionStatus) -> Optional[BalanceTransaction]:
+        """None — транзакция не привязана к полосе (её закрывает обычный путь)."""
+        transaction = await self.repo.get_transaction(user_id, service_id, external_tx_id)
+        if not transaction:
+            raise NotFoundError("Транзакция не найдена")
+        if transaction.status != TransactionStatus.LOCKED:
+            return transaction
+        if transaction.stripe is None:
+            return None
+
+        stripe = await self.repo.lock_stripe(user_id, transaction.stripe)
+        if stripe is None:
+            return None
+        # Перечитываем под блокировкой полосы: транзакцию могли закрыть параллельно
+        await self.session.refresh(transaction)
+        if transaction.status != TransactionStatus.LOCKED:
+            return transaction
+        if transaction.stripe != stripe.stripe:
+            return None
+
+        if status == TransactionStatus.CONFIRMED:
+            if transaction.expires_at < datetime.utcnow():
+                await self.repo.decrement_locked_total(stripe, transaction.amount)
+                await self.repo.mark_transaction_canceled(transaction)
+                raise TransactionClosedError("Транзакция истекла")
+            stripe.current -= transaction.amount
+            await self.repo.decrement_locked_total(stripe, transaction.amount)
+            await self.repo.mark_transaction_confirmed(transaction)
+        else:
+            await self.repo.decrement_locked_total(stripe, transaction.amount)
+            await self.repo.mark_transaction_canceled(transaction)
+        return transaction
+
+    async def adjust_limits(self, balance: UserBalance, delta: int) -> UserBalance:
+        return await self._adjust(balance, self.repo.apply_limits_delta, delta)
+
+    async def adjust_current(self, balance: UserBalance, delta: int) -> UserBalance:
+        return await self._adjust(balance, self.repo.apply_current_delta, delta)
+
+    async def _adjust(self, balance: UserBalance, apply_delta, delta: int) -> UserBalance:
+        # Проверки те же, что у обычного баланса, но по сумме полос
+        stripes = await self.repo.lock_stripes(balance.user_id)
+        total = aggregate(balance.user_id, stripes)
+        await apply_delta(total, delta)
+        redistribute(stripes, total.current, total.maximum)
+        return total
+
+    async def repair(self, balance: UserBalance) -> Tuple[UserBalance, UserBalance]:
+        """Возвращает суммы полос до и после исправления."""
+        stripes = await self.repo.lock_stripes(balance.user_id)
+        before = aggregate(balance.user_id, stripes)
+        locked = await self.repo.sum_locked_transactions_by_stripe(balance.user_id)
+        if None in locked:
+            # Открытые транзакции без полосы (не должно быть) переносим на полосу 0
+            await self.repo.assign_stripes(balance.user_id, 1)
+            locked = await self.repo.sum_locked_transactions_by_stripe(balance.user_id)
+        for stripe in stripes:
+            stripe.locked_total = locked.get(stripe.stripe, 0)
+            max_allowed = max(0, stripe.maximum - stripe.locked_total)
+            if stripe.current > max_allowed:
+                stripe.current = max_allowed
+            if stripe.current < 0:
+                stripe.current = 0
+        return before, aggregate(balance.user_id, stripes)
+
+    async def set_stripes(self, balance: UserBalance, count: int) -> UserBalance:
+        """Разбивает баланс на count полос (0 — обратно в одну строку). Строка balance должна быть заблокирована."""
+        stripes = await self.repo.lock_stripes(balance.user_id)
+        if stripes:
+            total = aggregate(balance.user_id, stripes)
+            balance.current += total.current
+            balance.maximum += total.maximum
+            balance.locked_total += total.locked_total
+            for stripe in stripes:
+                await self.session.delete(stripe)
+            await self.repo.unassign_stripes(balance.user_id)
+            await self.session.flush()
+        balance.stripes = count
+        if count == 0:
+            striped_users.discard(balance.user_id)
+            return balance
+
+        locked = await self.repo.assign_stripes(balance.user_id, count)
+        stripes = [
+            UserBalanceStripe(user_id=balance.user_id, stripe=index, current=0, maximum=0, locked_total=locked.get(index, 0))
+            for index in range(count)
+        ]
+        redistribute(stripes, balance.current, balance.maximum)
+        total = aggregate(balance.user_id, stripes)
+        balance.current = balance.maximum = balance.locked_total = 0
+        self.session.add_all(stripes)
+        await self.session.flush()
+        striped_users.add(balance.user_id)
+        return total
+
+    async def rebalance(self, user_id: str) -> bool:
+        """Выравнивает полосы, которые сейчас никто не держит. True — что-то переложили."""
+        stripes = await self.repo.try_lock_stripes(user_id)
+        if len(stripes) < 2 or not needs_rebalance(stripes):
+            return False
+        before = [(stripe.current, stripe.maximum) for stripe in stripes]
+        total = aggregate(user_id, stripes)
+        redistribute(stripes, total.current, total.maximum)
+        return before != [(stripe.current, stripe.maximum) for stripe in stripes]
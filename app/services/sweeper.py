@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable, Optional
+
+from app.core import metrics, settings
+from app.db import AsyncSessionLocal
+from app.repositories import BalanceRepository
+from app.services.balance_service import BalanceService
+
+logger = logging.getLogger(__name__)
+
+# Бэклог для метрики считается до этого предела
+_BACKLOG_LIMIT = 10_000
+
+
+@dataclass
+class SweepBatch:
+    shard: int
+    canceled: int
+    users: int
+    amount: int
+    duration: float
+
+
+@dataclass
+class SweeperStats:
+    batches: int = 0
+    canceled: int = 0
+    errors: int = 0
+    last_batch: Optional[SweepBatch] = None
+    # Шарды, у которых последняя пачка была полной, т.е. есть бэклог
+    backlog_shards: set = field(default_factory=set)
+
+
+class ExpirySweeper:
+    """Отмена истёкших транзакций пачками, по шардам hashtext(user_id) % shard_count.
+
+    Несколько процессов могут обслуживать одни и те же шарды: балансы берутся с SKIP LOCKED,
+    поэтому одну и ту же транзакцию дважды не отменят. Пока пачки приходят полными, свипер
+    не спит, а сразу берёт следующую.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.SWEEPER_BATCH_SIZE,
+        interval: float = settings.SWEEPER_INTERVAL,
+        shard_count: int = settings.SWEEPER_SHARD_COUNT,
+        shards: Optional[Iterable[int]] = None,
+        session_factory=AsyncSessionLocal,
+    ):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.shard_count = max(1, shard_count)
+        self.shards = sorted(set(shards or settings.SWEEPER_SHARDS or range(self.shard_count)))
+        self.session_factory = session_factory
+        self.stats = SweeperStats()
+
+    async def sweep_once(self, shard: int = 0) -> SweepBatch:
+        started = time.perf_counter()
+        async with self.session_factory() as session:
+            async with session.begin():
+                service = BalanceService(session)
+                rows = await service.cancel_expired_transactions(self.batch_size, shard, self.shard_count)
+        batch = SweepBatch(
+            shard=shard,
+            canceled=sum(row.canceled for row in rows),
+            users=len(rows),
+            amount=sum(int(row.amount) for row in rows),
+            duration=time.perf_counter() - started,
+        )
+        self._record(batch)
+        if settings.METRICS_ENABLED:
+            backlog = await self._backlog(shard) if batch.canceled >= self.batch_size else 0
+            metrics.SWEEP_BACKLOG.labels(str(shard)).set(backlog)
+        return batch
+
+    async def _backlog(self, shard: int) -> int:
+        async with self.session_factory() as session:
+            repo = BalanceRepository(session)
+            return await repo.count_expired_locked_transactions(datetime.utcnow(), _BACKLOG_LIMIT, shard, self.shard_count)
+
+    def _record(self, batch: SweepBatch) -> None:
+        self.stats.batches += 1
+        self.stats.canceled += batch.canceled
+        self.stats.last_batch = batch
+        metrics.SWEEP_CANCELED.observe(batch.canceled)
+        metrics.SWEEP_SECONDS.observe(batch.duration)
+        if batch.canceled >= self.batch_size:
+            self.stats.backlog_shards.add(batch.shard)
+        else:
+            self.stats.backlog_shards.discard(batch.shard)
+        if batch.canceled:
+            logger.info(
+                "sweeper shard=%s canceled=%s users=%s amount=%s duration=%.3fs",
+                batch.shard, batch.canceled, batch.users, batch.amount, batch.duration,
+            )
+
+    async def run_shard(self, shard: int, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            try:
+                batch = await self.sweep_once(shard)
+                if batch.canceled >= self.batch_size:
+                    # Бэклог: следующую пачку берём сразу
+                    continue
+            except Exception:
+                self.stats.errors += 1
+                logger.exception("Sweeper error (shard %s)", shard)
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        await asyncio.gather(*(self.run_shard(shard, stop_event) for shard in self.shards))
+
+
+async def _main(args) -> None:
+    sweeper = ExpirySweeper(batch_size=args.batch_size, interval=args.interval, shard_count=args.shard_count, shards=args.shards)
+    await sweeper.run(asyncio.Event())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отмена истёкших транзакций")
+    parser.add_argument("--batch-size", type=int, default=settings.SWEEPER_BATCH_SIZE)
+    parser.add_argument("--interval", type=float, default=settings.SWEEPER_INTERVAL)
+    parser.add_argument("--shard-count", type=int, default=settings.SWEEPER_SHARD_COUNT)
+    parser.add_argument("--shards", type=int, nargs="*", default=None)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,266 @@
+"""Супервизор: REST- и gRPC-воркеры и процесс фоновых задач одной группой процессов.
+
+python -m app.supervisor --rest-workers 16 --grpc-workers 8
+
+Родитель один раз сверяет схему и прогревает общий код (импорт, компиляция запросов горячего пути),
+затем форкает детей: REST-воркеры принимают соединения с общего сокета, gRPC-воркеры слушают один порт
+через SO_REUSEPORT, фоновые задачи (свипер, архиватор, релей outbox, выравнивание полос) идут в одном
+процессе jobs. Упавший ребёнок перезапускается; SIGTERM/SIGINT останавливают всех, SIGUSR1 пересылается
+детям (переключение таймеров этапов).
+"""
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from app.core import settings
+
+logger = logging.getLogger(__name__)
+
+# Ребёнок, проживший меньше, считается упавшим при старте: перезапуск с растущей паузой
+_MIN_UPTIME = 5.0
+_MAX_RESTART_DELAY = 30.0
+_STOP_TIMEOUT = 15.0
+_WARM_UP_USER = "__warm_up__"
+
+
+@dataclass
+class Worker:
+    name: str
+    target: Callable[[], None]
+    pid: Optional[int] = None
+    started_at: float = 0.0
+    failures: int = 0
+    restart_at: Optional[float] = None
+
+
+class Supervisor:
+    def __init__(self, workers: List[Worker], stop_timeout: float = _STOP_TIMEOUT):
+        self.workers = workers
+        self.stop_timeout = stop_timeout
+        self._stop_deadline: Optional[float] = None
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGUSR1, self._on_forward)
+        for worker in self.workers:
+            self._spawn(worker)
+        while True:
+            self._reap()
+            alive = [worker for worker in self.workers if worker.pid is not None]
+            if self._stop_deadline is not None:
+                if not alive:
+                    return 0
+                if time.monotonic() > self._stop_deadline:
+                    logger.warning("supervisor: killing %s", ", ".join(worker.name for worker in alive))
+                    self._signal(signal.SIGKILL)
+            else:
+                now = time.monotonic()
+                for worker in self.workers:
+                    if worker.pid is None and worker.restart_at is not None and worker.restart_at <= now:
+                        self._spawn(worker)
+            time.sleep(0.1)
+
+    def _spawn(self, worker: Worker) -> None:
+        pid = os.fork()
+        if pid == 0:
+            _run_child(worker)
+        worker.pid = pid
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        logger.info("supervisor: started %s (pid %s)", worker.name, pid)
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = next((worker for worker in self.workers if worker.pid == pid), None)
+            if worker is None:
+                continue
+            worker.pid = None
+            _mark_metrics_dead(pid)
+            if self._stop_deadline is not None:
+                continue
+            uptime = time.monotonic() - worker.started_at
+            worker.failures = worker.failures + 1 if uptime < _MIN_UPTIME else 0
+            delay = min(_MAX_RESTART_DELAY, 0.5 * 2 ** worker.failures) if worker.failures else 0.0
+            worker.restart_at = time.monotonic() + delay
+            logger.error(
+                "supervisor: %s (pid %s) exited with %s after %.1fs, restarting in %.1fs",
+                worker.name, pid, os.waitstatus_to_exitcode(status), uptime, delay,
+            )
+
+    def _signal(self, signum: int) -> None:
+        for worker in self.workers:
+            if worker.pid is not None:
+                try:
+                    os.kill(worker.pid, signum)
+                except ProcessLookupError:
+                    pass
+
+    def _on_stop(self, signum, frame) -> None:
+        if self._stop_deadline is None:
+            logger.info("supervisor: stopping")
+            self._stop_deadline = time.monotonic() + self.stop_timeout
+        self._signal(signal.SIGTERM)
+
+    def _on_forward(self, signum, frame) -> None:
+        self._signal(signum)
+
+
+def _run_child(worker: Worker) -> None:
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    # Действие SIGUSR1 по умолчанию — завершение: пересланный супервизором сигнал не должен убить
+    # ребёнка, пока цикл событий не поставил свой обработчик (install_toggle_signal)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    code = 0
+    try:
+        worker.target()
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        logger.exception("supervisor: %s failed", worker.name)
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def _mark_metrics_dead(pid: int) -> None:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
+
+
+def _prepare_metrics_dir() -> None:
+    # До первого импорта prometheus_client: метрики всех детей собираются через общий каталог
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path is None:
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="balance-metrics-")
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
+
+def _split_connection_budget(children: int) -> None:
+    # До создания движков (импорт app.db): пул каждого ребёнка — равная доля бюджета, без overflow
+    if not settings.DB_CONNECTION_BUDGET:
+        return
+    per_child = settings.DB_CONNECTION_BUDGET // children
+    if per_child < 1:
+        raise SystemExit(f"DB_CONNECTION_BUDGET={settings.DB_CONNECTION_BUDGET} меньше числа процессов ({children})")
+    settings.DB_POOL_SIZE = per_child
+    settings.DB_MAX_OVERFLOW = 0
+    logger.info("supervisor: %d pooled connections per process", per_child)
+
+
+async def _warm_up() -> None:
+    from app.db import AsyncReadSessionLocal, engine, replica_router
+    from app.db.migrations import check_schema
+    from app.services.balance_service import BalanceService
+
+    await check_schema(engine)
+    # Компиляция запросов остаётся в кэше SQLAlchemy и достаётся детям при fork
+    async with AsyncReadSessionLocal() as session:
+        await BalanceService(session).read_balance(_WARM_UP_USER)
+    # Соединения родителя детям не передаются
+    await engine.dispose()
+    for replica in replica_router.replicas:
+        await replica.engine.dispose()
+
+
+def _rest_target(sock: socket.socket) -> Callable[[], None]:
+    def run() -> None:
+        import uvicorn
+        from app.main import app
+        server = uvicorn.Server(uvicorn.Config(app, lifespan="on"))
+        asyncio.run(server.serve(sockets=[sock]))
+    return run
+
+
+def _grpc_target(bind_addr: str, metrics_port: Optional[int]) -> Callable[[], None]:
+    def run() -> None:
+        from app.grpc.server import serve
+        asyncio.run(serve(bind_addr, metrics_port))
+    return run
+
+
+def _jobs_target() -> None:
+    asyncio.run(_run_jobs())
+
+
+async def _run_jobs() -> None:
+    from app.core import metrics
+    from app.services.jobs import start_background_jobs
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop_event.set)
+    metrics.install_toggle_signal(loop)
+    tasks = start_background_jobs(stop_event)
+    await stop_event.wait()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _listen(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(args) -> int:
+    if args.rest_workers + args.grpc_workers == 0:
+        raise SystemExit("Нужен хотя бы один REST- или gRPC-воркер")
+    _split_connection_budget(args.rest_workers + args.grpc_workers + 1)
+    if settings.METRICS_ENABLED:
+        _prepare_metrics_dir()
+    # Фоновые задачи — только в процессе jobs
+    settings.BACKGROUND_JOBS_ENABLED = False
+    # Общий прогрев: модули импортируются и схема сверяется один раз, до fork
+    import app.main  # noqa: F401
+    import app.grpc.server  # noqa: F401
+    asyncio.run(_warm_up())
+
+    workers = [Worker("jobs", _jobs_target)]
+    if args.rest_workers:
+        sock = _listen(args.host, args.port)
+        workers += [Worker(f"rest-{i}", _rest_target(sock)) for i in range(args.rest_workers)]
+    # Без REST метрики отдаёт первый gRPC-воркер (общие для всех процессов)
+    workers += [
+        Worker(f"grpc-{i}", _grpc_target(args.grpc_bind, settings.METRICS_GRPC_PORT if i == 0 and not args.rest_workers else None))
+        for i in range(args.grpc_workers)
+    ]
+    return Supervisor(workers, args.stop_timeout).run()
+
+
+if __name__ == "__main__":
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="REST- и gRPC-воркеры под супервизором")
+    parser.add_argument("--rest-workers", type=int, default=settings.SUPERVISOR_REST_WORKERS or cores, help="0 — без REST")
+    parser.add_argument("--grpc-workers", type=int, default=settings.SUPERVISOR_GRPC_WORKERS or cores, help="0 — без gRPC")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--grpc-bind", default="0.0.0.0:50051")
+    parser.add_argument("--stop-timeout", type=float, default=_STOP_TIMEOUT)
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""Скорость массовой загрузки балансов (app.services.bulk) против пары /limits + /current на пользователя.
+
+Загружает --users новых пользователей из сгенерированного CSV, повторяет ту же загрузку (ничего
+не меняется) и загрузку с новыми значениями (все строки обновляются), выгружает user_balances.
+Для сравнения --baseline-users пользователей заводятся по-старому: adjust_limits и adjust_current,
+две транзакции на пользователя.
+
+    python -m bench.bulk_import --users 10000000 --ledger
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import asyncpg
+
+from app.core import settings
+from app.db import AsyncSessionLocal, engine
+from app.services.balance_service import BalanceService
+from app.services.bulk import BalanceImportJob, export_table
+from bench import db
+from bench.run import ROOT, git_commit
+
+_LINES_PER_CHUNK = 20_000
+
+
+async def generate(users: int, shift: int):
+    yield b"user_id,current,maximum\n"
+    for start in range(0, users, _LINES_PER_CHUNK):
+        yield "".join(
+            f"{db.USER_PREFIX}{i},{i % 1000 + shift},{1000 + shift}\n" for i in range(start, min(start + _LINES_PER_CHUNK, users))
+        ).encode()
+
+
+async def load(args, shift: int) -> dict:
+    report = await BalanceImportJob(chunk_size=args.chunk_size).run(generate(args.users, shift))
+    return {**vars(report), "rows_per_second": round(report.rows / report.seconds)}
+
+
+async def export() -> dict:
+    size = 0
+
+    async def count(chunk: bytes) -> None:
+        nonlocal size
+        size += len(chunk)
+
+    started = time.perf_counter()
+    await export_table("user_balances", count)
+    seconds = time.perf_counter() - started
+    return {"seconds": round(seconds, 3), "bytes": size}
+
+
+async def baseline(users: int) -> dict:
+    started = time.perf_counter()
+    for i in range(users):
+        user_id = f"baseline-{i}"
+        for adjust, delta in ((BalanceService.adjust_limits, 1000), (BalanceService.adjust_current, i % 1000)):
+            async with AsyncSessionLocal() as session:
+                await adjust(BalanceService(session), user_id, delta)
+                await session.commit()
+    seconds = time.perf_counter() - started
+    return {"users": users, "seconds": round(seconds, 3), "rows_per_second": round(users / seconds)}
+
+
+async def main(args) -> dict:
+    settings.LEDGER_ENABLED = args.ledger
+    settings.OUTBOX_ENABLED = args.outbox
+    await db.prepare_schema()
+    conn = await asyncpg.connect(settings.dsn)
+    try:
+        await db.reset(conn)
+        result = {"baseline": await baseline(args.baseline_users) if args.baseline_users else None}
+        result["load"] = await load(args, 0)
+        result["reload"] = await load(args, 0)
+        result["update"] = await load(args, 1)
+        result["export"] = await export()
+        result["table_bytes"] = await conn.fetchval("SELECT pg_total_relation_size('user_balances')")
+        await db.reset(conn)
+    finally:
+        await conn.close()
+        await engine.dispose()
+    return {
+        "workload": "bulk_import",
+        "started_at": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **result,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Скорость массовой загрузки балансов")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=settings.IMPORT_CHUNK_SIZE)
+    parser.add_argument("--baseline-users", type=int, default=2000, help="0 — без сравнения с /limits + /current")
+    parser.add_argument("--ledger", action="store_true", help="с записями журнала (LEDGER_ENABLED)")
+    parser.add_argument("--outbox", action="store_true", help="с событиями outbox (OUTBOX_ENABLED)")
+    parser.add_argument("--output", type=Path, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(main(args))
+    output = args.output or ROOT / "bench" / "results" / f"bulk_import-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    if result["baseline"]:
+        print(f"baseline: {result['baseline']['rows_per_second']} users/s")
+    for phase in ("load", "reload", "update"):
+        stats = result[phase]
+        print(f"{phase}: {stats['rows']} rows in {stats['seconds']}s, {stats['rows_per_second']} rows/s")
+    print(f"export: {result['export']['bytes']} bytes in {result['export']['seconds']}s")
+    print(f"-> {output}")
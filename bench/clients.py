@@ -0,0 +1,68 @@
+import grpc
+import httpx
+
+from app.grpc import balance_pb2, balance_pb2_grpc
+
+
+class RequestFailed(Exception):
+    pass
+
+
+class RestClient:
+    def __init__(self, base_url: str, concurrency: int):
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self.http = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0)
+
+    async def _call(self, method: str, path: str, json: dict | None = None) -> dict:
+        response = await self.http.request(method, path, json=json)
+        if response.status_code >= 400:
+            raise RequestFailed(f"{response.status_code}: {response.text}")
+        return response.json()
+
+    async def get_balance(self, user_id: str) -> None:
+        await self._call("GET", f"/balance/{user_id}")
+
+    async def adjust_current(self, user_id: str, delta: int) -> None:
+        await self._call("POST", f"/balance/{user_id}/current", {"delta": delta})
+
+    async def open_transaction(self, user_id: str, service_id: str, external_tx_id: str, amount: int, timeout_seconds: int) -> None:
+        await self._call("POST", f"/balance/{user_id}/transactions", {"service_id": service_id, "external_tx_id": external_tx_id, "amount": amount, "timeout_seconds": timeout_seconds})
+
+    async def confirm_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> None:
+        await self._call("POST", f"/balance/{user_id}/transactions/{external_tx_id}/confirm", {"service_id": service_id})
+
+    async def cancel_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> None:
+        await self._call("POST", f"/balance/{user_id}/transactions/{external_tx_id}/cancel", {"service_id": service_id})
+
+    async def close(self) -> None:
+        await self.http.aclose()
+
+
+class GrpcClient:
+    def __init__(self, target: str):
+        self.channel = grpc.aio.insecure_channel(target)
+        self.stub = balance_pb2_grpc.BalanceAPIStub(self.channel)
+
+    async def _call(self, method, request) -> None:
+        try:
+            await method(request)
+        except grpc.aio.AioRpcError as e:
+            raise RequestFailed(f"{e.code().name}: {e.details()}") from e
+
+    async def get_balance(self, user_id: str) -> None:
+        await self._call(self.stub.GetBalance, balance_pb2.GetBalanceRequest(user_id=user_id))
+
+    async def adjust_current(self, user_id: str, delta: int) -> None:
+        await self._call(self.stub.AdjustCurrent, balance_pb2.AdjustCurrentRequest(user_id=user_id, delta=delta))
+
+    async def open_transaction(self, user_id: str, service_id: str, external_tx_id: str, amount: int, timeout_seconds: int) -> None:
+        await self._call(self.stub.OpenTransaction, balance_pb2.OpenTransactionRequest(user_id=user_id, service_id=service_id, external_tx_id=external_tx_id, amount=amount, timeout_seconds=timeout_seconds))
+
+    async def confirm_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> None:
+        await self._call(self.stub.ConfirmTransaction, balance_pb2.ConfirmTransactionRequest(user_id=user_id, service_id=service_id, external_tx_id=external_tx_id))
+
+    async def cancel_transaction(self, user_id: str, service_id: str, external_tx_id: str) -> None:
+        await self._call(self.stub.CancelTransaction, balance_pb2.CancelTransactionRequest(user_id=user_id, service_id=service_id, external_tx_id=external_tx_id))
+
+    async def close(self) -> None:
+        await self.channel.close()
@@ -0,0 +1,63 @@
+"""Сравнение двух результатов bench.run: python -m bench.compare baseline.json candidate.json [--threshold 10].
+
+Код выхода 1, если пропускная способность упала или p95/p99 выросли больше порога (в процентах),
+либо выросло число round trips на операцию.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+METRICS = [
+    # (название, путь в JSON, True если больше — лучше)
+    ("throughput, ops/s", ("throughput",), True),
+    ("p50, ms", ("latency_ms", "p50"), False),
+    ("p95, ms", ("latency_ms", "p95"), False),
+    ("p99, ms", ("latency_ms", "p99"), False),
+    ("lock wait, ms/op", ("lock_wait", "ms_per_operation"), False),
+    ("round trips/op", ("round_trips", "per_operation"), False),
+    ("errors", ("errors",), False),
+]
+GATED = {"throughput, ops/s", "p95, ms", "p99, ms"}
+
+
+def lookup(result: dict, path: tuple):
+    for key in path:
+        if not isinstance(result, dict) or result.get(key) is None:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list[str]:
+    regressions = []
+    print(f"{baseline['workload']} ({baseline.get('git_commit')} -> {candidate.get('git_commit')})")
+    print(f"{'':20} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name, path, higher_is_better in METRICS:
+        old, new = lookup(baseline, path), lookup(candidate, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change if higher_is_better else change
+        mark = ""
+        if name in GATED and worse > threshold:
+            mark = "  REGRESSION"
+        elif name == "round trips/op" and new > old + 0.01:
+            mark = "  REGRESSION"
+        if mark:
+            regressions.append(name)
+        print(f"{name:20} {old:>12} {new:>12} {change:>+8.1f}%{mark}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарка")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="допустимое ухудшение, %%")
+    args = parser.parse_args()
+    baseline = json.loads(args.baseline.read_text())
+    candidate = json.loads(args.candidate.read_text())
+    if (baseline["workload"], baseline["protocol"]) != (candidate["workload"], candidate["protocol"]):
+        sys.exit("Сравнивать можно только прогоны одной нагрузки и протокола")
+    sys.exit(1 if compare(baseline, candidate, args.threshold) else 0)
@@ -0,0 +1,98 @@
+import asyncio
+
+import asyncpg
+
+from app.core import settings
+from app.db import engine
+from app.db.migrations import migrate
+from app.models import Base
+
+USER_PREFIX = "bench-"
+
+
+async def prepare_schema() -> None:
+    await migrate(engine)
+    await engine.dispose()
+
+
+async def reset(conn: asyncpg.Connection) -> None:
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    await conn.execute(f"TRUNCATE {tables} RESTART IDENTITY")
+
+
+async def seed_users(conn: asyncpg.Connection, users: int, current: int, maximum: int) -> None:
+    await conn.execute(
+        "INSERT INTO user_balances (user_id, current, maximum, locked_total) "
+        "SELECT $1 || i, $3, $4, 0 FROM generate_series(0, $2 - 1) AS i",
+        USER_PREFIX, users, current, maximum,
+    )
+
+
+async def stripe_users(user_ids, stripes: int) -> None:
+    from app.db import AsyncSessionLocal
+    from app.services.balance_service import BalanceService
+
+    async with AsyncSessionLocal() as session:
+        service = BalanceService(session)
+        for user_id in user_ids:
+            await service.set_stripes(user_id, stripes)
+        await session.commit()
+    await engine.dispose()
+
+
+async def seed_expired_backlog(conn: asyncpg.Connection, users: int, transactions: int) -> None:
+    # Транзакции по 1 единице, истёкшие минуту назад; locked_total сразу согласован с ними
+    await conn.execute(
+        "INSERT INTO balance_transactions (user_id, service_id, external_tx_id, amount, status, created_at, expires_at) "
+        "SELECT $1 || (i % $2), 'bench', 'sweep-' || i, 1, 'LOCKED', now() AT TIME ZONE 'utc' - interval '2 minutes', "
+        "now() AT TIME ZONE 'utc' - interval '1 minute' FROM generate_series(0, $3 - 1) AS i",
+        USER_PREFIX, users, transactions,
+    )
+    await conn.execute(
+        "UPDATE user_balances b SET locked_total = t.total FROM "
+        "(SELECT user_id, sum(amount) AS total FROM balance_transactions GROUP BY user_id) t WHERE b.user_id = t.user_id"
+    )
+
+
+async def count_expired_locked(conn: asyncpg.Connection) -> int:
+    return await conn.fetchval("SELECT count(*) FROM balance_transactions WHERE status = 'LOCKED' AND expires_at < now() AT TIME ZONE 'utc'")
+
+
+class LockWaitSampler:
+    """Опрашивает pg_stat_activity: сколько backend'ов ждут блокировку. Сумма выборок × интервал ≈ суммарное время ожидания."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = 0
+        self.waiting_samples = 0
+        self.max_waiting = 0
+        self._task = None
+        self._stop = asyncio.Event()
+
+    async def _run(self) -> None:
+        conn = await asyncpg.connect(settings.dsn)
+        try:
+            while not self._stop.is_set():
+                waiting = await conn.fetchval(
+                    "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() "
+                    "AND wait_event_type = 'Lock' AND pid <> pg_backend_pid()"
+                )
+                self.samples += 1
+                self.waiting_samples += waiting
+                self.max_waiting = max(self.max_waiting, waiting)
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await conn.close()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stop.set()
+        await self._task
+
+    def total_wait(self) -> float:
+        return self.waiting_samples * self.interval
@@ -0,0 +1,32 @@
+"""gRPC-сервер для бенчмарка: app.grpc.server плюс HTTP-порт со статистикой пула и round trips."""
+import argparse
+import asyncio
+import json
+
+from app.db import pool_stats
+from app.grpc.server import serve
+
+
+async def stats_server(port: int) -> asyncio.AbstractServer:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await reader.readuntil(b"\r\n\r\n")
+        body = json.dumps(pool_stats()).encode()
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", port)
+
+
+async def main(port: int, stats_port: int) -> None:
+    server = await stats_server(stats_port)
+    async with server:
+        await serve(f"127.0.0.1:{port}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--stats-port", type=int, required=True)
+    args = parser.parse_args()
+    asyncio.run(main(args.port, args.stats_port))
@@ -0,0 +1,107 @@
+"""Скорость снимков и сверки балансов с журналом.
+
+Наполняет БД --users пользователями с --entries записями журнала у каждого (согласованными
+с user_balances), строит снимки (checkpoint), дописывает хвост журнала --tail-share пользователям
+и сверяет всех пользователей с журналом при каждом числе соединений из --workers.
+
+    python -m bench.ledger_verify --users 1000000 --workers 1 4 8
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+
+import asyncpg
+
+from app.core import settings
+from app.db import engine
+from app.services.ledger import LedgerJob
+from bench import db
+from bench.run import ROOT, git_commit
+
+_SEED_LEDGER = (
+    "INSERT INTO balance_ledger (user_id, type, current_delta, maximum_delta, locked_delta) "
+    "SELECT $1 || i, 'CURRENT_ADJUSTED', CASE WHEN e = 0 THEN $3 - ($2 - 1) ELSE 1 END, 0, 0 "
+    "FROM generate_series(0, $4 - 1) AS i, generate_series(0, $2 - 1) AS e"
+)
+_SEED_LIMITS = (
+    "INSERT INTO balance_ledger (user_id, type, current_delta, maximum_delta, locked_delta) "
+    "SELECT $1 || i, 'LIMITS_ADJUSTED', 0, $2, 0 FROM generate_series(0, $3 - 1) AS i"
+)
+
+
+async def seed(conn: asyncpg.Connection, args) -> None:
+    await db.reset(conn)
+    await db.seed_users(conn, args.users, args.entries + 10, 1_000_000)
+    await conn.execute(_SEED_LIMITS, db.USER_PREFIX, 1_000_000, args.users)
+    await conn.execute(_SEED_LEDGER, db.USER_PREFIX, args.entries - 1, args.entries + 10, args.users)
+    await conn.execute("VACUUM ANALYZE user_balances, balance_ledger")
+
+
+async def add_tail(conn: asyncpg.Connection, args) -> int:
+    # Изменения после снимка: и в user_balances, и в журнале
+    step = max(1, round(1 / args.tail_share))
+    await conn.execute(f"UPDATE user_balances SET current = current + 1 WHERE substr(user_id, {len(db.USER_PREFIX) + 1})::int % {step} = 0")
+    status = await conn.execute(
+        "INSERT INTO balance_ledger (user_id, type, current_delta, maximum_delta, locked_delta) "
+        f"SELECT $1 || i, 'CURRENT_ADJUSTED', 1, 0, 0 FROM generate_series(0, $2 - 1, {step}) AS i",
+        db.USER_PREFIX, args.users,
+    )
+    return int(status.split()[-1])
+
+
+async def main(args) -> dict:
+    await db.prepare_schema()
+    conn = await asyncpg.connect(settings.dsn)
+    try:
+        await seed(conn, args)
+        checkpoint = await LedgerJob(workers=max(args.workers), chunk_size=args.chunk_size).checkpoint(baseline=False)
+        tail = await add_tail(conn, args)
+        await conn.execute("VACUUM ANALYZE balance_snapshots, balance_ledger")
+        runs = {}
+        for workers in args.workers:
+            report = await LedgerJob(workers=workers, chunk_size=args.chunk_size).verify()
+            runs[workers] = {
+                "seconds": report.seconds,
+                "users_per_second": round(report.users / report.seconds),
+                "mismatched": report.mismatched,
+            }
+        ledger_bytes = await conn.fetchval("SELECT pg_total_relation_size('balance_ledger')")
+        await db.reset(conn)
+    finally:
+        await conn.close()
+        await engine.dispose()
+    return {
+        "workload": "ledger_verify",
+        "started_at": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "checkpoint": {"seconds": checkpoint.seconds, "snapshots": checkpoint.snapshots},
+        "tail_users": tail,
+        "ledger_bytes": ledger_bytes,
+        "verify": runs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Скорость снимков и сверки балансов с журналом")
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--entries", type=int, default=5, help="записей журнала на пользователя до снимка")
+    parser.add_argument("--tail-share", type=float, default=0.1, help="доля пользователей с записями после снимка")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--chunk-size", type=int, default=settings.LEDGER_CHUNK_SIZE)
+    parser.add_argument("--output", type=Path, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(main(args))
+    output = args.output or ROOT / "bench" / "results" / f"ledger_verify-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"checkpoint: {result['checkpoint']['snapshots']} snapshots in {result['checkpoint']['seconds']}s")
+    for workers, stats in result["verify"].items():
+        print(f"verify, {workers} workers: {stats['seconds']}s, {stats['users_per_second']} users/s, {stats['mismatched']} mismatched")
+    print(f"-> {output}")
@@ -0,0 +1,109 @@
+"""Процессорное время REST-запроса внутри процесса: FastAPI, зависимости, pydantic, SQLAlchemy, сериализация.
+
+Приложение вызывается напрямую по ASGI, без uvicorn и HTTP-клиента, запросы идут по одному, так что
+time.process_time() на запрос — это работа воркера без ожидания БД (БД — отдельный процесс). Каждая
+нагрузка гоняется --rounds раз, в результат идёт лучший раунд: шум планировщика только добавляет время.
+get_balance_cached отвечает из кэша балансов (BALANCE_CACHE_ENABLED) — это чистая стоимость REST-слоя.
+
+    python -m bench.rest_cpu --requests 5000 --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import asyncpg
+
+from app.core import settings
+from bench import db
+from bench.run import ROOT, git_commit
+
+_USER = db.USER_PREFIX + "0"
+
+
+async def call(app, method: str, path: str, body: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def operations(i: int):
+    tx = f"/balance/{_USER}/transactions/cpu-{i}"
+    return {
+        "get_balance": [("GET", f"/balance/{_USER}", b"")],
+        "get_balance_cached": [("GET", f"/balance/{_USER}", b"")],
+        "adjust_current": [("POST", f"/balance/{_USER}/current", b'{"delta": 0}')],
+        "open_confirm": [
+            ("POST", f"/balance/{_USER}/transactions", json.dumps({"service_id": "cpu", "external_tx_id": f"cpu-{i}", "amount": 1, "timeout_seconds": 600}).encode()),
+            ("POST", f"{tx}/confirm", b'{"service_id": "cpu"}'),
+        ],
+    }
+
+
+async def measure(app, kind: str, requests: int, offset: int) -> dict:
+    cpu = wall = 0.0
+    for i in range(offset, offset + requests):
+        for method, path, body in operations(i)[kind]:
+            cpu_started, wall_started = time.process_time(), time.perf_counter()
+            status = await call(app, method, path, body)
+            cpu += time.process_time() - cpu_started
+            wall += time.perf_counter() - wall_started
+            if status != 200:
+                raise SystemExit(f"{method} {path}: {status}")
+    calls = requests * len(operations(0)[kind])
+    return {"requests": calls, "cpu_us": round(cpu / calls * 1e6, 1), "wall_us": round(wall / calls * 1e6, 1)}
+
+
+async def main(args) -> dict:
+    await db.prepare_schema()
+    conn = await asyncpg.connect(settings.dsn)
+    try:
+        await db.reset(conn)
+        await db.seed_users(conn, 1, 10 ** 12, 2 * 10 ** 12)
+    finally:
+        await conn.close()
+    from app.main import app
+
+    results = {}
+    for kind in ("get_balance", "get_balance_cached", "adjust_current", "open_confirm"):
+        settings.BALANCE_CACHE_ENABLED = kind == "get_balance_cached"
+        # Прогрев: кэш компиляции SQLAlchemy, пул соединений
+        await measure(app, kind, min(200, args.requests), 0)
+        rounds = [await measure(app, kind, args.requests, args.requests * (i + 1)) for i in range(args.rounds)]
+        results[kind] = min(rounds, key=lambda r: r["cpu_us"])
+        print(kind, results[kind])
+    return {
+        "benchmark": "rest_cpu",
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Процессорное время REST-запроса")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+    result = asyncio.run(main(args))
+    output = args.output or ROOT / "bench" / "results" / f"rest_cpu-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
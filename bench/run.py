@@ -0,0 +1,310 @@
+"""Нагрузочный бенчмарк горячих путей баланса.
+
+Поднимает REST (uvicorn app.main:app) или gRPC (app.grpc.server) против БД из DB_* и гоняет
+выбранную нагрузку; результат пишет в JSON для сравнения прогонов (bench.compare).
+
+    python -m bench.run read_heavy --protocol grpc --concurrency 32 --duration 20
+    python -m bench.run sweeper_drain --backlog 100000 --sweepers 2 --shard-count 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import asyncpg
+import httpx
+
+from app.core import settings
+from bench import db
+from bench.clients import GrpcClient, RequestFailed, RestClient
+from bench.workloads import WORKLOADS
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.last_error: dict[str, str] = {}
+
+    async def call(self, kind: str, request) -> None:
+        started = time.perf_counter()
+        try:
+            await request
+        except RequestFailed as e:
+            if self.recording:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+                self.last_error[kind] = str(e)
+            return
+        if self.recording:
+            self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    def record(self, kind: str, seconds: float) -> None:
+        self.latencies.setdefault(kind, []).append(seconds)
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "mean": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def summarize(recorder: Recorder, duration: float, operations: int | None = None) -> dict:
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    if operations is None:
+        operations = len(all_latencies)
+    return {
+        "duration": round(duration, 3),
+        "operations": operations,
+        "errors": sum(recorder.errors.values()),
+        "throughput": round(operations / duration, 2) if duration else 0.0,
+        "latency_ms": percentiles(all_latencies),
+        "by_operation": {
+            kind: {
+                "count": len(values),
+                "errors": recorder.errors.get(kind, 0),
+                "last_error": recorder.last_error.get(kind),
+                "latency_ms": percentiles(values),
+            }
+            for kind, values in sorted(recorder.latencies.items())
+        },
+    }
+
+
+def round_trip_delta(before: dict, after: dict, operations: int) -> dict:
+    delta = {key: after[key] - before[key] for key in after}
+    delta["per_operation"] = round(delta["total"] / operations, 3) if operations else None
+    return delta
+
+
+class Server:
+    def __init__(self, args):
+        self.args = args
+        self.process = None
+        self.env = dict(os.environ, SWEEPER_ENABLED="false", DB_ECHO="false")
+        self.env.update(item.split("=", 1) for item in args.env)
+        # Счётчики round trips стенд читает с /admin/pool
+        self.env.setdefault("ADMIN_TOKEN", secrets.token_urlsafe())
+
+    def start(self) -> None:
+        if self.args.protocol == "rest":
+            command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(self.args.rest_port), "--log-level", "warning"]
+        else:
+            command = [sys.executable, "-m", "bench.grpc_server", "--port", str(self.args.grpc_port), "--stats-port", str(self.args.stats_port)]
+        self.process = subprocess.Popen(command, cwd=ROOT, env=self.env)
+
+    @property
+    def stats_url(self) -> str:
+        if self.args.protocol == "rest":
+            return f"http://127.0.0.1:{self.args.rest_port}/admin/pool"
+        return f"http://127.0.0.1:{self.args.stats_port}/"
+
+    async def stats(self) -> dict:
+        async with httpx.AsyncClient() as http:
+            response = await http.get(self.stats_url, headers={"Authorization": f"Bearer {self.env['ADMIN_TOKEN']}"})
+            response.raise_for_status()
+            return response.json()
+
+    async def wait_ready(self, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Сервер завершился с кодом {self.process.returncode}")
+            try:
+                await self.stats()
+                return
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+    def client(self):
+        if self.args.protocol == "rest":
+            return RestClient(f"http://127.0.0.1:{self.args.rest_port}", self.args.concurrency)
+        return GrpcClient(f"127.0.0.1:{self.args.grpc_port}")
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+async def drive(workload, client, recorder: Recorder, concurrency: int, seconds: float, seed: int) -> None:
+    deadline = time.monotonic() + seconds
+
+    async def worker(index: int) -> None:
+        rnd = random.Random(seed * 1000 + index)
+        while time.monotonic() < deadline:
+            await workload.step(client, recorder, rnd, index)
+
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+
+
+async def run_requests(args, conn: asyncpg.Connection) -> dict:
+    workload = WORKLOADS[args.workload](args)
+    await workload.seed(conn)
+    server = Server(args)
+    server.start()
+    try:
+        await server.wait_ready()
+        client = server.client()
+        recorder = Recorder()
+        try:
+            if args.warmup:
+                await drive(workload, client, recorder, args.concurrency, args.warmup, args.seed)
+            before = (await server.stats())["round_trips"]
+            sampler = db.LockWaitSampler()
+            sampler.start()
+            recorder.recording = True
+            started = time.perf_counter()
+            await drive(workload, client, recorder, args.concurrency, args.duration, args.seed + 1)
+            duration = time.perf_counter() - started
+            recorder.recording = False
+            await sampler.stop()
+            after = (await server.stats())["round_trips"]
+        finally:
+            await client.close()
+    finally:
+        server.stop()
+    result = summarize(recorder, duration)
+    result["lock_wait"] = lock_wait(sampler, result["operations"])
+    result["round_trips"] = round_trip_delta(before, after, result["operations"])
+    return result
+
+
+def lock_wait(sampler: db.LockWaitSampler, operations: int) -> dict:
+    total = sampler.total_wait()
+    return {
+        "total_seconds": round(total, 3),
+        "ms_per_operation": round(total / operations * 1000, 3) if operations else None,
+        "max_waiting": sampler.max_waiting,
+    }
+
+
+async def run_sweeper_drain(args, conn: asyncpg.Connection) -> dict:
+    from app.db import round_trips
+    from app.services.sweeper import ExpirySweeper
+
+    recorder = Recorder()
+
+    class TimedSweeper(ExpirySweeper):
+        def _record(self, batch):
+            super()._record(batch)
+            if batch.canceled:
+                recorder.record("sweep_batch", batch.duration)
+
+    await db.seed_users(conn, args.users, current=0, maximum=10 ** 12)
+    await db.seed_expired_backlog(conn, args.users, args.backlog)
+    sweepers = [TimedSweeper(batch_size=args.batch_size, interval=0.1, shard_count=args.shard_count) for _ in range(args.sweepers)]
+    stop_event = asyncio.Event()
+    before = round_trips.as_dict()
+    sampler = db.LockWaitSampler()
+    sampler.start()
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(sweeper.run(stop_event)) for sweeper in sweepers]
+    while await db.count_expired_locked(conn):
+        await asyncio.sleep(0.05)
+    duration = time.perf_counter() - started
+    stop_event.set()
+    await asyncio.gather(*tasks)
+    await sampler.stop()
+    after = round_trips.as_dict()
+    canceled = sum(sweeper.stats.canceled for sweeper in sweepers)
+    result = summarize(recorder, duration, operations=canceled)
+    result["errors"] = sum(sweeper.stats.errors for sweeper in sweepers)
+    result["lock_wait"] = lock_wait(sampler, canceled)
+    result["round_trips"] = round_trip_delta(before, after, canceled)
+    return result
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args) -> dict:
+    await db.prepare_schema()
+    conn = await asyncpg.connect(settings.dsn)
+    try:
+        await db.reset(conn)
+        if args.workload == "sweeper_drain":
+            result = await run_sweeper_drain(args, conn)
+        else:
+            result = await run_requests(args, conn)
+    finally:
+        await conn.close()
+    config = {key: value for key, value in vars(args).items() if key not in ("output",)}
+    return {
+        "workload": args.workload,
+        "protocol": None if args.workload == "sweeper_drain" else args.protocol,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "config": config,
+        **result,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк сервиса балансов")
+    parser.add_argument("workload", choices=[*WORKLOADS, "sweeper_drain"])
+    parser.add_argument("--protocol", choices=["rest", "grpc"], default="grpc")
+    parser.add_argument("--duration", type=float, default=10.0, help="секунды замера")
+    parser.add_argument("--warmup", type=float, default=2.0, help="секунды прогрева (не входят в результат)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="read_heavy: доля AdjustCurrent")
+    parser.add_argument("--adjust-ratio", type=float, default=0.5, help="hot_user: доля AdjustCurrent, остальное — открытие и закрытие транзакций")
+    parser.add_argument("--stripes", type=int, default=0, help="hot_user: разбить горячий аккаунт на столько полос")
+    parser.add_argument("--retries", type=int, default=3, help="retry_storm: повторов каждого open_transaction")
+    parser.add_argument("--confirm-ratio", type=float, default=0.5, help="доля подтверждений среди закрытий транзакций")
+    parser.add_argument("--backlog", type=int, default=50_000, help="sweeper_drain: число истёкших транзакций")
+    parser.add_argument("--batch-size", type=int, default=settings.SWEEPER_BATCH_SIZE)
+    parser.add_argument("--shard-count", type=int, default=settings.SWEEPER_SHARD_COUNT)
+    parser.add_argument("--sweepers", type=int, default=1, help="sweeper_drain: число конкурирующих свиперов")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="переменные окружения сервера, например ATOMIC_MUTATIONS=true")
+    parser.add_argument("--rest-port", type=int, default=18000)
+    parser.add_argument("--grpc-port", type=int, default=15051)
+    parser.add_argument("--stats-port", type=int, default=15052)
+    parser.add_argument("--output", type=Path, default=None, help="JSON с результатом (по умолчанию bench/results/...)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(main(args))
+    output = args.output or ROOT / "bench" / "results" / f"{args.workload}-{result['protocol'] or 'db'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    latency = result["latency_ms"]
+    print(
+        f"{result['workload']}: {result['operations']} ops, {result['errors']} errors, {result['throughput']} ops/s, "
+        f"p50={latency.get('p50')} p95={latency.get('p95')} p99={latency.get('p99')} ms, "
+        f"lock wait {result['lock_wait']['ms_per_operation']} ms/op, round trips {result['round_trips']['per_operation']}/op"
+    )
+    print(f"-> {output}")
@@ -0,0 +1,99 @@
+import itertools
+import random
+
+from bench.db import USER_PREFIX
+
+BIG = 10 ** 12
+
+
+class Workload:
+    """Замкнутый цикл запросов одного воркера; step делает одну или несколько операций через recorder."""
+
+    name = ""
+
+    def __init__(self, args):
+        self.args = args
+        self._tx_ids = itertools.count()
+
+    @property
+    def users(self) -> int:
+        return self.args.users
+
+    async def seed(self, conn) -> None:
+        from bench.db import seed_users
+
+        await seed_users(conn, self.users, current=BIG // 10, maximum=BIG)
+
+    def user(self, rnd: random.Random) -> str:
+        return f"{USER_PREFIX}{rnd.randrange(self.users)}"
+
+    def tx_id(self, worker: int) -> str:
+        return f"w{worker}-{next(self._tx_ids)}"
+
+    async def lifecycle(self, client, recorder, user_id: str, worker: int, confirm: bool) -> None:
+        tx_id = self.tx_id(worker)
+        await recorder.call("open_transaction", client.open_transaction(user_id, "bench", tx_id, 1, 600))
+        if confirm:
+            await recorder.call("confirm_transaction", client.confirm_transaction(user_id, "bench", tx_id))
+        else:
+            await recorder.call("cancel_transaction", client.cancel_transaction(user_id, "bench", tx_id))
+
+    async def step(self, client, recorder, rnd: random.Random, worker: int) -> None:
+        raise NotImplementedError
+
+
+class ReadHeavy(Workload):
+    name = "read_heavy"
+
+    async def step(self, client, recorder, rnd, worker):
+        user_id = self.user(rnd)
+        if rnd.random() < self.args.write_ratio:
+            await recorder.call("adjust_current", client.adjust_current(user_id, 1))
+        else:
+            await recorder.call("get_balance", client.get_balance(user_id))
+
+
+class HotUser(Workload):
+    name = "hot_user"
+
+    @property
+    def users(self) -> int:
+        return 1
+
+    async def seed(self, conn) -> None:
+        await super().seed(conn)
+        if self.args.stripes:
+            from bench.db import stripe_users
+
+            await stripe_users([f"{USER_PREFIX}0"], self.args.stripes)
+
+    async def step(self, client, recorder, rnd, worker):
+        user_id = f"{USER_PREFIX}0"
+        if rnd.random() < self.args.adjust_ratio:
+            await recorder.call("adjust_current", client.adjust_current(user_id, 1))
+        else:
+            await self.lifecycle(client, recorder, user_id, worker, confirm=rnd.random() < self.args.confirm_ratio)
+
+
+class Lifecycle(Workload):
+    name = "lifecycle"
+
+    async def step(self, client, recorder, rnd, worker):
+        await self.lifecycle(client, recorder, self.user(rnd), worker, confirm=rnd.random() < self.args.confirm_ratio)
+
+
+class RetryStorm(HotUser):
+    """Горячий аккаунт, клиенты которого повторяют уже выполненный open_transaction --retries раз."""
+
+    name = "retry_storm"
+
+    async def step(self, client, recorder, rnd, worker):
+        user_id = f"{USER_PREFIX}0"
+        tx_id = self.tx_id(worker)
+        await recorder.call("open_transaction", client.open_transaction(user_id, "bench", tx_id, 1, 600))
+        for _ in range(self.args.retries):
+            await recorder.call("open_retry", client.open_transaction(user_id, "bench", tx_id, 1, 600))
+        await recorder.call("confirm_transaction", client.confirm_transaction(user_id, "bench", tx_id))
+
+
+WORKLOADS = {workload.name: workload for workload in (ReadHeavy, HotUser, Lifecycle, RetryStorm)}
@@ -0,0 +1,132 @@
+"""Стоимость записи balance_transactions при прежнем и текущем наборе индексов.
+
+Прямо через asyncpg, без сервера: каждый клиент открывает транзакцию (INSERT LOCKED) и закрывает её
+(UPDATE в CONFIRMED), как REST/gRPC на горячем пути. Для каждого набора индексов — пропускная
+способность, WAL на транзакцию и размер индексов. После прогона индексы возвращаются к моделям.
+
+    python -m bench.write_amp --transactions 50000 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import asyncpg
+
+from app.core import settings
+from app.db.migrations.v0004_locked_indexes import INDEXES, OBSOLETE
+from bench import db
+from bench.run import ROOT, git_commit
+
+# Индексы balance_transactions до перехода на частичные (вместе с idx_closed_at — он есть в обоих наборах)
+LEGACY_INDEXES = [
+    "CREATE INDEX ix_balance_transactions_user_id ON balance_transactions (user_id)",
+    "CREATE INDEX ix_balance_transactions_service_id ON balance_transactions (service_id)",
+    "CREATE INDEX ix_balance_transactions_external_tx_id ON balance_transactions (external_tx_id)",
+    "CREATE INDEX ix_balance_transactions_status ON balance_transactions (status)",
+    "CREATE INDEX idx_user_status ON balance_transactions (user_id, status)",
+    "CREATE INDEX idx_expires_status ON balance_transactions (status, expires_at)",
+    "CREATE INDEX idx_striped_locked_expires ON balance_transactions (expires_at) WHERE stripe IS NOT NULL AND status = 'LOCKED'",
+]
+
+_OPEN = (
+    "INSERT INTO balance_transactions (user_id, service_id, external_tx_id, amount, status, created_at, expires_at) "
+    "VALUES ($1, 'bench', $2, 1, 'LOCKED', now() AT TIME ZONE 'utc', now() AT TIME ZONE 'utc' + interval '10 minutes') RETURNING id"
+)
+_CLOSE = "UPDATE balance_transactions SET status = 'CONFIRMED', closed_at = now() AT TIME ZONE 'utc' WHERE id = $1"
+_INDEX_STATS = (
+    "SELECT count(*), coalesce(sum(pg_relation_size(indexrelid)), 0) FROM pg_stat_user_indexes "
+    "WHERE schemaname = current_schema() AND relname = 'balance_transactions'"
+)
+
+
+async def use_index_set(conn: asyncpg.Connection, name: str) -> None:
+    # Таблица пуста (reset), так что индексы пересоздаются мгновенно
+    for index in OBSOLETE:
+        await conn.execute(f"DROP INDEX IF EXISTS {index}")
+    for index, definition in INDEXES.items():
+        await conn.execute(f"CREATE INDEX IF NOT EXISTS {index} {definition}")
+    if name == "legacy":
+        for statement in LEGACY_INDEXES:
+            await conn.execute(statement)
+        for index in INDEXES:
+            if index != "idx_closed_at":
+                await conn.execute(f"DROP INDEX {index}")
+
+
+async def measure(args, conn: asyncpg.Connection, name: str) -> dict:
+    await db.reset(conn)
+    await use_index_set(conn, name)
+    await conn.execute("VACUUM ANALYZE balance_transactions")
+    pool = await asyncpg.create_pool(settings.dsn, min_size=args.concurrency, max_size=args.concurrency)
+    per_worker = args.transactions // args.concurrency
+
+    async def worker(index: int) -> None:
+        async with pool.acquire() as worker_conn:
+            for number in range(per_worker):
+                user_id = f"{db.USER_PREFIX}{(index * per_worker + number) % args.users}"
+                transaction_id = await worker_conn.fetchval(_OPEN, user_id, f"w{index}-{number}")
+                await worker_conn.execute(_CLOSE, transaction_id)
+
+    try:
+        wal_before = await conn.fetchval("SELECT pg_current_wal_lsn()")
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(args.concurrency)))
+        duration = time.perf_counter() - started
+        wal_bytes = await conn.fetchval("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), $1)", wal_before)
+    finally:
+        await pool.close()
+    indexes, index_bytes = await conn.fetchrow(_INDEX_STATS)
+    transactions = per_worker * args.concurrency
+    return {
+        "indexes": indexes,
+        "transactions": transactions,
+        "duration": round(duration, 3),
+        "throughput": round(transactions / duration, 2),
+        "wal_bytes_per_transaction": round(float(wal_bytes) / transactions, 1),
+        "index_bytes": int(index_bytes),
+    }
+
+
+async def main(args) -> dict:
+    await db.prepare_schema()
+    conn = await asyncpg.connect(settings.dsn)
+    try:
+        results = {name: await measure(args, conn, name) for name in ("legacy", "current")}
+        await db.reset(conn)
+        await use_index_set(conn, "current")
+    finally:
+        await conn.close()
+    return {
+        "workload": "write_amp",
+        "started_at": datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Стоимость записи транзакций при разных наборах индексов")
+    parser.add_argument("--transactions", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--output", type=Path, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(main(args))
+    output = args.output or ROOT / "bench" / "results" / f"write_amp-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    for name in ("legacy", "current"):
+        stats = result[name]
+        print(
+            f"{name}: {stats['indexes']} indexes, {stats['throughput']} tx/s, "
+            f"WAL {stats['wal_bytes_per_transaction']} B/tx, indexes {stats['index_bytes'] // 1024} KiB"
+        )
+    print(f"-> {output}")
@@ -0,0 +1,82 @@
+"""Тесты идут против PostgreSQL из настроек DB_* (как у приложения); без базы они пропускаются.
+
+Схема доводится миграциями, данные не очищаются: каждый тест работает со своими пользователями (user_id).
+"""
+import asyncio
+import uuid
+
+import asyncpg
+import httpx
+import pytest
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core import settings
+from app.db.migrations import migrate
+from app.services.balance_service import BalanceService
+
+
+def _engine():
+    # Без пула: соединения не переживают цикл событий теста
+    return create_async_engine(settings.db_url, poolclass=NullPool)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def client() -> httpx.AsyncClient:
+    """HTTP-клиент приложения без lifespan: схема и фоновые задачи не нужны."""
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+@pytest.fixture(scope="session")
+def database() -> None:
+    async def prepare() -> None:
+        engine = _engine()
+        try:
+            await migrate(engine)
+        finally:
+            await engine.dispose()
+
+    try:
+        asyncio.run(prepare())
+    except (OSError, DBAPIError, asyncpg.PostgresError) as e:
+        pytest.skip(f"PostgreSQL недоступен: {e}")
+
+
+@pytest.fixture
+async def engine(database):
+    engine = _engine()
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+def user_id() -> str:
+    return f"test-{uuid.uuid4().hex}"
+
+
+@pytest.fixture
+def funded_user(session_factory, user_id):
+    """Создаёт баланс пользователя с заданными current и maximum, возвращает user_id."""
+    async def fund(current: int, maximum: int) -> str:
+        async with session_factory() as session:
+            service = BalanceService(session)
+            await service.adjust_limits(user_id, maximum)
+            await service.adjust_current(user_id, current)
+            await session.commit()
+        return user_id
+
+    return fund
@@ -0,0 +1,52 @@
+import pytest
+
+from app.core import settings
+from app.core.errors import BalanceError
+from app.db import get_db
+from app.main import app
+from app.services.balance_service import BalanceService
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize(
+    ("token", "header", "status_code"),
+    [
+        ("", None, 403),
+        ("", "Bearer ", 403),
+        ("secret", None, 401),
+        ("secret", "Bearer wrong", 401),
+        ("secret", "Bearer secret", 200),
+    ],
+)
+async def test_admin_requires_token(monkeypatch, client, token, header, status_code):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", token)
+    headers = {"Authorization": header} if header is not None else {}
+    async with client:
+        response = await client.get("/admin/cache", headers=headers)
+    assert response.status_code == status_code
+
+
+@pytest.mark.parametrize(("method", "path"), [("POST", "/admin/import"), ("GET", "/admin/export/user_balances")])
+async def test_bulk_endpoints_are_gated(monkeypatch, client, method, path):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    async with client:
+        response = await client.request(method, path, content=b"user_id,current,maximum\n")
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize(("error", "status_code"), [(BalanceError("Журнал баланса выключен"), 400), (ValueError("internal detail"), 500)])
+async def test_rebuild_maps_only_balance_errors_to_400(monkeypatch, client, error, status_code):
+    async def rebuild(self, user_id):
+        raise error
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(BalanceService, "rebuild_user_balance", rebuild)
+    monkeypatch.setitem(app.dependency_overrides, get_db, no_db)
+    async with client:
+        response = await client.post("/admin/ledger/u1/rebuild", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == status_code
+    assert "internal detail" not in response.text
@@ -0,0 +1,54 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.repositories import BalanceRepository
+
+pytestmark = pytest.mark.anyio
+
+# Сроки в прошлом, до которых не дотягивается ничего, кроме транзакций теста
+_EPOCH = datetime(2000, 1, 1)
+
+
+async def _seed_expired(session, user_id: str, count: int, expires_at: datetime) -> None:
+    await session.execute(
+        text("INSERT INTO user_balances (user_id, current, maximum, locked_total) VALUES (:user_id, :count, :maximum, :count)"),
+        {"user_id": user_id, "count": count, "maximum": 2 * count},
+    )
+    await session.execute(
+        text(
+            "INSERT INTO balance_transactions (user_id, service_id, external_tx_id, amount, status, created_at, expires_at) "
+            "SELECT :user_id, 'svc', 'tx-' || i, 1, 'LOCKED', :expires_at, CAST(:expires_at AS timestamp) + i * interval '1 second' "
+            "FROM generate_series(0, :count - 1) AS i"
+        ),
+        {"user_id": user_id, "count": count, "expires_at": expires_at},
+    )
+
+
+async def test_sweeper_skips_busy_users_and_caps_batch(session_factory):
+    busy, idle = (f"test-{uuid.uuid4().hex}" for _ in range(2))
+    async with session_factory() as session:
+        # Самые старые истёкшие транзакции — у занятого пользователя
+        await _seed_expired(session, busy, 3, _EPOCH)
+        await _seed_expired(session, idle, 5, _EPOCH + timedelta(minutes=1))
+        await session.commit()
+    now = _EPOCH + timedelta(days=1)
+
+    async with session_factory() as holder:
+        await holder.execute(text("SELECT 1 FROM user_balances WHERE user_id = :user_id FOR UPDATE"), {"user_id": busy})
+        async with session_factory() as session:
+            rows = await BalanceRepository(session).cancel_expired_transactions(now, 2)
+            await session.commit()
+        assert [(row.user_id, row.canceled, row.amount) for row in rows] == [(idle, 2, 2)]
+        await holder.rollback()
+
+    async with session_factory() as session:
+        rows = await BalanceRepository(session).cancel_expired_transactions(now, 100)
+        await session.commit()
+        assert sorted((row.user_id, row.canceled) for row in rows) == sorted([(busy, 3), (idle, 3)])
+        locked = await session.scalars(
+            text("SELECT locked_total FROM user_balances WHERE user_id IN (:busy, :idle)"), {"busy": busy, "idle": idle}
+        )
+        assert list(locked) == [0, 0]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from app.core import settings
+from app.core.errors import InsufficientFundsError
+from app.schemas.batch import BalanceOperation
+from app.services.balance_service import BalanceService
+
+pytestmark = pytest.mark.anyio
+
+
+async def _wait_for_lock(session_factory, user_id: str) -> None:
+    # Ждём, пока второй запрос встанет в очередь за блокировкой строки баланса
+    async with session_factory() as session:
+        for _ in range(100):
+            waiting = await session.scalar(text(
+                "SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()"
+            ))
+            if waiting:
+                return
+            await asyncio.sleep(0.05)
+    raise AssertionError(f"open для {user_id} не ждёт блокировку")
+
+
+async def test_concurrent_atomic_open_is_idempotent(monkeypatch, session_factory, funded_user):
+    monkeypatch.setattr(settings, "ATOMIC_MUTATIONS", True)
+    user_id = await funded_user(100, 1000)
+
+    async with session_factory() as first:
+        opened = await BalanceService(first).open_transaction(user_id, "svc", "tx-1", 30, 60)
+
+        # Повтор с тем же ключом приходит, пока первая транзакция не закоммичена: проверка дубликата
+        # в его снимке ничего не видит, вставка упирается в уникальный индекс после коммита первого
+        async def retry():
+            async with session_factory() as second:
+                transaction = await BalanceService(second).open_transaction(user_id, "svc", "tx-1", 30, 60)
+                await second.commit()
+                return transaction
+
+        retried = asyncio.create_task(retry())
+        await _wait_for_lock(session_factory, user_id)
+        await first.commit()
+        repeated = await asyncio.wait_for(retried, 10)
+
+    assert repeated.id == opened.id
+    async with session_factory() as session:
+        balance = await BalanceService(session).get_balance(user_id)
+    assert (balance.current, balance.locked_total) == (100, 30)
+
+
+@pytest.mark.parametrize("stripes", [0, 4])
+async def test_batch_failure_rolls_back_only_its_operation(session_factory, funded_user, stripes):
+    user_id = await funded_user(100, 1000)
+    if stripes:
+        async with session_factory() as session:
+            await BalanceService(session).set_stripes(user_id, stripes)
+            await session.commit()
+    operations = [
+        BalanceOperation(op="open_transaction", user_id=user_id, service_id="svc", external_tx_id="tx-1", amount=30, timeout_seconds=60),
+        # Не хватает средств: откатывается только этот SAVEPOINT
+        BalanceOperation(op="open_transaction", user_id=user_id, service_id="svc", external_tx_id="tx-2", amount=500, timeout_seconds=60),
+        BalanceOperation(op="adjust_current", user_id=user_id, delta=10),
+    ]
+
+    async with session_factory() as session:
+        results = await BalanceService(session).apply_batch(operations)
+        await session.commit()
+
+    assert [item.ok for item in results] == [True, False, True]
+    assert results[2].balance.current == 110
+    with pytest.raises(InsufficientFundsError):
+        results[1].raise_error()
+    async with session_factory() as session:
+        service = BalanceService(session)
+        balance = await service.get_balance(user_id)
+        assert (balance.current, balance.locked_total) == (110, 30)
+        assert await service.repo.get_transaction(user_id, "svc", "tx-2") is None
@@ -0,0 +1,43 @@
+import logging
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import settings
+from app.repositories import BalanceRepository
+from app.services.bulk import BalanceImportJob
+
+pytestmark = pytest.mark.anyio
+
+
+async def _csv(*lines: str):
+    yield "".join(f"{line}\n" for line in lines).encode()
+
+
+@pytest.fixture
+async def single_connection_engine(database):
+    # Одно соединение в пуле: следующая загрузка получит то же соединение, если оно вернулось в пул
+    engine = create_async_engine(settings.db_url, pool_size=1, max_overflow=0)
+    yield engine
+    await engine.dispose()
+
+
+async def test_import_cleanup_failure_keeps_original_error(monkeypatch, caplog, single_connection_engine, user_id):
+    async def broken_drop(self):
+        raise RuntimeError("drop failed")
+
+    async def consumer_gone(reject):
+        raise ConnectionResetError("consumer gone")
+
+    job = BalanceImportJob(engine=single_connection_engine)
+    monkeypatch.setattr(BalanceRepository, "drop_import_tables", broken_drop)
+    # Временные таблицы уже созданы и закоммичены, загрузку обрывает получатель отказов
+    with caplog.at_level(logging.ERROR, logger="app.services.bulk"):
+        with pytest.raises(ConnectionResetError, match="consumer gone"):
+            await job.run(_csv("user_id,current,maximum", f"{user_id},x,2"), on_reject=consumer_gone)
+    assert "failed to drop import tables" in caplog.text
+
+    # Соединение с неубранными временными таблицами не вернулось в пул: следующая загрузка создаёт их заново
+    monkeypatch.undo()
+    report = await job.run(_csv("user_id,current,maximum", f"{user_id},1,2"))
+    assert (report.rows, report.inserted, report.rejected) == (1, 1, 0)
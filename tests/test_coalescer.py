@@ -0,0 +1,64 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.core.errors import BalanceError
+from app.services.coalescer import UserCoalescer, operation
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_operations_apply_in_submission_order(session_factory, funded_user):
+    user_id = await funded_user(0, 1000)
+    coalescer = UserCoalescer(session_factory=session_factory)
+
+    balances = await asyncio.gather(*(coalescer.apply(operation("adjust_current", user_id, delta=1)) for _ in range(5)))
+
+    assert [balance.current for balance in balances] == [1, 2, 3, 4, 5]
+    assert user_id not in coalescer._queues
+
+
+async def test_failed_operation_does_not_fail_its_batch(session_factory, funded_user):
+    user_id = await funded_user(10, 100)
+    coalescer = UserCoalescer(session_factory=session_factory)
+
+    results = await asyncio.gather(
+        coalescer.apply(operation("adjust_current", user_id, delta=5)),
+        coalescer.apply(operation("adjust_current", user_id, delta=1000)),
+        coalescer.apply(operation("adjust_current", user_id, delta=5)),
+        return_exceptions=True,
+    )
+
+    assert results[0].current == 15
+    assert isinstance(results[1], BalanceError)
+    assert results[2].current == 20
+
+
+async def test_cancelled_drain_releases_the_queue(session_factory, funded_user):
+    user_id = await funded_user(0, 1000)
+    stuck = asyncio.Event()
+
+    @asynccontextmanager
+    async def hanging_session():
+        # Первая пачка зависает (например, на соединении) и отменяется вместе с задачей очереди
+        stuck.set()
+        await asyncio.Event().wait()
+        yield
+
+    coalescer = UserCoalescer(session_factory=hanging_session)
+    first = asyncio.create_task(coalescer.apply(operation("adjust_current", user_id, delta=1)))
+    await stuck.wait()
+    queued = asyncio.create_task(coalescer.apply(operation("adjust_current", user_id, delta=1)))
+    await asyncio.sleep(0)
+    for worker in list(coalescer._workers):
+        worker.cancel()
+
+    for pending in (first, queued):
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(pending, 5)
+    assert user_id not in coalescer._queues
+
+    coalescer.session_factory = session_factory
+    balance = await asyncio.wait_for(coalescer.apply(operation("adjust_current", user_id, delta=1)), 5)
+    assert balance.current == 1
@@ -0,0 +1,51 @@
+import grpc
+import pytest
+
+from app.grpc import balance_pb2
+from app.grpc.interceptors import _mapped_unary
+from app.grpc.server import BalanceAPI
+from app.grpc.server_v2 import BalanceAPIV2
+
+pytestmark = pytest.mark.anyio
+
+_BAD_HEADERS = [
+    {"x-max-staleness": "abc"},
+    {"x-max-staleness": "-1"},
+    {"x-max-staleness": "nan"},
+    {"x-min-lsn": "zz"},
+    {"x-min-lsn": "16/B374D848/1"},
+]
+
+
+@pytest.mark.parametrize("headers", _BAD_HEADERS)
+async def test_rest_rejects_malformed_consistency_headers(client, headers):
+    async with client:
+        response = await client.get("/balance/u1", headers=headers)
+    assert response.status_code == 400
+    assert next(iter(headers)) in response.json()["detail"]
+
+
+class _Aborted(Exception):
+    pass
+
+
+class _Context:
+    def __init__(self, metadata: dict):
+        self.metadata = metadata
+        self.code = None
+
+    def invocation_metadata(self):
+        return tuple(self.metadata.items())
+
+    async def abort(self, code, details):
+        self.code = code
+        raise _Aborted(details)
+
+
+@pytest.mark.parametrize("servicer", [BalanceAPI(), BalanceAPIV2()], ids=["v1", "v2"])
+@pytest.mark.parametrize("headers", _BAD_HEADERS)
+async def test_grpc_rejects_malformed_consistency_metadata(servicer, headers):
+    context = _Context(headers)
+    with pytest.raises(_Aborted):
+        await _mapped_unary(servicer.GetBalance)(balance_pb2.GetBalanceRequest(user_id="u1"), context)
+    assert context.code == grpc.StatusCode.INVALID_ARGUMENT
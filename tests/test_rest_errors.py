@@ -0,0 +1,28 @@
+import pytest
+
+from app.core.errors import InsufficientFundsError
+from app.services.balance_facade import balance_facade
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize(
+    ("error", "status_code", "detail"),
+    [
+        (InsufficientFundsError("Недостаточно средств"), 400, "Недостаточно средств"),
+        # Посторонний ValueError — ошибка кода: 500 без текста исключения
+        (ValueError("internal detail"), 500, None),
+    ],
+)
+async def test_only_balance_errors_map_to_400(monkeypatch, client, error, status_code, detail):
+    async def apply(op):
+        raise error
+
+    monkeypatch.setattr(balance_facade, "apply", apply)
+    async with client:
+        response = await client.post("/balance/u1/current", json={"delta": 1})
+
+    assert response.status_code == status_code
+    assert "internal detail" not in response.text
+    if detail is not None:
+        assert response.json() == {"detail": detail}
@@ -0,0 +1,33 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.grpc.streaming import StreamApplier
+from app.services.coalescer import operation
+
+pytestmark = pytest.mark.anyio
+
+
+@asynccontextmanager
+async def broken_session():
+    # Соединение с БД оборвано: воркер пользователя падает, не выполнив ни одной операции
+    raise ConnectionResetError("connection lost")
+    yield
+
+
+async def test_failed_worker_answers_queued_operations_and_frees_permits():
+    applier = StreamApplier(max_in_flight=2, concurrency=1, session_factory=broken_session)
+
+    async def requests():
+        for i in range(5):
+            yield str(i), operation("adjust_current", "u1", delta=1)
+
+    async def collect():
+        return [item async for item in applier.run(requests(), lambda message: message)]
+
+    results = await asyncio.wait_for(collect(), 5)
+
+    assert sorted(correlation_id for correlation_id, _ in results) == ["0", "1", "2", "3", "4"]
+    assert all(not item.ok for _, item in results)
+    assert applier._queues == {}
@@ -0,0 +1,15 @@
+import os
+import signal
+import time
+
+from app.supervisor import Worker, _run_child
+
+
+def test_child_survives_forwarded_sigusr1_before_loop_starts():
+    pid = os.fork()
+    if pid == 0:
+        _run_child(Worker("sleeper", lambda: time.sleep(0.5)))
+    time.sleep(0.1)
+    os.kill(pid, signal.SIGUSR1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0